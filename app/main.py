@@ -27,9 +27,17 @@ async def lifespan(app: FastAPI):
     async with _base_lifespan(app):
         from app.routes.home.application.cache_warmer import run_periodic_warmer
 
+        from app.routes.ai_agent.application.core.openai_client import (
+            close_openai_session,
+            warm_up_openai_client,
+        )
+
         warmer_task = asyncio.create_task(run_periodic_warmer(300))
+        openai_warm_up_task = asyncio.create_task(warm_up_openai_client())
         yield
         warmer_task.cancel()
+        openai_warm_up_task.cancel()
+        await close_openai_session()
 
 # 애플리케이션 상수
 API_PREFIX = "/api/v1"
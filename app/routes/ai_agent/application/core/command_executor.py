@@ -1,44 +1,189 @@
 """
 명령 실행 서비스 - 프로세스 추가/삭제/수정 등 실제 작업 수행
 """
-import json
+import asyncio
+import hashlib
 import re
+import time
+from collections import OrderedDict
 from typing import Dict, Any, Optional
 from datetime import datetime, timezone
 from loguru import logger
+import orjson
 import pandas as pd
 import numpy as np
 
 from app.routes.simulation.application.service import SimulationService
 
 
+# 항공편별 분석 결과 캐시
+# CommandExecutor는 요청마다 생성되므로(Factory) 프로세스 수명 동안 유지되도록 모듈 레벨에 보관
+_FLIGHT_ANALYSIS_CACHE: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_FLIGHT_ANALYSIS_CACHE_MAX_SIZE = 32
+
+
+# 시나리오 컨텍스트 캐시 (TTL + LRU): 연속된 명령은 대부분 같은 시나리오를 대상으로 하므로
+# 매 명령마다 S3에서 metadata를 다시 읽지 않음. 이 모듈의 add/remove_process 성공 시 즉시 무효화하고,
+# 다른 경로(시나리오 저장 API 등)에서의 변경은 TTL이 지나면 반영
+_SCENARIO_CONTEXT_CACHE_MAX_ENTRIES = 1024
+_SCENARIO_CONTEXT_CACHE_TTL_SECONDS = 30
+_scenario_context_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+# 진행 중인 컨텍스트 조회 (single-flight): 같은 시나리오의 동시 조회는 S3를 한 번만 읽고 결과를 공유
+# 조회는 별도 태스크로 실행하므로 먼저 요청한 쪽이 취소돼도 조회가 계속되고 나머지 대기자는 결과를 받음
+_scenario_context_inflight: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
+
+
+def _scenario_context_cache_get(scenario_id: str) -> Optional[Dict[str, Any]]:
+    """캐시 조회 (만료된 항목은 제거)"""
+    entry = _scenario_context_cache.get(scenario_id)
+    if entry is None:
+        return None
+    expires_at, context = entry
+    if expires_at < time.monotonic():
+        del _scenario_context_cache[scenario_id]
+        return None
+    _scenario_context_cache.move_to_end(scenario_id)
+    return context
+
+
+def _scenario_context_cache_put(scenario_id: str, context: Dict[str, Any]) -> None:
+    """캐시 저장 (최대 개수를 넘으면 가장 오래 사용하지 않은 항목부터 제거)"""
+    _scenario_context_cache[scenario_id] = (time.monotonic() + _SCENARIO_CONTEXT_CACHE_TTL_SECONDS, context)
+    _scenario_context_cache.move_to_end(scenario_id)
+    while len(_scenario_context_cache) > _SCENARIO_CONTEXT_CACHE_MAX_ENTRIES:
+        _scenario_context_cache.popitem(last=False)
+
+
+def _scenario_context_inflight_done(scenario_id: str, task: "asyncio.Task[Dict[str, Any]]") -> None:
+    """완료된 컨텍스트 조회 태스크 정리 (기다리던 쪽이 모두 취소됐어도 예외를 회수해 경고 로그 방지)"""
+    if _scenario_context_inflight.get(scenario_id) is task:
+        del _scenario_context_inflight[scenario_id]
+    if not task.cancelled():
+        task.exception()
+
+
+def invalidate_scenario_context(scenario_id: str) -> None:
+    """시나리오 metadata 변경 후 캐시된 컨텍스트 제거 (진행 중인 조회 결과도 캐시에 저장되지 않도록 분리)"""
+    _scenario_context_cache.pop(scenario_id, None)
+    _scenario_context_inflight.pop(scenario_id, None)
+
+# AI 분석용 미리보기 최대 길이 (문자 수)
+_PREVIEW_MAX_CHARS = 60000
+_PREVIEW_JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _dumps_preview(data: Any, max_chars: int = _PREVIEW_MAX_CHARS) -> str:
+    """
+    요약 정보를 AI 전달용 JSON 문자열로 직렬화 (orjson 사용, 최대 길이로 자름)
+
+    orjson은 numpy 스칼라/배열과 비문자열 키를 직접 직렬화하며, 삽입 순서를 유지하므로
+    앞쪽에 배치한 중요 정보가 잘리지 않습니다.
+    """
+    payload = orjson.dumps(data, default=str, option=_PREVIEW_JSON_OPTIONS)
+
+    # UTF-8 바이트 수가 최대 길이 이하이면 문자 수도 그 이하이므로 자를 필요 없음
+    if len(payload) <= max_chars:
+        return payload.decode("utf-8")
+    return payload.decode("utf-8")[:max_chars]
+
+
+# 시뮬레이션 처리 결과(status) 코드북
+_STATUS_CATEGORIES = ("completed", "failed", "skipped")
+
+
+def _count_statuses(status_series) -> Dict[str, int]:
+    """
+    status 컬럼을 코드북 기준 정수 코드로 변환한 뒤 np.bincount로 한 번에 집계
+
+    코드북에 없는 값과 결측값(코드 -1)은 집계에서 제외됩니다.
+    """
+    codes = pd.Categorical(status_series, categories=_STATUS_CATEGORIES).codes
+    counts = np.bincount(codes[codes >= 0], minlength=len(_STATUS_CATEGORIES))
+    return dict(zip(_STATUS_CATEGORIES, counts.tolist()))
+
+
+def _top_k_counts(values, k: int = 10):
+    """
+    값별 빈도 상위 k개 추출 (전체 정렬 없이 np.argpartition으로 O(F) 선택)
+
+    Returns:
+        (고유값 수, {값: 빈도} 빈도 내림차순 dict) — 결측값은 제외
+    """
+    codes, uniques = pd.factorize(values)
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+
+    if len(counts) > k:
+        top_idx = np.argpartition(-counts, k - 1)[:k]
+    else:
+        top_idx = np.arange(len(counts))
+    # 빈도 내림차순, 동률이면 먼저 등장한 값 우선
+    top_idx = top_idx[np.lexsort((top_idx, -counts[top_idx]))]
+
+    top_values = pd.Index(uniques)[top_idx].tolist()
+    return len(uniques), dict(zip(top_values, counts[top_idx].tolist()))
+
+
+def _frame_fingerprint(df) -> str:
+    """
+    DataFrame 내용 지문 생성 (캐시 키용)
+
+    parquet ETag가 attrs에 있으면 그대로 사용하고, 없으면 앞/뒤 1000행의 해시로 대체합니다.
+    리스트/dict 값이 들어 있는 object 컬럼은 hash_pandas_object가 TypeError를 내므로 문자열로 바꿔 해시합니다.
+    """
+    etag = df.attrs.get("parquet_etag")
+    if etag:
+        return str(etag)
+
+    hasher = hashlib.md5()
+    for part in (df.head(1000), df.tail(1000)):
+        for _, column in part.items():
+            try:
+                column_hash = pd.util.hash_pandas_object(column, index=False)
+            except TypeError:  # unhashable 값 (list, dict 등)
+                column_hash = pd.util.hash_pandas_object(column.astype(str), index=False)
+            hasher.update(column_hash.values.tobytes())
+    return hasher.hexdigest()
+
+
+def _extract_hhmm(time_str: str) -> str:
+    """
+    출발 시각 문자열에서 HH:MM 추출 ("2026-03-01T05:00:00+09:00", "2026-03-01 05:00:00" 등)
+
+    날짜/시간 구분자('T' 우선, 없으면 공백) 바로 뒤 5자를 잘라내며, 구분자가 없으면 앞 5자를 사용합니다.
+    예외를 던지지 않으므로 행마다 try/except를 둘 필요가 없습니다.
+    """
+    sep = time_str.find('T')
+    if sep < 0:
+        sep = time_str.find(' ')
+    return time_str[sep + 1:sep + 6] if sep >= 0 else time_str[:5]
+
+
+# 프로세스 이름 한글 -> 영어 매핑 (모듈 로드 시 1회 생성)
+_KOREAN_PROCESS_NAMES = {
+    "체크인": "check_in",
+    "보안검색": "security_check",
+    "입국심사": "immigration",
+    "세관": "customs",
+    "탑승": "boarding",
+    "비자체크": "visa_check",
+    "여행세": "travel_tax",
+}
+_NON_ALNUM_RUN_RE = re.compile(r'[^a-z0-9]+')  # 영문, 숫자 외 문자가 연속된 구간
+
+
 def normalize_process_name(name: str) -> str:
     """
     프로세스 이름 정규화 (프론트엔드와 동일한 로직)
     예: "checkin" -> "check_in", "Visa-Check" -> "visa_check"
     """
-    # 한글 -> 영어 매핑
-    korean_mapping = {
-        "체크인": "check_in",
-        "보안검색": "security_check",
-        "입국심사": "immigration",
-        "세관": "customs",
-        "탑승": "boarding",
-        "비자체크": "visa_check",
-        "여행세": "travel_tax",
-    }
-    
     # 한글 매핑 확인
-    if name in korean_mapping:
-        return korean_mapping[name]
-    
-    # 영어인 경우 정규화
-    normalized = name.lower()
-    normalized = re.sub(r'[^a-z0-9]', '_', normalized)  # 영문, 숫자 외 모든 문자를 언더스코어로
-    normalized = re.sub(r'_+', '_', normalized)  # 연속된 언더스코어를 하나로
-    normalized = normalized.strip('_')  # 앞뒤 언더스코어 제거
+    korean_name = _KOREAN_PROCESS_NAMES.get(name)
+    if korean_name is not None:
+        return korean_name
     
-    return normalized
+    # 영어인 경우 정규화: 영문, 숫자 외 문자 구간을 언더스코어 하나로 바꾸고 앞뒤 언더스코어 제거
+    return _NON_ALNUM_RUN_RE.sub('_', name.lower()).strip('_')
 
 
 class CommandExecutor:
@@ -146,6 +291,7 @@ class CommandExecutor:
             
             # 8. S3에 저장
             await self.simulation_service.save_scenario_metadata(scenario_id, metadata)
+            invalidate_scenario_context(scenario_id)
             
             logger.info(f"✅ Process '{normalized_name}' added to scenario {scenario_id}")
             
@@ -241,6 +387,7 @@ class CommandExecutor:
             
             # 5. S3에 저장
             await self.simulation_service.save_scenario_metadata(scenario_id, metadata)
+            invalidate_scenario_context(scenario_id)
             
             logger.info(f"✅ Process '{normalized_name}' removed from scenario {scenario_id}")
             
@@ -369,27 +516,23 @@ class CommandExecutor:
                 # 2. 요약 타입에 따라 처리
                 if summary_type == "structure":
                     # 구조만 반환
-                    import json
                     structure = self._get_json_structure(content)
                     return {
                         "success": True,
-                        "message": f"파일 '{filename}'의 구조:\n{json.dumps(structure, indent=2, ensure_ascii=False)}",
+                        "message": f"파일 '{filename}'의 구조:\n{_dumps_preview(structure)}",
                         "filename": filename,
                         "structure": structure,
                     }
                 elif summary_type == "full":
-                    # 전체 내용 반환 (큰 파일은 주의)
-                    import json
+                    # 전체 내용 반환 (큰 파일은 주의, 메시지에는 앞 5000자만 표시)
                     return {
                         "success": True,
-                        "message": f"파일 '{filename}'의 전체 내용:\n{json.dumps(content, indent=2, ensure_ascii=False)[:5000]}...",
+                        "message": f"파일 '{filename}'의 전체 내용:\n{_dumps_preview(content, max_chars=5000)}...",
                         "filename": filename,
                         "content": content,
                     }
                 else:
                     # summary: AI에게 전달하여 요약
-                    import json
-                    
                     # 파일이 크든 작든 구조화된 요약 정보 추출
                     if isinstance(content, dict):
                         summary_info = {}
@@ -517,16 +660,16 @@ class CommandExecutor:
                         if "savedAt" in content:
                             summary_info["저장_시각"] = content.get("savedAt", "")
                         
-                        content_str = json.dumps(summary_info, indent=2, ensure_ascii=False)
+                        content_str = _dumps_preview(summary_info)
                     else:
                         # dict가 아닌 경우
-                        content_str = json.dumps(content, indent=2, ensure_ascii=False)
+                        content_str = _dumps_preview(content)
                     
                     return {
                         "success": True,
                         "message": f"파일 '{filename}'의 내용을 분석 중입니다.",
                         "filename": filename,
-                        "content_preview": content_str[:60000],  # 구조화된 요약 정보 (복잡한 시나리오 대응)
+                        "content_preview": content_str,  # 구조화된 요약 정보 (복잡한 시나리오 대응)
                         "full_content": content,  # 전체 내용은 별도로 전달
                         "needs_ai_analysis": True,
                     }
@@ -579,14 +722,13 @@ class CommandExecutor:
                         }
                     else:
                         # summary: AI에게 분석 요청
-                        import json
-                        content_str = json.dumps(analysis.get("summary_info", analysis), indent=2, ensure_ascii=False)
+                        content_str = _dumps_preview(analysis.get("summary_info", analysis))
 
                         return {
                             "success": True,
                             "message": f"파일 '{filename}'의 내용을 분석 중입니다.",
                             "filename": filename,
-                            "content_preview": content_str[:60000],  # 복잡한 시나리오 대응
+                            "content_preview": content_str,  # 복잡한 시나리오 대응
                             "full_content": analysis,
                             "needs_ai_analysis": True,
                         }
@@ -1383,15 +1525,7 @@ class CommandExecutor:
                         time_str = str(departure_time)
 
                     # 시간만 추출
-                    try:
-                        if 'T' in time_str:
-                            time_part = time_str.split('T')[1].split('+')[0].split('.')[0][:5]
-                        elif ' ' in time_str:
-                            time_part = time_str.split(' ')[1][:5]
-                        else:
-                            time_part = time_str[:5]
-                    except:
-                        time_part = str(departure_time)[:16]
+                    time_part = _extract_hhmm(time_str)
                 else:
                     time_part = "N/A"
 
@@ -1427,6 +1561,67 @@ class CommandExecutor:
 
         return result
 
+    def _use_arrow_string_keys(self, df) -> None:
+        """
+        항공편 그룹핑 키 컬럼을 Arrow 기반 문자열(string[pyarrow])로 변환
+
+        parquet에서 읽은 object 컬럼은 groupby/비교 시 Python 객체 해싱을 거치므로
+        Arrow 문자열로 바꿔 연속된 UTF-8 버퍼 위에서 처리되도록 합니다.
+        출발 시각 컬럼은 시각 포맷팅이 datetime 문자열 표현에 의존하므로 변환하지 않습니다.
+
+        Args:
+            df: pandas DataFrame (제자리에서 변환)
+        """
+        for col in ("arrival_city", "operating_carrier_iata", "flight_number"):
+            if col not in df.columns or df[col].dtype == "string[pyarrow]":
+                continue
+            # 숫자형 편명 등은 문자열 변환 시 표현이 달라질 수 있으므로 object 컬럼만 변환
+            if df[col].dtype != object:
+                continue
+            try:
+                df[col] = df[col].astype("string[pyarrow]")
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Could not convert {col} to Arrow string: {str(e)}")
+
+    def _get_flight_analysis(self, df, process_names: list, scenario_id: str) -> Dict[str, Any]:
+        """
+        항공편별 분석 결과 조회 (캐시 우선)
+
+        같은 parquet에 대한 분석 결과는 항상 동일하므로, 채팅 세션 중 반복 질문 시
+        pandas groupby 작업을 다시 수행하지 않도록 결과를 캐시합니다.
+
+        Args:
+            df: pandas DataFrame (simulation-pax.parquet)
+            process_names: 프로세스 이름 목록
+            scenario_id: 시나리오 ID
+
+        Returns:
+            항공편별 분석 결과
+        """
+        cache_key = (
+            scenario_id,
+            df.shape,
+            tuple(df.columns),
+            tuple(process_names),
+            _frame_fingerprint(df),
+        )
+
+        cached = _FLIGHT_ANALYSIS_CACHE.get(cache_key)
+        if cached is not None:
+            _FLIGHT_ANALYSIS_CACHE.move_to_end(cache_key)
+            logger.info(f"Flight analysis cache hit for scenario {scenario_id}")
+            return cached
+
+        flight_analysis = self._analyze_flights_in_simulation(df, process_names)
+
+        # 분석 실패(에러/None)는 캐시하지 않음
+        if flight_analysis is not None and "에러" not in flight_analysis:
+            _FLIGHT_ANALYSIS_CACHE[cache_key] = flight_analysis
+            if len(_FLIGHT_ANALYSIS_CACHE) > _FLIGHT_ANALYSIS_CACHE_MAX_SIZE:
+                _FLIGHT_ANALYSIS_CACHE.popitem(last=False)
+
+        return flight_analysis
+
     def _analyze_flights_in_simulation(self, df, process_names: list) -> Dict[str, Any]:
         """
         항공편별 분석 - 목적지, 항공편, 승객 수, 대기 시간 통계
@@ -1496,19 +1691,36 @@ class CommandExecutor:
 
         flight_analysis["전체_항공편_통계"]["총_목적지_수"] = valid_dest_count
 
+        # 프로세스별 대기시간 계산 계획을 한 번만 결정 (루프 안에서 dtype 재검사하지 않음)
+        # - status 컬럼이 없는 프로세스는 결과에서 제외
+        # - queue_wait_time이 timedelta인 경우 completed 승객의 대기 초(나머지는 NaN)를 미리 계산
+        # - 그 외에는 항상 0.0
+        group_cols = [carrier_col, 'flight_number', 'scheduled_departure_local'] if has_flight_number \
+            else [carrier_col, 'scheduled_departure_local']
+        work_df = df[['arrival_city'] + group_cols].copy()
+        wait_plan = []
+        for process_name in process_names:
+            status_col = f"{process_name}_status"
+            queue_wait_col = f"{process_name}_queue_wait_time"
+            if status_col not in df.columns:
+                continue
+            if queue_wait_col in df.columns and pd.api.types.is_timedelta64_dtype(df[queue_wait_col]):
+                wait_seconds_col = f"__{process_name}_wait_seconds"
+                work_df[wait_seconds_col] = df[queue_wait_col].dt.total_seconds().where(df[status_col] == "completed")
+                wait_plan.append((process_name, wait_seconds_col))
+            else:
+                wait_plan.append((process_name, None))
+
         total_flights = 0
 
         for destination in sorted(destinations):
             if pd.isna(destination):
                 continue
 
-            dest_df = df[df['arrival_city'] == destination]
+            dest_df = work_df[work_df['arrival_city'] == destination]
 
             # 항공편별로 그룹핑 (carrier_col + scheduled_departure_local, flight_number는 선택)
-            if has_flight_number:
-                flight_groups = dest_df.groupby([carrier_col, 'flight_number', 'scheduled_departure_local'])
-            else:
-                flight_groups = dest_df.groupby([carrier_col, 'scheduled_departure_local'])
+            flight_groups = dest_df.groupby(group_cols)
 
             flights_list = []
 
@@ -1529,13 +1741,7 @@ class CommandExecutor:
                         departure_time_str = str(departure_time)
 
                     # 시간만 추출 (HH:MM 형식)
-                    try:
-                        if 'T' in departure_time_str:
-                            time_part = departure_time_str.split('T')[1].split('+')[0].split('.')[0][:5]
-                        else:
-                            time_part = departure_time_str.split(' ')[1][:5] if ' ' in departure_time_str else departure_time_str[:5]
-                    except:
-                        time_part = str(departure_time)[:16]
+                    time_part = _extract_hhmm(departure_time_str)
                 else:
                     time_part = "N/A"
 
@@ -1553,26 +1759,13 @@ class CommandExecutor:
                 if flight_num is not None and pd.notna(flight_num):
                     flight_info["편명"] = f"{carrier_code}{flight_num}" if carrier_code else str(flight_num)
 
-                # 각 프로세스별 평균 대기 시간 계산
-                for process_name in process_names:
-                    status_col = f"{process_name}_status"
-                    queue_wait_col = f"{process_name}_queue_wait_time"
-
-                    # completed 승객만 대상
-                    if status_col in flight_df.columns:
-                        completed_mask = flight_df[status_col] == "completed"
-
-                        if queue_wait_col in flight_df.columns:
-                            queue_wait_times = flight_df.loc[completed_mask, queue_wait_col].dropna()
-
-                            if len(queue_wait_times) > 0 and pd.api.types.is_timedelta64_dtype(queue_wait_times):
-                                avg_wait_seconds = queue_wait_times.dt.total_seconds().mean()
-                                avg_wait_minutes = avg_wait_seconds / 60
-                                flight_info[f"{process_name}_평균대기_분"] = round(float(avg_wait_minutes), 2)
-                            else:
-                                flight_info[f"{process_name}_평균대기_분"] = 0.0
-                        else:
-                            flight_info[f"{process_name}_평균대기_분"] = 0.0
+                # 각 프로세스별 평균 대기 시간 계산 (completed 승객만 대상, NaN은 mean에서 제외)
+                for process_name, wait_seconds_col in wait_plan:
+                    avg_wait_seconds = flight_df[wait_seconds_col].mean() if wait_seconds_col else np.nan
+                    if pd.notna(avg_wait_seconds):
+                        flight_info[f"{process_name}_평균대기_분"] = round(float(avg_wait_seconds / 60), 2)
+                    else:
+                        flight_info[f"{process_name}_평균대기_분"] = 0.0
 
                 flights_list.append(flight_info)
 
@@ -1589,6 +1782,104 @@ class CommandExecutor:
 
         return flight_analysis
 
+    def _analyze_one_process(self, df, process_name: str, process_configs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        단일 프로세스의 시뮬레이션 결과 분석 (처리 결과, 대기 시간, 큐 길이, 시설/zone 분포)
+
+        다른 프로세스와 독립적이며 df를 읽기만 하므로 스레드에서 병렬 실행해도 안전합니다.
+
+        Args:
+            df: pandas DataFrame (simulation-pax.parquet)
+            process_name: 프로세스 이름
+            process_configs: metadata에서 추출한 프로세스별 설정
+
+        Returns:
+            프로세스 분석 결과
+        """
+        process_analysis = {
+            "프로세스_설정": process_configs.get(process_name, {}),
+        }
+
+        # Status 분석
+        status_col = f"{process_name}_status"
+        if status_col in df.columns:
+            status_counts = _count_statuses(df[status_col])
+            total = len(df)
+
+            process_analysis["처리_결과"] = {
+                status: {
+                    "승객_수": count,
+                    "비율_%": round(count / total * 100, 2)
+                }
+                for status, count in status_counts.items()
+            }
+
+        # 대기 시간 분석 (completed 승객만)
+        completed_mask = df[status_col] == "completed" if status_col in df.columns else pd.Series(False, index=df.index)
+
+        # open_wait_time: 시설 오픈 대기 시간
+        open_wait_col = f"{process_name}_open_wait_time"
+        if open_wait_col in df.columns:
+            open_wait_times = df.loc[completed_mask, open_wait_col].dropna()
+            if len(open_wait_times) > 0 and pd.api.types.is_timedelta64_dtype(open_wait_times):
+                open_wait_seconds = open_wait_times.dt.total_seconds()
+                open_wait_minutes = open_wait_seconds / 60
+
+                process_analysis["오픈_대기시간_분"] = {
+                    "평균": round(float(open_wait_minutes.mean()), 2),
+                    "중앙값": round(float(open_wait_minutes.median()), 2),
+                    "최대": round(float(open_wait_minutes.max()), 2),
+                    "설명": "시설이 아직 오픈하지 않아서 기다린 시간"
+                }
+
+        # queue_wait_time: 큐 대기 시간
+        queue_wait_col = f"{process_name}_queue_wait_time"
+        if queue_wait_col in df.columns:
+            queue_wait_times = df.loc[completed_mask, queue_wait_col].dropna()
+            if len(queue_wait_times) > 0 and pd.api.types.is_timedelta64_dtype(queue_wait_times):
+                queue_wait_seconds = queue_wait_times.dt.total_seconds()
+                queue_wait_minutes = queue_wait_seconds / 60
+
+                process_analysis["큐_대기시간_분"] = {
+                    "평균": round(float(queue_wait_minutes.mean()), 2),
+                    "중앙값": round(float(queue_wait_minutes.median()), 2),
+                    "최대": round(float(queue_wait_minutes.max()), 2),
+                    "설명": "시설이 이미 다른 승객을 처리 중이어서 대기한 시간"
+                }
+
+        # 큐 길이 분석
+        queue_length_col = f"{process_name}_queue_length"
+        if queue_length_col in df.columns:
+            queue_lengths = df.loc[completed_mask, queue_length_col].dropna()
+            if len(queue_lengths) > 0:
+                process_analysis["큐_길이_통계"] = {
+                    "평균": round(float(queue_lengths.mean()), 2),
+                    "중앙값": round(float(queue_lengths.median()), 2),
+                    "최대": int(queue_lengths.max()),
+                    "설명": "승객이 도착했을 때 앞에 대기 중인 승객 수"
+                }
+
+        # 시설 사용 분석
+        facility_col = f"{process_name}_facility"
+        if facility_col in df.columns:
+            used_facility_count, top_facilities = _top_k_counts(df.loc[completed_mask, facility_col], k=10)
+
+            process_analysis["시설_활용도"] = {
+                "총_사용된_시설_수": used_facility_count,
+                "상위_10개_시설": top_facilities,
+                "설명": "각 시설이 처리한 승객 수"
+            }
+
+        # Zone 분포
+        zone_col = f"{process_name}_zone"
+        if zone_col in df.columns:
+            zone_counts = df.loc[completed_mask, zone_col].value_counts().to_dict()
+            process_analysis["zone_분포"] = {
+                str(k): int(v) for k, v in zone_counts.items()
+            }
+
+        return process_analysis
+
     async def _analyze_simulation_pax_with_response(self, df, scenario_id: str) -> Dict[str, Any]:
         """
         simulation-pax.parquet 분석 - Lambda 시뮬레이션 로직 기반 설명
@@ -1620,6 +1911,9 @@ class CommandExecutor:
         logger.info(f"Analyzing simulation-pax.parquet: {len(df)} rows, {len(df.columns)} columns")
         logger.info(f"Checking for flight info columns: arrival_city={('arrival_city' in df.columns)}, carrier={('carrier' in df.columns)}, flight_number={('flight_number' in df.columns)}")
 
+        # 항공편 그룹핑 키를 Arrow 문자열로 변환 (groupby 시 Python 객체 해싱 회피)
+        self._use_arrow_string_keys(df)
+
         # metadata.json에서 process_flow 정보 로드
         metadata = None
         try:
@@ -1681,98 +1975,14 @@ class CommandExecutor:
                     "entry_conditions": proc.get("entry_conditions", [])
                 }
 
-        # 각 프로세스별 분석
-        for process_name in process_names:
-            process_analysis = {
-                "프로세스_설정": process_configs.get(process_name, {}),
-            }
-
-            # Status 분석
-            status_col = f"{process_name}_status"
-            if status_col in df.columns:
-                status_counts = df[status_col].value_counts().to_dict()
-                total = len(df)
-
-                process_analysis["처리_결과"] = {
-                    "completed": {
-                        "승객_수": status_counts.get("completed", 0),
-                        "비율_%": round(status_counts.get("completed", 0) / total * 100, 2)
-                    },
-                    "failed": {
-                        "승객_수": status_counts.get("failed", 0),
-                        "비율_%": round(status_counts.get("failed", 0) / total * 100, 2)
-                    },
-                    "skipped": {
-                        "승객_수": status_counts.get("skipped", 0),
-                        "비율_%": round(status_counts.get("skipped", 0) / total * 100, 2)
-                    }
-                }
-
-            # 대기 시간 분석 (completed 승객만)
-            completed_mask = df[status_col] == "completed" if status_col in df.columns else pd.Series(False, index=df.index)
-
-            # open_wait_time: 시설 오픈 대기 시간
-            open_wait_col = f"{process_name}_open_wait_time"
-            if open_wait_col in df.columns:
-                open_wait_times = df.loc[completed_mask, open_wait_col].dropna()
-                if len(open_wait_times) > 0 and pd.api.types.is_timedelta64_dtype(open_wait_times):
-                    open_wait_seconds = open_wait_times.dt.total_seconds()
-                    open_wait_minutes = open_wait_seconds / 60
-
-                    process_analysis["오픈_대기시간_분"] = {
-                        "평균": round(float(open_wait_minutes.mean()), 2),
-                        "중앙값": round(float(open_wait_minutes.median()), 2),
-                        "최대": round(float(open_wait_minutes.max()), 2),
-                        "설명": "시설이 아직 오픈하지 않아서 기다린 시간"
-                    }
-
-            # queue_wait_time: 큐 대기 시간
-            queue_wait_col = f"{process_name}_queue_wait_time"
-            if queue_wait_col in df.columns:
-                queue_wait_times = df.loc[completed_mask, queue_wait_col].dropna()
-                if len(queue_wait_times) > 0 and pd.api.types.is_timedelta64_dtype(queue_wait_times):
-                    queue_wait_seconds = queue_wait_times.dt.total_seconds()
-                    queue_wait_minutes = queue_wait_seconds / 60
-
-                    process_analysis["큐_대기시간_분"] = {
-                        "평균": round(float(queue_wait_minutes.mean()), 2),
-                        "중앙값": round(float(queue_wait_minutes.median()), 2),
-                        "최대": round(float(queue_wait_minutes.max()), 2),
-                        "설명": "시설이 이미 다른 승객을 처리 중이어서 대기한 시간"
-                    }
-
-            # 큐 길이 분석
-            queue_length_col = f"{process_name}_queue_length"
-            if queue_length_col in df.columns:
-                queue_lengths = df.loc[completed_mask, queue_length_col].dropna()
-                if len(queue_lengths) > 0:
-                    process_analysis["큐_길이_통계"] = {
-                        "평균": round(float(queue_lengths.mean()), 2),
-                        "중앙값": round(float(queue_lengths.median()), 2),
-                        "최대": int(queue_lengths.max()),
-                        "설명": "승객이 도착했을 때 앞에 대기 중인 승객 수"
-                    }
-
-            # 시설 사용 분석
-            facility_col = f"{process_name}_facility"
-            if facility_col in df.columns:
-                facility_counts = df.loc[completed_mask, facility_col].value_counts()
-
-                process_analysis["시설_활용도"] = {
-                    "총_사용된_시설_수": len(facility_counts),
-                    "상위_10개_시설": facility_counts.head(10).to_dict(),
-                    "설명": "각 시설이 처리한 승객 수"
-                }
-
-            # Zone 분포
-            zone_col = f"{process_name}_zone"
-            if zone_col in df.columns:
-                zone_counts = df.loc[completed_mask, zone_col].value_counts().to_dict()
-                process_analysis["zone_분포"] = {
-                    str(k): int(v) for k, v in zone_counts.items()
-                }
-
-            analysis["프로세스별_분석"][process_name] = process_analysis
+        # 각 프로세스별 분석 (프로세스 간 독립적이므로 기본 스레드 풀에서 병렬 처리, 결과 순서는 유지)
+        # pandas 연산을 스레드로 넘겨 분석하는 동안 이벤트 루프가 다른 요청을 처리할 수 있도록 함
+        if process_names:
+            process_results = await asyncio.gather(*(
+                asyncio.to_thread(self._analyze_one_process, df, name, process_configs)
+                for name in process_names
+            ))
+            analysis["프로세스별_분석"] = dict(zip(process_names, process_results))
 
         # 전체 처리 통계
         if process_names:
@@ -1782,11 +1992,11 @@ class CommandExecutor:
             # 전체 완료율 (마지막 프로세스 기준)
             last_status_col = f"{last_process}_status"
             if last_status_col in df.columns:
-                last_status_counts = df[last_status_col].value_counts().to_dict()
+                last_status_counts = _count_statuses(df[last_status_col])
                 total = len(df)
 
                 analysis["전체_처리_통계"]["최종_완료율_%"] = round(
-                    last_status_counts.get("completed", 0) / total * 100, 2
+                    last_status_counts["completed"] / total * 100, 2
                 )
 
             # 총 처리 시간 (첫 프로세스 시작 ~ 마지막 프로세스 완료)
@@ -1833,7 +2043,7 @@ class CommandExecutor:
 
         # 항공편별 분석 추가 (Lambda는 show-up-passenger의 모든 컬럼을 유지함)
         logger.info("Calling _analyze_flights_in_simulation...")
-        flight_analysis = self._analyze_flights_in_simulation(df, process_names)
+        flight_analysis = self._get_flight_analysis(df, process_names, scenario_id)
 
         if flight_analysis is None:
             logger.error("Flight analysis returned None - this should not happen")
@@ -1846,7 +2056,7 @@ class CommandExecutor:
         logger.info(f"Flight analysis completed. Keys: {list(flight_analysis.keys())}")
 
         # summary_info 생성 (AI에게 전달할 형식)
-        # 항공편별_분석을 앞쪽에 배치하여 JSON 직렬화 시 20000자 제한에 잘리지 않도록 함
+        # 항공편별_분석을 앞쪽에 배치하여 JSON 직렬화 시 미리보기 길이 제한에 잘리지 않도록 함 (orjson은 삽입 순서 유지)
         summary_info = {
             "파일명": "simulation-pax.parquet",
             "기본_정보": analysis["기본_정보"],
@@ -1885,9 +2095,34 @@ class CommandExecutor:
         """
         시나리오 컨텍스트 조회 (AI에게 제공할 정보)
 
+        최근 조회 결과는 짧은 TTL 동안 캐시해 재사용하고, 같은 시나리오의 동시 조회는 S3를 한 번만 읽습니다.
+        조회 실패(error) 결과는 캐시하지 않습니다. 반환 dict는 캐시와 공유되므로 수정하지 않아야 합니다.
+
         Returns:
             시나리오 컨텍스트 정보
         """
+        cached = _scenario_context_cache_get(scenario_id)
+        if cached is not None:
+            return cached
+
+        task = _scenario_context_inflight.get(scenario_id)
+        if task is None:
+            task = asyncio.create_task(self._load_and_cache_scenario_context(scenario_id))
+            _scenario_context_inflight[scenario_id] = task
+            task.add_done_callback(lambda done, key=scenario_id: _scenario_context_inflight_done(key, done))
+        # 취소되는 것은 이 호출뿐이고 조회 태스크는 계속 진행 (다른 대기자는 그대로 결과를 받음)
+        return await asyncio.shield(task)
+
+    async def _load_and_cache_scenario_context(self, scenario_id: str) -> Dict[str, Any]:
+        """컨텍스트를 조회하고 성공한 결과를 캐시에 저장 (single-flight 태스크로 실행)"""
+        context = await self._load_scenario_context(scenario_id)
+        # 조회 도중 add/remove_process로 무효화되지 않은 경우에만 캐시에 저장
+        if "error" not in context and _scenario_context_inflight.get(scenario_id) is asyncio.current_task():
+            _scenario_context_cache_put(scenario_id, context)
+        return context
+
+    async def _load_scenario_context(self, scenario_id: str) -> Dict[str, Any]:
+        """S3 metadata에서 시나리오 컨텍스트 구성"""
         try:
             metadata_result = await self.simulation_service.load_scenario_metadata(scenario_id)
             metadata = metadata_result.get("metadata", {})
@@ -1,86 +1,86 @@
 """
 명령 파싱 서비스 - Function Calling을 사용하여 사용자 명령을 파싱
 """
-import json
-import math
-import os
+import asyncio
+import copy
+import hashlib
+import random
 import re
-import aiohttp
-from typing import Dict, Any, Optional
+import time
+import httpx
+import orjson
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import islice
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from loguru import logger
-
-from app.routes.ai_agent.interface.schema import Message
-from .command_executor import CommandExecutor
-
-
-class CommandParser:
-    """명령 파싱 전담 클래스 - Function Calling 사용"""
-    
-    def __init__(self, command_executor: CommandExecutor):
-        self.command_executor = command_executor
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        self.base_url = "https://api.openai.com/v1"
-    
-    def _get_functions(self) -> list:
-        """Function Calling용 함수 정의"""
-        return [
-            {
-                "name": "add_process",
-                "description": "프로세스 플로우에 새 프로세스를 추가합니다. 예: 'checkin 프로세스 추가해줘', '보안검색 단계 추가'",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "process_name": {
-                            "type": "string",
-                            "description": "추가할 프로세스 이름 (예: checkin, security_check, 체크인, 보안검색)"
-                        }
-                    },
-                    "required": ["process_name"],
-                    "additionalProperties": False
-                },
-                "strict": True  # Structured Outputs 활성화
+from pydantic import ConfigDict, TypeAdapter, ValidationError, with_config
+from typing_extensions import TypedDict
+
+from .command_executor import CommandExecutor, normalize_process_name
+from .openai_client import encode_openai_request_body, get_openai_client, get_openai_rate_limiter
+
+
+# Function Calling용 함수 정의 (모듈 로드 시 1회 생성, 요청마다 재생성하지 않음)
+# 공유 객체이므로 수정하지 말 것
+_FUNCTIONS = [
+    {
+        "name": "add_process",
+        "description": "프로세스 플로우에 새 프로세스를 추가합니다. 예: 'checkin 프로세스 추가해줘', '보안검색 단계 추가'",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "process_name": {
+                    "type": "string",
+                    "description": "추가할 프로세스 이름 (예: checkin, security_check, 체크인, 보안검색)"
+                }
             },
-            {
-                "name": "remove_process",
-                "description": "프로세스 플로우에서 프로세스를 삭제합니다. 예: 'checkin 프로세스 삭제해줘', '보안검색 단계 제거'",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "process_name": {
-                            "type": "string",
-                            "description": "삭제할 프로세스 이름"
-                        }
-                    },
-                    "required": ["process_name"],
-                    "additionalProperties": False
-                },
-                "strict": True
+            "required": ["process_name"],
+            "additionalProperties": False
+        },
+        "strict": True  # Structured Outputs 활성화
+    },
+    {
+        "name": "remove_process",
+        "description": "프로세스 플로우에서 프로세스를 삭제합니다. 예: 'checkin 프로세스 삭제해줘', '보안검색 단계 제거'",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "process_name": {
+                    "type": "string",
+                    "description": "삭제할 프로세스 이름"
+                }
             },
-            {
-                "name": "list_processes",
-                "description": "현재 프로세스 플로우 목록을 조회합니다. 예: '프로세스 목록 보여줘', '현재 설정된 단계들 알려줘'",
-                "parameters": {
-                    "type": "object",
-                    "properties": {},
-                    "required": [],
-                    "additionalProperties": False
-                },
-                "strict": True
-            },
-            {
-                "name": "list_files",
-                "description": "S3 폴더에 있는 파일 목록을 조회합니다. 예: '무슨 파일 있는지 확인해', 'S3 파일 목록 보여줘', '시나리오 폴더의 파일들 알려줘'",
-                "parameters": {
-                    "type": "object",
-                    "properties": {},
-                    "required": [],
-                    "additionalProperties": False
-                },
-                "strict": True
-            },
-            {
-                "name": "read_file",
-                "description": """시뮬레이션 결과 데이터를 읽고 분석합니다.
+            "required": ["process_name"],
+            "additionalProperties": False
+        },
+        "strict": True
+    },
+    {
+        "name": "list_processes",
+        "description": "현재 프로세스 플로우 목록을 조회합니다. 예: '프로세스 목록 보여줘', '현재 설정된 단계들 알려줘'",
+        "parameters": {
+            "type": "object",
+            "properties": {},
+            "required": [],
+            "additionalProperties": False
+        },
+        "strict": True
+    },
+    {
+        "name": "list_files",
+        "description": "S3 폴더에 있는 파일 목록을 조회합니다. 예: '무슨 파일 있는지 확인해', 'S3 파일 목록 보여줘', '시나리오 폴더의 파일들 알려줘'",
+        "parameters": {
+            "type": "object",
+            "properties": {},
+            "required": [],
+            "additionalProperties": False
+        },
+        "strict": True
+    },
+    {
+        "name": "read_file",
+        "description": """시뮬레이션 결과 데이터를 읽고 분석합니다.
 
 ⚠️ IMPORTANT - When to use this function:
 - Configuration data (airport, date, flights, passengers, processes) → ALWAYS use simulation_state, NOT read_file
@@ -107,378 +107,507 @@ class CommandParser:
 - "프로세스가 몇 개야?" → Use simulation_state['process_count']
 
 Only use read_file when the user asks about simulation RESULTS (.parquet files).""",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "filename": {
-                            "type": "string",
-                            "description": "읽을 파일 이름: show-up-passenger.parquet (승객 도착 시간 결과), simulation-pax.parquet (시뮬레이션 대기시간 결과), flight-schedule.parquet (항공편 스케줄 정보). ⚠️ Configuration questions should use simulation_state, NOT read_file."
-                        }
-                    },
-                    "required": ["filename"],
-                    "additionalProperties": False
-                },
-                "strict": True
-            }
-        ]
-    
-    async def parse_command(
-        self,
-        user_content: str,
-        scenario_id: str,
-        conversation_history: list = None,
-        simulation_state: dict = None,
-        model: str = "gpt-4o-mini",
-        temperature: float = 0.1
-    ) -> Dict[str, Any]:
-        """
-        사용자 명령을 파싱하여 실행 가능한 액션으로 변환
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "filename": {
+                    "type": "string",
+                    "description": "읽을 파일 이름: show-up-passenger.parquet (승객 도착 시간 결과), simulation-pax.parquet (시뮬레이션 대기시간 결과), flight-schedule.parquet (항공편 스케줄 정보). ⚠️ Configuration questions should use simulation_state, NOT read_file."
+                }
+            },
+            "required": ["filename"],
+            "additionalProperties": False
+        },
+        "strict": True
+    }
+]
 
-        Args:
-            user_content: 사용자 명령 (예: "checkin 프로세스 추가해줘")
-            scenario_id: 시나리오 ID
-            conversation_history: 이전 대화 이력 (옵션)
-            simulation_state: 현재 시뮬레이션 상태 (Zustand store에서 추출)
-            model: 사용할 OpenAI 모델
-            temperature: temperature 설정
+# 함수별 인자 스키마 (_FUNCTIONS의 parameters와 동일)
+# JSON 문자열을 pydantic(Rust 코어)이 파싱과 검증을 한 번에 수행 → 필수 인자 누락도 여기서 걸러짐
+# TypedDict + TypeAdapter로 검증 결과를 바로 dict로 받음 (모델 인스턴스 생성 후 model_dump 하는 왕복 없음)
+# 스키마의 additionalProperties: false와 같게 정의되지 않은 인자는 거부
+_FORBID_EXTRA_ARGS = ConfigDict(extra="forbid")
 
-        Returns:
-            파싱된 명령 정보
-        """
-        try:
-            # 1. 시나리오 컨텍스트 조회
-            context = await self.command_executor.get_scenario_context(scenario_id)
-            
-            # 2. System Prompt 구성
-            # 현재 시뮬레이션 상태 정보 추가
-            simulation_status = ""
-            if simulation_state:
-                # 항공사 이름 리스트 생성
-                airline_names = simulation_state.get('airline_names', [])
-                airline_str = ', '.join(airline_names[:5]) if airline_names else 'None'
-                if len(airline_names) > 5:
-                    airline_str += f' and {len(airline_names) - 5} more'
-
-                # Passenger 데이터 추출 (None 안전 처리)
-                passenger_data = simulation_state.get('passenger') or {}
-                passenger_total = passenger_data.get('total', 0)
-                pax_gen = passenger_data.get('pax_generation') or {}
-                pax_demo = passenger_data.get('pax_demographics') or {}
-                pax_arrival = passenger_data.get('pax_arrival_patterns') or {}
-                chart_result = passenger_data.get('chartResult') or {}
-
-                # 탑승률 요약 (default + rules)
-                load_factor = (pax_gen.get('default') or {}).get('load_factor', 'Not set')
-                load_factor_str = f"{load_factor}%"
-                load_factor_rules = pax_gen.get('rules') or []
-                if load_factor_rules:
-                    load_factor_str += " (default)"
-                    for rule in load_factor_rules:
-                        rule_lf = rule.get('load_factor', '')
-                        rule_conditions = rule.get('conditions', {})
-                        cond_parts = []
-                        for field, values in rule_conditions.items():
-                            if isinstance(values, list):
-                                cond_parts.append(f"{field}={','.join(str(v) for v in values)}")
-                            else:
-                                cond_parts.append(f"{field}={values}")
-                        cond_str = ', '.join(cond_parts) if cond_parts else 'unknown condition'
-                        load_factor_str += f" / When {cond_str} → {rule_lf}%"
-
-                # 국적 요약 (default + rules)
-                nationality_data_raw = pax_demo.get('nationality') or {}
-                nationality_default = nationality_data_raw.get('default') or {}
-                nationality_values = {k: v for k, v in nationality_default.items() if k != 'flightCount'}
-                nationality_str = ', '.join([f"{k}: {v}%" for k, v in nationality_values.items()]) if nationality_values else 'Not configured'
-                nationality_rules = nationality_data_raw.get('rules') or []
-                if nationality_rules:
-                    nationality_str += f" (default)"
-                    for rule in nationality_rules:
-                        rule_values = {k: v for k, v in rule.items() if k not in ('conditions', 'flightCount')}
-                        rule_conditions = rule.get('conditions', {})
-                        cond_parts = []
-                        for field, values in rule_conditions.items():
-                            if isinstance(values, list):
-                                cond_parts.append(f"{field}={','.join(str(v) for v in values)}")
-                            else:
-                                cond_parts.append(f"{field}={values}")
-                        cond_str = ', '.join(cond_parts) if cond_parts else 'unknown condition'
-                        dist_str = ', '.join([f"{k}: {v}%" for k, v in rule_values.items()])
-                        nationality_str += f" / When {cond_str} → {dist_str}"
-
-                # 프로필 요약 (default + rules)
-                profile_data_raw = pax_demo.get('profile') or {}
-                profile_default = profile_data_raw.get('default') or {}
-                profile_values = {k: v for k, v in profile_default.items() if k != 'flightCount'}
-                profile_str = ', '.join([f"{k}: {v}%" for k, v in profile_values.items()]) if profile_values else 'Not configured'
-                profile_rules = profile_data_raw.get('rules') or []
-                if profile_rules:
-                    profile_str += f" (default)"
-                    for rule in profile_rules:
-                        rule_values = {k: v for k, v in rule.items() if k not in ('conditions', 'flightCount')}
-                        rule_conditions = rule.get('conditions', {})
-                        cond_parts = []
-                        for field, values in rule_conditions.items():
-                            if isinstance(values, list):
-                                cond_parts.append(f"{field}={','.join(str(v) for v in values)}")
-                            else:
-                                cond_parts.append(f"{field}={values}")
-                        cond_str = ', '.join(cond_parts) if cond_parts else 'unknown condition'
-                        dist_str = ', '.join([f"{k}: {v}%" for k, v in rule_values.items()])
-                        profile_str += f" / When {cond_str} → {dist_str}"
-
-                # 도착 패턴 요약 (default + rules)
-                arrival_mean = (pax_arrival.get('default') or {}).get('mean', 'Not set')
-                arrival_std = (pax_arrival.get('default') or {}).get('std', 'Not set')
-                arrival_str = f"Mean {arrival_mean} min before departure (std: {arrival_std})"
-                arrival_rules = pax_arrival.get('rules') or []
-                if arrival_rules:
-                    arrival_str += " (default)"
-                    for rule in arrival_rules:
-                        rule_mean = rule.get('mean', '')
-                        rule_std = rule.get('std', '')
-                        rule_conditions = rule.get('conditions', {})
-                        cond_parts = []
-                        for field, values in rule_conditions.items():
-                            if isinstance(values, list):
-                                cond_parts.append(f"{field}={','.join(str(v) for v in values)}")
-                            else:
-                                cond_parts.append(f"{field}={values}")
-                        cond_str = ', '.join(cond_parts) if cond_parts else 'unknown condition'
-                        arrival_str += f" / When {cond_str} → mean {rule_mean} min (std: {rule_std})"
-
-                # 실제 데이터를 JSON으로 직렬화 (하드코딩 예시 대신 사용)
-                pax_gen_json = json.dumps(pax_gen, ensure_ascii=False, indent=2) if pax_gen else '{}'
-                nationality_data = (pax_demo.get('nationality') or {})
-                nationality_json = json.dumps(nationality_data, ensure_ascii=False, indent=2) if nationality_data else '{}'
-                profile_data = (pax_demo.get('profile') or {})
-                profile_json = json.dumps(profile_data, ensure_ascii=False, indent=2) if profile_data else '{}'
-                pax_arrival_json = json.dumps(pax_arrival, ensure_ascii=False, indent=2) if pax_arrival else '{}'
-                chart_result_summary = (chart_result.get('summary') or {})
-                chart_result_summary_json = json.dumps(chart_result_summary, ensure_ascii=False, indent=2) if chart_result_summary else '{}'
-                chart_result_json = json.dumps(chart_result, ensure_ascii=False, indent=2) if chart_result else '{}'
-
-                # 🆕 프로세스/시설 요약 생성 (실제 데이터에서 추출)
-                process_flow = simulation_state.get('process_flow') or []
-                process_summary_lines = []
-                total_facilities = 0
-                for proc in process_flow:
-                    proc_name = proc.get('name', 'Unknown')
-                    travel_time = proc.get('travel_time_minutes', 0)
-                    process_time = proc.get('process_time_seconds', 'Not set')
-                    entry_conditions = proc.get('entry_conditions', [])
-                    zones = proc.get('zones', {})
-                    zone_count = len(zones)
-                    zone_names = list(zones.keys())[:5]
-                    zone_str = ', '.join(zone_names) if zone_names else 'No zones'
-                    if len(zones) > 5:
-                        zone_str += f' +{len(zones) - 5} more'
-
-                    # Extract operating hours, passenger_conditions, and count active/closed facilities
-                    operating_hours = set()
-                    all_passenger_conditions = []
-                    active_facility_count = 0
-                    closed_facility_count = 0
-                    closed_facility_ids = []
-
-                    for zone_data in zones.values():
-                        for facility in zone_data.get('facilities', []):
-                            facility_id = facility.get('id', 'Unknown')
-                            # Check if facility has any active time_block
-                            has_active_block = False
-                            for block in (facility.get('operating_schedule') or {}).get('time_blocks', []):
-                                if block.get('activate', True):  # Default is True (operating)
-                                    has_active_block = True
-                                    period = block.get('period', '')
-                                    if period:
-                                        operating_hours.add(period)
-                                    # Collect passenger_conditions
-                                    pax_conds = block.get('passenger_conditions', [])
-                                    if pax_conds:
-                                        all_passenger_conditions.extend(pax_conds)
-
-                            if has_active_block:
-                                active_facility_count += 1
-                            else:
-                                closed_facility_count += 1
-                                closed_facility_ids.append(facility_id)
-
-                    total_facilities += active_facility_count
-
-                    # Format operating hours (period format: "2026-03-01 05:00:00-2026-03-01 06:00:00")
-                    if operating_hours:
-                        # Get min start and max end from all periods
-                        all_starts = []
-                        all_ends = []
-                        for period in operating_hours:
-                            if '-' in period:
-                                parts = period.split('-')
-                                # Format: YYYY-MM-DD HH:MM:SS-YYYY-MM-DD HH:MM:SS (6 parts when split by '-')
-                                if len(parts) >= 6:
-                                    start_datetime = f"{parts[0]}-{parts[1]}-{parts[2]}"
-                                    end_datetime = f"{parts[3]}-{parts[4]}-{parts[5]}"
-                                    start_time = start_datetime.split(' ')[1][:5] if ' ' in start_datetime else ''
-                                    end_time = end_datetime.split(' ')[1][:5] if ' ' in end_datetime else ''
-                                    if start_time:
-                                        all_starts.append(start_time)
-                                    if end_time:
-                                        all_ends.append(end_time)
-                        if all_starts and all_ends:
-                            hours_str = f"{min(all_starts)} ~ {max(all_ends)}"
-                        else:
-                            hours_str = 'All day (no time restrictions)'
-                    else:
-                        hours_str = 'All day (no time restrictions)'
-
-                    # Format entry_conditions
-                    if entry_conditions:
-                        entry_str = ', '.join([f"{c.get('field')}={c.get('values')}" for c in entry_conditions])
-                    else:
-                        entry_str = 'All passengers (no restrictions)'
-
-                    # Format passenger_conditions
-                    if all_passenger_conditions:
-                        unique_conds = {f"{c.get('field')}={c.get('values')}" for c in all_passenger_conditions}
-                        pax_cond_str = ', '.join(unique_conds)
-                    else:
-                        pax_cond_str = 'All passengers (no restrictions)'
-
-                    # Format facility status line
-                    if closed_facility_count > 0:
-                        closed_ids_str = ', '.join(closed_facility_ids[:5])
-                        if closed_facility_count > 5:
-                            closed_ids_str += f' +{closed_facility_count - 5} more'
-                        facility_status = f"{active_facility_count} active, {closed_facility_count} closed ({closed_ids_str})"
-                    else:
-                        facility_status = f"{active_facility_count} active"
-
-                    # 🆕 Helper function to translate field names to human-readable descriptions
-                    airlines_mapping = simulation_state.get('airlines_mapping', {})
-
-                    def translate_condition(field, values):
-                        """Translate field/values to human-readable description"""
-                        field_translations = {
-                            'arrival_airport_iata': 'Destination',
-                            'departure_airport_iata': 'Origin',
-                            'operating_carrier_iata': 'Airline',
-                            'flight_type': 'Flight type',
-                            'nationality': 'Nationality',
-                            'profile': 'Passenger type',
-                            'terminal': 'Terminal',
-                            'flight_number': 'Flight number',
-                        }
-                        field_name = field_translations.get(field, field)
-
-                        # Format values nicely
-                        if isinstance(values, list):
-                            if field == 'operating_carrier_iata':
-                                values_str = ', '.join(f"{airlines_mapping.get(v, v)} ({v})" for v in values)
-                            else:
-                                values_str = ', '.join(str(v) for v in values)
-                        else:
-                            if field == 'operating_carrier_iata':
-                                values_str = f"{airlines_mapping.get(values, values)} ({values})"
-                            else:
-                                values_str = str(values)
-
-                        return f"{field_name}: {values_str}"
-
-                    # 🆕 Generate per-facility details with time-block breakdown
-                    facility_details_lines = []
-                    for zone_name, zone_data in zones.items():
-                        for facility in zone_data.get('facilities', []):
-                            fac_id = facility.get('id', 'Unknown')
-                            time_blocks = (facility.get('operating_schedule') or {}).get('time_blocks', [])
-
-                            # Collect detailed info per time block
-                            block_details = []
-                            has_any_active = False
-
-                            for block in time_blocks:
-                                activate = block.get('activate', True)
-                                proc_time_block = block.get('process_time_seconds', process_time)
-                                period = block.get('period', '')
-                                pax_conds = block.get('passenger_conditions', [])
-
-                                # Extract time range (format: "2026-03-01 05:00:00-2026-03-01 06:00:00")
-                                time_range = ''
-                                if period:
-                                    try:
-                                        # Split by the datetime separator (find the middle '-' that separates two datetimes)
-                                        # Format: YYYY-MM-DD HH:MM:SS-YYYY-MM-DD HH:MM:SS
-                                        parts = period.split('-')
-                                        # Reconstruct: first 3 parts are start date, rest are end datetime
-                                        if len(parts) >= 6:
-                                            start_datetime = f"{parts[0]}-{parts[1]}-{parts[2]}"  # YYYY-MM-DD HH:MM:SS
-                                            end_datetime = f"{parts[3]}-{parts[4]}-{parts[5]}"    # YYYY-MM-DD HH:MM:SS
-                                            start_t = start_datetime.split(' ')[1][:5] if ' ' in start_datetime else ''
-                                            end_t = end_datetime.split(' ')[1][:5] if ' ' in end_datetime else ''
-                                            time_range = f"{start_t}~{end_t}"
-                                    except:
-                                        time_range = 'unknown'
-
-                                # Translate passenger conditions
-                                if pax_conds:
-                                    conds_translated = [translate_condition(c.get('field'), c.get('values')) for c in pax_conds]
-                                    conds_str = ' AND '.join(conds_translated)
-                                else:
-                                    conds_str = 'All passengers'
-
-                                status_str = "OPEN" if activate else "CLOSED"
-                                if activate:
-                                    has_any_active = True
-
-                                block_details.append({
-                                    'time': time_range,
-                                    'status': status_str,
-                                    'process_time': proc_time_block,
-                                    'conditions': conds_str,
-                                    'activate': activate
-                                })
-
-                            # Format facility output
-                            fac_status = "CLOSED (all time blocks)" if not has_any_active else "ACTIVE"
-
-                            # Build detailed time block info
-                            block_lines = []
-                            for bd in block_details:
-                                if bd['activate']:
-                                    block_lines.append(f"          [{bd['time']}] {bd['process_time']}s, {bd['conditions']}")
-                                else:
-                                    block_lines.append(f"          [{bd['time']}] CLOSED")
-
-                            block_info = '\n'.join(block_lines) if block_lines else '          (no time blocks)'
-
-                            facility_details_lines.append(
-                                f"      - {fac_id} [{fac_status}]:\n{block_info}"
-                            )
-
-                    facility_details = '\n'.join(facility_details_lines) if facility_details_lines else '      (No facilities)'
-
-                    process_summary_lines.append(
-                        f"  - {proc_name}: {zone_count} zone(s), {facility_status}\n"
-                        f"    * Zones: {zone_str}\n"
-                        f"    * Travel time: {travel_time} min (time for passengers to reach this facility)\n"
-                        f"    * Process time (default): {process_time} sec\n"
-                        f"    * Operating hours: {hours_str}\n"
-                        f"    * Entry conditions: {entry_str}\n"
-                        f"    * Facility Details (per-facility conditions and status):\n{facility_details}"
+
+@with_config(_FORBID_EXTRA_ARGS)
+class _NoArgs(TypedDict):
+    pass
+
+
+@with_config(_FORBID_EXTRA_ARGS)
+class _ProcessNameArgs(TypedDict):
+    process_name: str
+
+
+@with_config(_FORBID_EXTRA_ARGS)
+class _ReadFileArgs(TypedDict):
+    filename: str
+
+
+# TypeAdapter는 생성 시 검증기를 빌드하므로 import 시 1회만 생성
+_ARG_ADAPTERS = {
+    "add_process": TypeAdapter(_ProcessNameArgs),
+    "remove_process": TypeAdapter(_ProcessNameArgs),
+    "list_processes": TypeAdapter(_NoArgs),
+    "list_files": TypeAdapter(_NoArgs),
+    "read_file": TypeAdapter(_ReadFileArgs),
+}
+
+
+def _parse_function_args(function_name: str, function_args_str: str) -> Dict[str, Any]:
+    """tool call 인자 JSON을 함수별 스키마로 파싱/검증 (스키마 없는 함수는 JSON만 파싱)"""
+    arg_adapter = _ARG_ADAPTERS.get(function_name)
+    if arg_adapter is None:
+        return orjson.loads(function_args_str)
+    return arg_adapter.validate_json(function_args_str)
+
+
+# OpenAI tools 형식으로 감싼 함수 목록 (요청 payload에 그대로 사용)
+_TOOLS = [{"type": "function", "function": f} for f in _FUNCTIONS]
+
+# 함수 스키마와 tool 호출 옵션은 변하지 않으므로 import 시 1회만 직렬화하고, 요청 body 앞부분에 bytes로 이어 붙임
+# (tools를 맨 앞에 두어 body가 매 요청 동일한 정적 bytes로 시작하도록 함)
+# - tool_choice "auto": AI가 적절한 함수 선택 (fast path가 action만 특정한 경우 해당 함수로 지정)
+# - parallel_tool_calls false: 첫 번째 tool call만 사용하므로 단일 호출로 제한 (쓰지 않을 추가 호출 생성 대기 방지)
+# tool_choice를 지정할 때도 tools 목록은 그대로 보냄 (목록을 줄이면 프롬프트 캐시 prefix가 달라짐)
+def _tools_json_prefix(tool_choice: Any) -> bytes:
+    return b"".join([
+        b'{"tools":',
+        orjson.dumps(_TOOLS),
+        b',"tool_choice":',
+        orjson.dumps(tool_choice),
+        b',"parallel_tool_calls":false,',
+    ])
+
+
+_TOOLS_JSON_PREFIX = _tools_json_prefix("auto")
+_FORCED_TOOLS_JSON_PREFIXES = {
+    f["name"]: _tools_json_prefix({"type": "function", "function": {"name": f["name"]}}) for f in _FUNCTIONS
+}
+
+
+def _dumps_with_tools(payload: dict, forced_function: Optional[str] = None) -> bytes:
+    """
+    payload dict를 직렬화하고 미리 직렬화된 tools/tool 옵션 필드를 앞에 붙임
+
+    forced_function을 주면 tool_choice로 해당 함수 호출을 강제합니다.
+    """
+    prefix = _FORCED_TOOLS_JSON_PREFIXES[forced_function] if forced_function else _TOOLS_JSON_PREFIX
+    body = orjson.dumps(payload)
+    if body == b"{}":
+        return prefix[:-1] + b"}"  # 이어 붙일 필드가 없으면 prefix 끝의 ","를 닫는 괄호로 바꿈
+    return prefix + body[1:]
+
+
+def _dumps_indented(data: Any) -> str:
+    """프롬프트 삽입용 들여쓰기 JSON (json.dumps(indent=2, ensure_ascii=False) 대체, orjson 사용)"""
+    return orjson.dumps(data, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+
+# analyze_file_content: 프롬프트에 넣는 파일 내용 상한 (추정 토큰 기준, ASCII 약 6만 자)
+_FILE_CONTENT_MAX_TOKENS = 20000
+_FILE_CONTENT_TRUNCATED_NOTICE = "\n\n... (내용이 길어 일부만 표시했습니다)"
+_FILE_CONTENT_MAX_LIST_ITEMS = 100
+
+
+def _sample_for_prompt(data: Any, max_items: int = _FILE_CONTENT_MAX_LIST_ITEMS) -> Any:
+    """직렬화 전에 긴 리스트는 앞부분만 남김 (버려질 내용까지 직렬화하지 않도록, 잘린 개수는 문자열로 표시)"""
+    if isinstance(data, dict):
+        return {key: _sample_for_prompt(value, max_items) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        sampled = [_sample_for_prompt(item, max_items) for item in data[:max_items]]
+        if len(data) > max_items:
+            sampled.append(f"... ({len(data) - max_items} more items)")
+        return sampled
+    return data
+
+
+# OpenAI rate limit 오류 메시지의 재시도 대기 시간 ("Please try again in 1.5s")
+_RETRY_AFTER_RE = re.compile(r"Please try again in (?:(\d+)m)?([\d.]+)(ms|s)\b")  # "1.2s", "350ms", "1m20s"
+
+# 인자 없는 명령의 정형화된 요청은 LLM 호출 없이 바로 분류 (문장 전체가 일치할 때만)
+# 다른 요청이 섞인 문장("목록 보여주고 체크인 추가해줘")은 일치하지 않으므로 LLM으로 처리됨
+_FAST_PATH_PATTERNS = [
+    (re.compile(
+        r"(?:please\s+)?(?:show|list|display)(?:\s+me)?(?:\s+the)?(?:\s+all)?\s+process(?:es)?(?:\s+list)?(?:\s+please)?[.!?]*",
+        re.IGNORECASE,
+    ), "list_processes"),
+    (re.compile(
+        r"(?:현재\s*)?프로세스\s*(?:목록|리스트)\s*(?:좀\s*)?(?:보여\s*줘|보여\s*주세요|알려\s*줘|알려\s*주세요)?[.!?]*"
+    ), "list_processes"),
+    (re.compile(
+        r"(?:please\s+)?(?:show|list)(?:\s+me)?(?:\s+the)?(?:\s+all)?\s+files(?:\s+please)?[.!?]*",
+        re.IGNORECASE,
+    ), "list_files"),
+    (re.compile(
+        r"(?:무슨\s*)?파일\s*(?:목록|리스트)?\s*(?:좀\s*)?(?:뭐\s*있어|있는지\s*확인해(?:\s*줘)?|보여\s*줘|보여\s*주세요|알려\s*줘)[.!?]*"
+    ), "list_files"),
+]
+
+
+# 프로세스 추가/삭제 명령 ("체크인 추가해줘", "remove security process")
+# 상태를 바꾸는 명령이므로 물음표로 끝나는 문장("체크인 삭제?")은 질문일 수 있어 일치시키지 않고 LLM으로 처리
+# 이름을 executor와 같은 normalize_process_name으로 정규화한 결과가 잘 알려진 프로세스 이름과 정확히 일치하면 바로 처리하고,
+# 그 외 이름이라도 "프로세스/단계/process/step"이 명시된 명령이면 해당 함수만 호출하도록 LLM에 tool_choice를 지정 (이름 추출만 LLM이 수행)
+_PROCESS_COMMAND_PATTERNS = [
+    (re.compile(
+        r"(?P<name>[A-Za-z][A-Za-z _-]*?|[가-힣]+?)\s*(?P<kind>프로세스|단계)?\s*(?:을|를)?\s*"
+        r"(?P<verb>추가|삭제|제거)\s*(?:해\s*줘|해\s*주세요|해|하기)?[.!]*"
+    )),
+    (re.compile(
+        r"(?:please\s+)?(?P<verb>add|remove|delete)\s+(?:the\s+|a\s+)?(?P<name>[A-Za-z][A-Za-z _-]*?)"
+        r"(?:\s+(?P<kind>process|step))?(?:\s+please)?[.!]*",
+        re.IGNORECASE,
+    )),
+]
+_PROCESS_COMMAND_ACTIONS = {
+    "추가": "add_process", "add": "add_process",
+    "삭제": "remove_process", "제거": "remove_process", "remove": "remove_process", "delete": "remove_process",
+}
+# LLM 없이 바로 처리하는 정규화된 프로세스 이름 (시스템 프롬프트 예시 + normalize_process_name의 한글 매핑 결과)
+# "security"와 "security_check"처럼 실제 시나리오에서 따로 쓰이는 이름은 서로 바꾸지 않고 입력 그대로 사용
+_FAST_PATH_PROCESS_NAMES = frozenset({
+    "check_in", "security", "security_check", "passport", "immigration",
+    "customs", "boarding", "visa_check", "travel_tax",
+})
+# 이름 자리에 오면 실제 프로세스 이름이 아닌 의문사/수량·지시 표현 ("어떤 프로세스 추가해", "모든 프로세스 삭제해줘", "add new process")
+_PROCESS_NAME_NON_NAMES = frozenset({
+    "어떤", "무슨", "왜", "모든", "다른", "새", "새로운", "전체", "모두", "전부", "몇", "그", "이", "저", "해당",
+    "which", "what", "why", "all", "every", "other", "another", "new", "any", "some", "that", "this",
+})
+
+
+def _match_process_command(text: str) -> Optional[Tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    프로세스 추가/삭제 명령이면 (action, parameters) 반환, 아니면 None
+
+    정규화한 이름이 _FAST_PATH_PROCESS_NAMES에 없지만 "프로세스/process" 등이 명시된 명령이면
+    parameters 없이 (action, None) 반환 (이름 자리가 "어떤/모든/which" 같은 표현이면 None)
+    """
+    for pattern in _PROCESS_COMMAND_PATTERNS:
+        match = pattern.fullmatch(text)
+        if match is None:
+            continue
+        if any(word.lower() in _PROCESS_NAME_NON_NAMES for word in match["name"].split()):
+            return None  # 이름이 아닌 질문/수량 표현 — 함수를 강제하지 않고 LLM이 판단
+        action = _PROCESS_COMMAND_ACTIONS[match["verb"].lower()]
+        process_name = normalize_process_name(match["name"])
+        if process_name in _FAST_PATH_PROCESS_NAMES:
+            return action, {"process_name": process_name}
+        return (action, None) if match["kind"] else None
+    return None
+
+
+def _match_fast_path(user_content: str) -> Optional[Tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    LLM 없이 분류 가능한 명령이면 (action, parameters) 반환, 아니면 None
+
+    action만 확실하고 인자를 추출하지 못한 경우 parameters는 None (LLM 호출 시 해당 함수로 tool_choice 지정)
+    """
+    text = user_content.strip()
+    if len(text) > 40:  # 정형 명령은 짧음 — 긴 문장은 바로 LLM으로
+        return None
+    for pattern, action in _FAST_PATH_PATTERNS:
+        if pattern.fullmatch(text):
+            return action, {}
+    return _match_process_command(text)
+
+
+# analyze_file_content: 파일 요약의 기본 통계만으로 답할 수 있는 질문 (문장 전체가 일치할 때만)
+# 조건이 붙은 질문("제주행 승객 몇 명이야?")은 일치하지 않으므로 LLM으로 처리됨
+_KOREAN_QUESTION_ENDING = r"(?:이야|이에요|인가요|입니까|이지|야|예요|나요|나|돼|돼요|되나요)?[.!?？]*"
+_ANALYSIS_FAST_PATH_PATTERNS = [
+    (re.compile(
+        r"(?:총|전체)?\s*승객\s*(?:수)?\s*(?:은|는|이|가)?\s*(?:총|전부|모두)?\s*(?:몇\s*명|얼마)\s*" + _KOREAN_QUESTION_ENDING
+    ), "총_승객_수"),
+    (re.compile(
+        r"(?:what\s+is\s+the\s+)?(?:total\s+)?(?:number\s+of\s+passengers|passenger\s+count)[.!?]*"
+        r"|how\s+many\s+passengers(?:\s+(?:are\s+there|were\s+(?:generated|simulated)))?(?:\s+in\s+total)?[.!?]*",
+        re.IGNORECASE,
+    ), "총_승객_수"),
+    (re.compile(
+        r"(?:총|전체)?\s*항공편\s*(?:수)?\s*(?:은|는|이|가)?\s*(?:총|전부|모두)?\s*(?:몇\s*(?:개|편)|얼마)\s*" + _KOREAN_QUESTION_ENDING
+    ), "총_항공편_수"),
+    (re.compile(
+        r"(?:what\s+is\s+the\s+)?(?:total\s+)?(?:number\s+of\s+flights|flight\s+count)[.!?]*"
+        r"|how\s+many\s+flights(?:\s+are\s+there)?(?:\s+in\s+total)?[.!?]*",
+        re.IGNORECASE,
+    ), "총_항공편_수"),
+]
+_ANALYSIS_FAST_PATH_ANSWERS = {
+    "총_승객_수": ("총 {:,}명의 승객이 생성되었습니다.", "A total of {:,} passengers were generated."),
+    "총_항공편_수": ("총 {:,}편의 항공편이 있습니다.", "There are {:,} flights in total."),
+}
+_HANGUL_RE = re.compile(r"[가-힣]")
+
+
+def _detect_language(text: str) -> Optional[str]:
+    """질문 언어 판별: 한글이 있으면 "ko", ASCII만이면 "en", 그 외(일본어 등)는 None"""
+    if _HANGUL_RE.search(text):
+        return "ko"
+    if text.isascii():
+        return "en"
+    return None
+
+
+def _find_summary_count(full_content: Dict[str, Any], key: str) -> Optional[int]:
+    """read_file 분석 결과의 기본 통계(기본_정보/파일_정보/항공편_통계)에서 개수 조회"""
+    summary = full_content.get("summary_info", full_content)
+    if not isinstance(summary, dict):
+        return None
+    for section in ("기본_정보", "파일_정보", "항공편_통계"):
+        value = (summary.get(section) or {}).get(key)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    return None
+
+
+def _answer_from_file_summary(file_content: Any, user_query: str) -> Optional[str]:
+    """총 승객/항공편 수 같은 정형 질문이면 파일 요약에서 바로 답변 생성 (질문 언어로), 아니면 None"""
+    if not isinstance(file_content, dict) or not isinstance(file_content.get("full_content"), dict):
+        return None
+    text = user_query.strip()
+    if len(text) > 40:  # 정형 질문은 짧음 — 긴 문장은 바로 LLM으로
+        return None
+    for pattern, key in _ANALYSIS_FAST_PATH_PATTERNS:
+        if pattern.fullmatch(text):
+            count = _find_summary_count(file_content["full_content"], key)
+            if count is None:
+                return None
+            korean, english = _ANALYSIS_FAST_PATH_ANSWERS[key]
+            return (korean if _detect_language(text) == "ko" else english).format(count)
+    return None
+
+
+# time_block period 형식: "2026-03-01 05:00:00-2026-03-01 06:00:00" (시작/종료 HH:MM 추출, ISO "T" 구분자 허용)
+_PERIOD_RE = re.compile(
+    r'^\d{4}-\d{2}-\d{2}[ T](\d{2}:\d{2})(?::\d{2}(?:\.\d+)?)?'
+    r'-\d{4}-\d{2}-\d{2}[ T](\d{2}:\d{2})(?::\d{2}(?:\.\d+)?)?$'
+)
+
+
+# 표준 형식 "YYYY-MM-DD HH:MM:SS-YYYY-MM-DD HH:MM:SS"(39자)의 구분자 위치
+_PERIOD_FIXED_LEN = 39
+_PERIOD_FIXED_SEPARATORS = ((4, '-'), (7, '-'), (13, ':'), (16, ':'), (19, '-'), (24, '-'), (27, '-'), (33, ':'), (36, ':'))
+
+
+@lru_cache(maxsize=1024)
+def _parse_period(period: str) -> Tuple[Optional[str], Optional[str]]:
+    """period 문자열에서 (시작 HH:MM, 종료 HH:MM) 추출, 형식이 맞지 않으면 (None, None)"""
+    # 표준 고정폭 형식이면 정규식 없이 슬라이싱으로 추출
+    if (
+        len(period) == _PERIOD_FIXED_LEN
+        and period[10] in ' T' and period[30] in ' T'
+        and all(period[i] == ch for i, ch in _PERIOD_FIXED_SEPARATORS)
+    ):
+        start_hhmm, end_hhmm = period[11:16], period[31:36]
+        if (start_hhmm[:2] + start_hhmm[3:] + end_hhmm[:2] + end_hhmm[3:]).isdigit():
+            return start_hhmm, end_hhmm
+
+    # 초 생략/소수점 초 등 변형 형식은 정규식으로 처리
+    match = _PERIOD_RE.match(period)
+    if match is None:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+# 조건 필드명 → 사람이 읽기 쉬운 이름
+_FIELD_TRANSLATIONS = {
+    'arrival_airport_iata': 'Destination',
+    'departure_airport_iata': 'Origin',
+    'operating_carrier_iata': 'Airline',
+    'flight_type': 'Flight type',
+    'nationality': 'Nationality',
+    'profile': 'Passenger type',
+    'terminal': 'Terminal',
+    'flight_number': 'Flight number',
+}
+
+
+def _translate_condition(field, values, airlines_mapping: dict) -> str:
+    """Translate field/values to human-readable description"""
+    field_name = _FIELD_TRANSLATIONS.get(field, field)
+
+    # Format values nicely (항공사 코드는 airlines_mapping으로 이름 병기)
+    if field == 'operating_carrier_iata':
+        if isinstance(values, list):
+            values_str = ', '.join(f"{airlines_mapping.get(v, v)} ({v})" for v in values)
+        else:
+            values_str = f"{airlines_mapping.get(values, values)} ({values})"
+    elif isinstance(values, list):
+        values_str = ', '.join(map(str, values))
+    else:
+        values_str = str(values)
+
+    return f"{field_name}: {values_str}"
+
+
+def _summarize_process(proc: dict, airlines_mapping: dict) -> Tuple[str, int]:
+    """
+    프로세스 1개의 요약을 한 줄 JSON으로 생성 (zones → facilities → time_blocks를 한 번만 순회)
+
+    운영 시간/활성·폐쇄 시설 집계와 시설별 time block 상세를 같은 순회에서 함께 만듭니다.
+    들여쓴 bullet 문장보다 토큰이 적고, 모델이 필드명으로 값을 바로 찾을 수 있습니다.
+
+    Returns:
+        (프로세스 요약 JSON 문자열, 활성 시설 수)
+    """
+    process_time = proc.get('process_time_seconds', 'Not set')
+    entry_conditions = proc.get('entry_conditions', [])
+    zones = proc.get('zones', {})
+    zone_count = len(zones)
+
+    # 단일 순회로 집계할 값들
+    all_starts = []
+    all_ends = []
+    # 고유 passenger_conditions (삽입 순서 유지 → 프롬프트가 요청마다 동일하게 생성됨)
+    unique_passenger_conditions = {}
+    active_facility_count = 0
+    closed_facility_count = 0
+    closed_facility_ids = []  # 요약에 표시할 앞 5개만 보관
+    # 시설별 time block 상세 (ID가 없거나 중복된 시설도 빠지지 않도록 ID를 키로 쓰지 않고 목록으로 유지)
+    facility_details = []
+
+    for zone_name, zone_data in zones.items():
+        for facility in zone_data.get('facilities', []):
+            fac_id = facility.get('id', 'Unknown')
+            time_blocks = (facility.get('operating_schedule') or {}).get('time_blocks', [])
+            block_lines = []
+            has_any_active = False
+
+            for block in time_blocks:
+                # Extract time range (format: "2026-03-01 05:00:00-2026-03-01 06:00:00")
+                period = block.get('period', '')
+                start_t, end_t = _parse_period(period) if period else (None, None)
+                time_range = f"{start_t}~{end_t}" if start_t else ''
+
+                if not block.get('activate', True):  # Default is True (operating)
+                    block_lines.append(f"[{time_range}] CLOSED")
+                    continue
+
+                has_any_active = True
+                if start_t:
+                    all_starts.append(start_t)
+                    all_ends.append(end_t)
+
+                # Collect and translate passenger_conditions
+                pax_conds = block.get('passenger_conditions', [])
+                if pax_conds:
+                    for c in pax_conds:
+                        # values에 중첩 리스트/dict가 있어도 해시 가능하도록 정렬된 JSON bytes로 중복 판별
+                        field, values = c.get('field'), c.get('values')
+                        condition_key = (field, orjson.dumps(values, default=str, option=orjson.OPT_SORT_KEYS))
+                        unique_passenger_conditions.setdefault(condition_key, (field, values))
+                    conds_str = ' AND '.join(
+                        _translate_condition(c.get('field'), c.get('values'), airlines_mapping) for c in pax_conds
                     )
+                else:
+                    conds_str = 'All passengers'
 
-                process_summary = '\n'.join(process_summary_lines) if process_summary_lines else '  (No processes configured)'
+                proc_time_block = block.get('process_time_seconds', process_time)
+                block_lines.append(f"[{time_range}] {proc_time_block}s, {conds_str}")
 
-                simulation_status = f"""
+            if has_any_active:
+                active_facility_count += 1
+            else:
+                closed_facility_count += 1
+                if len(closed_facility_ids) < 5:
+                    closed_facility_ids.append(fac_id)
+
+            facility_details.append({"zone": zone_name, "id": fac_id, "time_blocks": block_lines})
+
+    summary = {
+        "name": proc.get('name', 'Unknown'),
+        "zone_count": zone_count,
+        "zones": list(islice(zones, 5)),
+        "travel_time_minutes": proc.get('travel_time_minutes', 0),
+        "process_time_seconds": process_time,
+        # 활성 time block의 최소 시작 ~ 최대 종료
+        "operating_hours": f"{min(all_starts)} ~ {max(all_ends)}" if all_starts else 'All day (no time restrictions)',
+        "entry_conditions": [
+            f"{c.get('field')}={c.get('values')}" for c in entry_conditions
+        ] or 'All passengers (no restrictions)',
+        "passenger_conditions": [
+            f"{field}={values}" for field, values in unique_passenger_conditions.values()
+        ] or 'All passengers (no restrictions)',
+        "active_facilities": active_facility_count,
+        "closed_facilities": closed_facility_count,
+        # [{"zone", "id", "time_blocks": ["[HH:MM~HH:MM] 처리시간s, 조건" 또는 "[HH:MM~HH:MM] CLOSED", ...]}, ...]
+        "facility_details": facility_details,
+    }
+    if zone_count > 5:
+        summary["zones"].append(f"+{zone_count - 5} more")
+    if closed_facility_count:
+        if closed_facility_count > 5:
+            closed_facility_ids.append(f"+{closed_facility_count - 5} more")
+        summary["closed_facility_ids"] = closed_facility_ids
+
+    return orjson.dumps(summary, default=str).decode("utf-8"), active_facility_count
+
+
+@lru_cache(maxsize=256)
+def _summarize_process_json(proc_json: bytes, airlines_mapping_json: bytes) -> Tuple[str, int]:
+    """직렬화된 프로세스 설정 기준으로 _summarize_process 결과를 캐시 (미스일 때만 역직렬화 후 계산)"""
+    return _summarize_process(orjson.loads(proc_json), orjson.loads(airlines_mapping_json))
+
+
+def _summarize_process_cached(proc: dict, airlines_mapping: dict) -> Tuple[str, int]:
+    """
+    프로세스 요약 (설정이 바뀌지 않은 프로세스는 이전 결과 재사용)
+
+    브라우저는 대화 턴마다 같은 process_flow를 다시 보내므로, 시설/time block 수에 비례하는
+    Python 포맷팅 대신 C 구현(orjson) 직렬화 한 번으로 캐시를 조회합니다.
+    키 순서가 출력 순서를 결정하므로 정렬 없이 삽입 순서 그대로 직렬화합니다.
+    """
+    try:
+        proc_json = orjson.dumps(proc, option=orjson.OPT_NON_STR_KEYS)
+        airlines_mapping_json = orjson.dumps(airlines_mapping or {}, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        # 직렬화할 수 없는 값이 섞여 있으면 캐시 없이 계산
+        return _summarize_process(proc, airlines_mapping)
+    return _summarize_process_json(proc_json, airlines_mapping_json)
+
+
+# 프롬프트 구성 (OpenAI 자동 프롬프트 캐싱 대응)
+# - 정적 지침(_SYSTEM_PROMPT, _SIMULATION_GUIDE)은 값 치환 없이 항상 동일한 문자열로 앞쪽 system 메시지에 배치
+# - 요청마다 바뀌는 값(시뮬레이션 상태, 시나리오 정보)은 뒤쪽 system 메시지로 분리
+#   → 1024 토큰 이상의 공통 prefix가 바이트 단위로 동일해야 캐시가 적중함
+# - prompt_cache_key로 같은 시나리오 요청을 같은 캐시 서버로 라우팅 (상태 블록까지 prefix 재사용)
+_PROMPT_CACHE_KEY_PREFIX = "flexa-command-parser-v1"
+
+# 응답 언어: 질문의 문자로 판별해 요청마다 바뀌는 system 메시지 끝에 한 줄로 지정
+# (정적 지침에는 "Response language를 따르라"는 한 줄만 두므로 prefix는 언어와 무관하게 동일)
+_RESPONSE_LANGUAGE_LINES = {
+    "ko": "Response language: Korean (한국어로 답변)",
+    "en": "Response language: English",
+    None: "Response language: the same language as the user's question",
+}
+
+# 기본 지침 (언어 규칙, 사용 가능한 명령)
+_SYSTEM_PROMPT = """You are an AI assistant for the Flexa airport simulation system.
+
+**🌐 LANGUAGE (HIGHEST PRIORITY):** Always answer in the "Response language" given at the end of the context.
 
-**CURRENT SIMULATION STATE (Real-time from browser):**
+Available commands:
+1. Add process: "add checkin process", "보안검색 단계 추가"
+2. Remove process: "remove checkin process", "보안검색 단계 제거"
+3. List processes: "show process list", "프로세스 목록 보여줘"
+4. List files: "list files", "무슨 파일 있는지 확인해"
+5. Read/analyze file: "analyze simulation-pax.parquet", "대기시간 결과 파일 보여줘"
 
-**Basic Info:**
-- Airport: {simulation_state.get('airport', 'Not set')}
-- Date: {simulation_state.get('date', 'Not set')}
+Important rules:
+- Process names are normalized to English (e.g., "체크인" -> "check_in", "checkin" -> "check_in")
+- Step numbers are automatically assigned
+- Zones start as empty objects and are configured later in the UI
+
+Analyze the user's command and call the appropriate function."""
+
+# 시뮬레이션 상태 해석 지침 (simulation_state가 있을 때만 포함)
+_SIMULATION_GUIDE = """**SIMULATION STATE GUIDE:**
+The real-time values (airport, date, flights, passengers, processes, workflow) are given in the
+**CURRENT SIMULATION STATE** message that follows these instructions. Always answer from those values.
 
 **Flights:**
-- Total available: {simulation_state.get('flight_total', 0)} flights (loaded from database)
-- Selected: {simulation_state.get('flight_selected', 0)} flights (after applying filters)
-- Airlines: {airline_str}
   ⚠️ ALWAYS use full airline NAMES (e.g., "American Airlines"), NEVER codes (e.g., "AA")
   ⚠️ Airlines mapping available in simulation_state['airlines_mapping']
 
@@ -490,14 +619,7 @@ This means the user hasn't applied any filters yet. Guide them:
 3. Click the 'Filter Flights' button
 4. Once filtered, I will be able to recognize the selected flight information.
 
-There are {simulation_state.get('flight_total', 0)} flights available in the database."
-
-**Passengers (Summary):**
-- Total: {passenger_total} passengers
-- Load factor: {load_factor_str}
-- Nationality: {nationality_str}
-- Profile: {profile_str}
-- Arrival pattern: {arrival_str}
+There are [flight_total] flights available in the database."
 
 **Passengers (Full Data Available):**
 You have access to detailed passenger data in simulation_state['passenger']:
@@ -512,10 +634,7 @@ You have access to detailed passenger data in simulation_state['passenger']:
 ```
 
 **1. pax_generation** - Passenger count generation (Load Factor / Boarding Rate)
-Current configuration:
-```
-{pax_gen_json}
-```
+Current configuration: see `pax_generation` in CURRENT SIMULATION STATE
 - **Purpose**: Determines how many passengers per flight
 - **load_factor**: Boarding rate (탑승률). Percentage of seats filled. e.g., 83 means 83 passengers for a 100-seat flight
 - **default**: Base boarding rate for all flights
@@ -529,10 +648,7 @@ Current configuration:
 **2. pax_demographics** - Passenger attributes distribution
 
 **2a. nationality** - Nationality distribution
-Current configuration:
-```
-{nationality_json}
-```
+Current configuration: see `pax_demographics.nationality` in CURRENT SIMULATION STATE
 - **Purpose**: Assigns nationality to each passenger
 - **available_values**: Possible nationality options
 - **default**: Base distribution percentages (must sum to 100)
@@ -546,10 +662,7 @@ Current configuration:
    The system checks each passenger's nationality field to determine which processes they must go through."
 
 **2b. profile** - Passenger profile/type distribution (Pax Profile)
-Current configuration:
-```
-{profile_json}
-```
+Current configuration: see `pax_demographics.profile` in CURRENT SIMULATION STATE
 - **Purpose**: Assigns passenger type/category based on their characteristics
 - **available_values**: Possible profile options
 - **default**: Base distribution percentages (must sum to 100)
@@ -563,10 +676,7 @@ Current configuration:
    Set entry_conditions and passenger_conditions to route different profiles to different facilities or set different processing times."
 
 **3. pax_arrival_patterns** - Airport arrival timing
-Current configuration:
-```
-{pax_arrival_json}
-```
+Current configuration: see `pax_arrival_patterns` in CURRENT SIMULATION STATE
 - **Purpose**: Determines when passengers arrive at airport (before flight departure)
 - **mean**: Average arrival time in minutes before departure
 - **std**: Standard deviation (time variance)
@@ -581,10 +691,7 @@ Current configuration:
    This becomes the starting point of simulation. You can set different values per flight type or airline."
 
 **4. chartResult** - Generated passenger data summary
-Current data:
-```
-{chart_result_json}
-```
+Current data: see `chartResult` in CURRENT SIMULATION STATE
 - **Purpose**: Summary of generated passengers (NOT used in simulation, just reporting)
 - **total**: Total number of passengers created
 - **chart_x_data**: Time slots (hourly)
@@ -596,8 +703,8 @@ Current data:
 **Available Passenger Fields for Conditions:**
 | Field | Source | Description |
 |-------|--------|-------------|
-| `nationality` | pax_demographics | Passenger nationality (values from nationality config above) |
-| `profile` | pax_demographics | Passenger profile/type (values from profile config above) |
+| `nationality` | pax_demographics | Passenger nationality (values from nationality config in CURRENT SIMULATION STATE) |
+| `profile` | pax_demographics | Passenger profile/type (values from profile config in CURRENT SIMULATION STATE) |
 | `operating_carrier_iata` | Flight data | Airline IATA code from flight schedule |
 | `flight_type` | Flight data | "Domestic" or "International" |
 | `show_up_time` | pax_arrival_patterns | Passenger arrival timestamp |
@@ -616,86 +723,83 @@ If conditions has values → Check each condition:
 
 **Example Conditions:**
 ```
-entry_conditions: [{{"field": "nationality", "values": ["Foreign"]}}]
+entry_conditions: [{"field": "nationality", "values": ["Foreign"]}]
 → Only passengers with nationality="Foreign" go through this process
 → Domestic passengers get status="skipped"
 
-passenger_conditions: [{{"field": "profile", "values": ["Business", "First"]}}]
+passenger_conditions: [{"field": "profile", "values": ["Business", "First"]}]
 → Only Business or First class passengers can use this facility
 → Economy passengers must use other facilities
 
 Multiple conditions (AND logic):
 passenger_conditions: [
-  {{"field": "operating_carrier_iata", "values": ["AA"]}},
-  {{"field": "profile", "values": ["Business"]}}
+  {"field": "operating_carrier_iata", "values": ["AA"]},
+  {"field": "profile", "values": ["Business"]}
 ]
 → Only AA airline AND Business class passengers can use this facility
 ```
 
 **💡 WHAT FIELDS CAN BE USED IN CONDITIONS?** (When users ask "어떤 필드 쓸 수 있어?")
 → "You can use any passenger attribute in entry_conditions or passenger_conditions:
-   - **nationality**: Values from the nationality configuration above
-   - **profile**: Values from the profile configuration above
+   - **nationality**: Values from the nationality configuration in CURRENT SIMULATION STATE
+   - **profile**: Values from the profile configuration in CURRENT SIMULATION STATE
    - **operating_carrier_iata**: Airline IATA codes from the flight schedule
    - **flight_type**: Domestic or International (from flight data)
    - And other flight attributes: terminal, destination, flight_number, etc.
-   Refer to the actual configuration data above for the specific values available in this simulation."
+   Refer to the actual configuration data in CURRENT SIMULATION STATE for the specific values available in this simulation."
 
 **HOW TO ANSWER TIME-BASED QUESTIONS:**
 Example: "아메리칸 에어라인 승객이 몇시부터 몇시까지 몇명씩 와?"
 
 1. Find airline in chartResult.chart_y_data.airline:
    ```
-   airline_data = next(item for item in chartResult['chart_y_data']['airline'] if item['name'] == 'American Airlines')
+   airline_by_name = {item['name']: item for item in chartResult['chart_y_data']['airline']}  # build once, reuse per airline
+   airline_data = airline_by_name['American Airlines']
    y_values = airline_data['y']  # [0, 0, 5, 10, 20, ...]
    x_times = chartResult['chart_x_data']  # ["00:00", "01:00", "02:00", ...]
    ```
 
-2. Analyze non-zero time slots:
+2. Analyze non-zero time slots (select them in one step, then read the matching times):
    ```
-   for i, count in enumerate(y_values):
-       if count > 0:
-           print(f"{{x_times[i]}} ~ {{x_times[i+1]}}: {{count}}명")
+   y = np.asarray(y_values)
+   idx = np.flatnonzero(y)  # indices of non-zero slots only
+   x = np.asarray(x_times + ["24:00"])  # slot i spans x[i] ~ x[i+1]
+   ranges = list(zip(x[idx], x[idx + 1], y[idx]))  # [("02:00", "03:00", 5), ...]
    ```
 
 3. Answer in natural language: "아메리칸 에어라인 승객은 02:00~03:00에 5명, 03:00~04:00에 10명..."
 
-**Process Flow (Summary):**
-- Total: {simulation_state.get('process_count', 0)} process(es), {total_facilities} facility(ies)
-- Details:
-{process_summary}
-
 **Process Flow (Full Data Available):**
 You have access to detailed process data in simulation_state['process_flow']:
 
 **Structure:**
 ```
 process_flow: [
-  {{
+  {
     "step": 0,
     "name": "check_in",
     "travel_time_minutes": 5,
     "process_time_seconds": 100,
     "entry_conditions": [],
-    "zones": {{
-      "A": {{
-        "facilities": [{{
+    "zones": {
+      "A": {
+        "facilities": [{
           "id": "A_01",
-          "operating_schedule": {{
-            "time_blocks": [{{
+          "operating_schedule": {
+            "time_blocks": [{
               "period": "<START_DATETIME>-<END_DATETIME>",  // e.g., "2026-03-01 05:00:00-2026-03-02 00:00:00"
               "process_time_seconds": 100,
               "passenger_conditions": [],
               "activate": true
-            }}]
-          }}
-        }}]
-      }}
-    }}
-  }}
+            }]
+          }
+        }]
+      }
+    }
+  }
 ]
 ```
-⚠️ **IMPORTANT**: The actual values are in the Process Flow Summary above. Use those REAL values, not this example structure!
+⚠️ **IMPORTANT**: The actual values are in the Process Flow (Summary) of CURRENT SIMULATION STATE. Use those REAL values, not this example structure!
 
 **Key Field Meanings:**
 
@@ -742,8 +846,8 @@ process_flow: [
 
 5. **entry_conditions**: Who must go through this process
    - **If EMPTY [] or not set → ALL passengers go through this process (open to everyone)**
-   - Example: {{"field": "nationality", "values": ["Foreign"]}} → Only foreign passengers
-   - Example: {{"field": "flight_type", "values": ["International"]}} → Only international flights
+   - Example: {"field": "nationality", "values": ["Foreign"]} → Only foreign passengers
+   - Example: {"field": "flight_type", "values": ["International"]} → Only international flights
    - If matched → process proceeds
    - If not matched → status = "skipped"
 
@@ -784,7 +888,7 @@ process_flow: [
      * Specific hours → specific airlines only
      * Lunch break → facility closed
    - Each block has:
-     * **period**: Operating time range (check actual values in Process Flow Summary above)
+     * **period**: Operating time range (check actual values in Process Flow (Summary) of CURRENT SIMULATION STATE)
      * **process_time_seconds**: Processing time for THIS time period
      * **passenger_conditions**: Who can use this facility at this time
      * **activate**: true = operating, false = closed (excluded from simulation)
@@ -801,8 +905,8 @@ process_flow: [
 9. **passenger_conditions** (facility level):
    - Who can use THIS facility at THIS time
    - **If EMPTY [] or not set → ALL passengers can use this facility (open to everyone)**
-   - Example: {{"field": "operating_carrier_iata", "values": ["G3"]}} → G3 airline only
-   - Example: {{"field": "profile", "values": ["Fast track"]}} → Fast track passengers only
+   - Example: {"field": "operating_carrier_iata", "values": ["G3"]} → G3 airline only
+   - Example: {"field": "profile", "values": ["Fast track"]} → Fast track passengers only
    - **Difference from entry_conditions:**
      * entry_conditions: Process-wide access (process level)
      * passenger_conditions: Facility-specific access (time_block level)
@@ -851,15 +955,15 @@ For each process (e.g., check_in, security), the simulation generates these colu
 
 | Column | Meaning | Example Value |
 |--------|---------|---------------|
-| `{{process}}_on_pred` | Predicted arrival time at facility | 2024-01-01 08:05:00 |
-| `{{process}}_facility` | Assigned facility ID | A_01 |
-| `{{process}}_zone` | Assigned zone name | PRIORITY |
-| `{{process}}_start_time` | When service actually starts | 2024-01-01 08:10:00 |
-| `{{process}}_done_time` | When service is completed | 2024-01-01 08:13:00 |
-| `{{process}}_open_wait_time` | Time waiting for facility to open | 00:00:00 (if already open) |
-| `{{process}}_queue_wait_time` | Time waiting in queue | 00:05:00 (5 min queue) |
-| `{{process}}_queue_length` | Number of people ahead in queue at arrival | 3 |
-| `{{process}}_status` | Result of this process | completed/failed/skipped |
+| `{process}_on_pred` | Predicted arrival time at facility | 2024-01-01 08:05:00 |
+| `{process}_facility` | Assigned facility ID | A_01 |
+| `{process}_zone` | Assigned zone name | PRIORITY |
+| `{process}_start_time` | When service actually starts | 2024-01-01 08:10:00 |
+| `{process}_done_time` | When service is completed | 2024-01-01 08:13:00 |
+| `{process}_open_wait_time` | Time waiting for facility to open | 00:00:00 (if already open) |
+| `{process}_queue_wait_time` | Time waiting in queue | 00:05:00 (5 min queue) |
+| `{process}_queue_length` | Number of people ahead in queue at arrival | 3 |
+| `{process}_status` | Result of this process | completed/failed/skipped |
 
 **Status Values:**
 - **completed**: Successfully processed at a facility
@@ -881,11 +985,6 @@ For each process (e.g., check_in, security), the simulation generates these colu
 - "시뮬레이션 결과 어떻게 해석해?" → See Simulation Output Columns above
 - "대기 시간이 왜 두 가지야?" → open_wait_time vs queue_wait_time explained above
 
-**Workflow:**
-- Flights tab: {'✅ Completed' if simulation_state.get('workflow', {}).get('flights_completed') else '❌ Not completed'}
-- Passengers tab: {'✅ Completed' if simulation_state.get('workflow', {}).get('passengers_completed') else '❌ Not completed'}
-- Current step: {simulation_state.get('workflow', {}).get('current_step', 1)}
-
 **🎯 WORKFLOW GUIDE - Help Users Complete Each Tab Sequentially:**
 
 **Tab 1: Flights (Flight Schedule)**
@@ -894,24 +993,24 @@ Steps:
 1. Load flight data (airport + date) → Click "Load Data" button
 2. Choose filter criteria (Type, Terminal, Location) → Optional
 3. Click "Filter Flights" button → Required (even if no filters selected)
-Status: {'✅ Completed - 19 flights selected' if simulation_state.get('flight_selected', 0) > 0 else '❌ Not completed - Need to click "Filter Flights" button'}
+Status: see **Workflow** in CURRENT SIMULATION STATE
 
 **Tab 2: Passengers (Configure Passenger Data)**
 Goal: Configure passenger generation settings
 4 Sub-tabs (all must be completed):
 1. ✅ Nationality - Define nationality types (e.g., Domestic, Foreign) and distribution %
-   Example: {{"Domestic": 60, "Foreign": 40}}
+   Example: {"Domestic": 60, "Foreign": 40}
 2. ✅ Pax Profile - Define passenger types based on characteristics (seat class, wheelchair users, crew, etc.)
-   Example: {{"Economy": 70, "Business": 20, "First": 5, "Wheelchair": 3, "Crew": 2}}
+   Example: {"Economy": 70, "Business": 20, "First": 5, "Wheelchair": 3, "Crew": 2}
    → Different profiles use different facilities and may have different processing times
 3. ❌ Load Factor - Click to set default boarding rate (e.g., 85%)
    Default value is automatically set when clicked
 4. ❌ Show-up-Time - Click to set passenger arrival time distribution (mean, std)
-   Example: {{"mean": 120, "std": 30}} (arrive 120 min before departure)
+   Example: {"mean": 120, "std": 30} (arrive 120 min before departure)
    Default values are automatically set when clicked
 
 After all 4 sub-tabs: Click "Generate Pax" button to create passengers
-Status: {'✅ Completed - ' + str(passenger_total) + ' passengers generated' if passenger_total > 0 else '❌ Not completed - Need to complete all 4 sub-tabs and click "Generate Pax"'}
+Status: see **Workflow** in CURRENT SIMULATION STATE
 
 **Tab 3: Facilities (Process Flow)**
 Goal: Add airport processes (check-in, security, etc.)
@@ -919,10 +1018,10 @@ Steps:
 1. Click "Add Process" or use AI chat to add processes
 2. Configure zones and facilities for each process
 3. Set operating hours and conditions
-Status: {'✅ Completed - ' + str(simulation_state.get('process_count', 0)) + ' processes configured' if simulation_state.get('process_count', 0) > 0 else '❌ Not completed - Need to add at least 1 process'}
+Status: see **Workflow** in CURRENT SIMULATION STATE
 
 **BUTTON CONDITIONS:**
-- Run Simulation: {'✅ Enabled' if simulation_state.get('process_count', 0) > 0 else '❌ Disabled (Need ≥1 process)'}
+- Run Simulation: Enabled only when process_count ≥ 1 (see **Workflow** in CURRENT SIMULATION STATE)
 - Save: ✅ Always enabled
 - Delete: ✅ Always enabled
 
@@ -939,16 +1038,16 @@ When user asks "What should I do next?" or "이제 뭐해야 해?", analyze curr
    2. Click on 'Load Factor' tab to set default value
    3. Click on 'Show-up-Time' tab to set default value
    4. Click 'Generate Pax' button
-   This will create passengers for your {simulation_state.get('flight_selected', 0)} selected flights."
+   This will create passengers for your [flight_selected] selected flights."
 
 **If passenger.total > 0 AND process_count = 0:**
-→ "Excellent! You have {passenger_total} passengers generated. Now go to Facilities tab and add processes:
+→ "Excellent! You have [passenger.total] passengers generated. Now go to Facilities tab and add processes:
    1. Click 'Add Process' button OR
    2. Tell me which process to add (e.g., 'add check-in process', 'add security process')
    Common processes: check-in, security, passport control, immigration, boarding"
 
 **If process_count > 0:**
-→ "Perfect! You have {simulation_state.get('process_count', 0)} processes configured. Your simulation is ready!
+→ "Perfect! You have [process_count] processes configured. Your simulation is ready!
    - Click 'Run Simulation' button to start
    - Or add more processes if needed
    - Or click 'Save' to save your configuration"
@@ -957,7 +1056,7 @@ When user asks "What should I do next?" or "이제 뭐해야 해?", analyze curr
 
 When users ask about facilities or processes (e.g., "시설 어떻게 설정되어있어?", "프로세스 확인해줘", "현재 설정 알려줘"):
 
-⚠️ **CRITICAL: Use ONLY the ACTUAL data from "Process Flow (Summary)" section above!**
+⚠️ **CRITICAL: Use ONLY the ACTUAL data from "Process Flow (Summary)" section of CURRENT SIMULATION STATE!**
 - DO NOT use example values from the "Structure" section
 - DO NOT make up or guess any values
 - All real data (travel time, process time, operating hours, zones, facilities) is in the Summary
@@ -1036,180 +1135,1070 @@ Here's the current facility configuration! 😊
 **If data exists in simulation_state, YOU MUST USE IT to give detailed, helpful answers!**
 """
 
-            system_prompt = f"""You are an AI assistant for the Flexa airport simulation system.
+# 시뮬레이션 상태 값 템플릿 (요청마다 format_map으로 값만 채움, 리터럴 중괄호는 {{ }}로 이스케이프)
+_SIMULATION_STATUS_TEMPLATE = """**CURRENT SIMULATION STATE (Real-time from browser):**
+
+**Basic Info:**
+- Airport: {airport}
+- Date: {date}
+
+**Flights:**
+- Total available: {flight_total} flights (loaded from database)
+- Selected: {flight_selected} flights (after applying filters)
+- Airlines: {airline_str}
+
+**Passengers (Summary):**
+- Total: {passenger_total} passengers
+- Load factor: {load_factor_str}
+- Nationality: {nationality_str}
+- Profile: {profile_str}
+- Arrival pattern: {arrival_str}
+
+**Passengers (Configuration):**
+pax_generation:
+```
+{pax_gen_json}
+```
+
+pax_demographics.nationality:
+```
+{nationality_json}
+```
+
+pax_demographics.profile:
+```
+{profile_json}
+```
+
+pax_arrival_patterns:
+```
+{pax_arrival_json}
+```
 
-**🌐 LANGUAGE RULES (HIGHEST PRIORITY - MUST FOLLOW):**
-⚠️ CRITICAL: You MUST respond in the SAME language as the user's question!
+chartResult:
+```
+{chart_result_json}
+```
 
-- Korean question (한글) → Korean answer (한글로 답변)
-- English question → English answer
-- Any other language → Same language answer
+**Process Flow (Summary):**
+- Total: {process_count} process(es), {total_facilities} facility(ies)
+- Details (one JSON object per process):
+{process_summary}
 
-**Examples:**
-- User: "이제 뭐해야 해?" → Answer in Korean: "항공편 선택이 완료되었습니다. 다음은..."
-- User: "What should I do next?" → Answer in English: "Flights are selected. Next step is..."
+**Workflow:**
+- Flights tab: {flights_tab_status}
+- Passengers tab: {passengers_tab_status}
+- Current step: {current_step}
+- Tab 1 (Flights): {flight_step_status}
+- Tab 2 (Passengers): {passenger_step_status}
+- Tab 3 (Facilities): {process_step_status}
+- Run Simulation button: {run_simulation_status}
+"""
 
-⚠️ NEVER respond in English when the user asks in Korean!
-⚠️ Match the user's language EXACTLY!
-{simulation_status}
-Current scenario information (from S3):
+# 시나리오 정보 템플릿
+_SCENARIO_CONTEXT_TEMPLATE = """Current scenario information (from S3):
 - Scenario ID: {scenario_id}
-- Process count: {context.get('process_count', 0)}
-- Current processes: {', '.join(context.get('process_names', [])) or 'None'}
+- Process count: {process_count}
+- Current processes: {process_names}
+
+{language_line}"""
+
+# 정적 system 메시지 (payload용 dict, 요청마다 재생성하지 않음 — 공유 객체이므로 수정하지 말 것)
+_SYSTEM_MESSAGE = {"role": "system", "content": _SYSTEM_PROMPT}
+_SIMULATION_GUIDE_MESSAGE = {"role": "system", "content": _SIMULATION_GUIDE}
+
+
+def _format_rule_conditions(conditions: dict) -> str:
+    """rule 조건을 "field=v1,v2, field2=v3" 형태로 요약 (조건이 없으면 'unknown condition')"""
+    cond_parts = [
+        f"{field}={','.join(str(v) for v in values)}" if isinstance(values, list) else f"{field}={values}"
+        for field, values in conditions.items()
+    ]
+    return ', '.join(cond_parts) if cond_parts else 'unknown condition'
+
+
+def _format_percentages(values: dict) -> str:
+    """{값: 비율} 분포를 "k: v%, ..." 형태로 요약"""
+    return ', '.join(f"{k}: {v}%" for k, v in values.items())
+
+
+def _summarize_distribution(distribution: dict) -> str:
+    """국적/프로필 분포 설정(default + rules)을 한 줄로 요약"""
+    default = distribution.get('default') or {}
+    default_values = {k: v for k, v in default.items() if k != 'flightCount'}
+    summary = _format_percentages(default_values) if default_values else 'Not configured'
+    rules = distribution.get('rules') or []
+    if rules:
+        summary += " (default)" + "".join(
+            f" / When {_format_rule_conditions(rule.get('conditions', {}))} → "
+            f"{_format_percentages({k: v for k, v in rule.items() if k not in ('conditions', 'flightCount')})}"
+            for rule in rules
+        )
+    return summary
+
+
+def _summarize_passenger(passenger_data: dict) -> dict:
+    """Passenger 탭 설정을 상태 블록용 문자열로 요약 (템플릿 치환용 dict 반환)"""
+    passenger_total = passenger_data.get('total', 0)
+    pax_gen = passenger_data.get('pax_generation') or {}
+    pax_demo = passenger_data.get('pax_demographics') or {}
+    pax_arrival = passenger_data.get('pax_arrival_patterns') or {}
+    chart_result = passenger_data.get('chartResult') or {}
+
+    # 탑승률 요약 (default + rules)
+    load_factor = (pax_gen.get('default') or {}).get('load_factor', 'Not set')
+    load_factor_str = f"{load_factor}%"
+    load_factor_rules = pax_gen.get('rules') or []
+    if load_factor_rules:
+        load_factor_str += " (default)" + "".join(
+            f" / When {_format_rule_conditions(rule.get('conditions', {}))} → {rule.get('load_factor', '')}%"
+            for rule in load_factor_rules
+        )
+
+    # 국적/프로필 요약 (default + rules)
+    nationality_str = _summarize_distribution(pax_demo.get('nationality') or {})
+    profile_str = _summarize_distribution(pax_demo.get('profile') or {})
+
+    # 도착 패턴 요약 (default + rules)
+    arrival_default = pax_arrival.get('default') or {}
+    arrival_str = (
+        f"Mean {arrival_default.get('mean', 'Not set')} min before departure "
+        f"(std: {arrival_default.get('std', 'Not set')})"
+    )
+    arrival_rules = pax_arrival.get('rules') or []
+    if arrival_rules:
+        arrival_str += " (default)" + "".join(
+            f" / When {_format_rule_conditions(rule.get('conditions', {}))} → "
+            f"mean {rule.get('mean', '')} min (std: {rule.get('std', '')})"
+            for rule in arrival_rules
+        )
+
+    # 실제 데이터를 JSON으로 직렬화 (하드코딩 예시 대신 사용)
+    pax_gen_json = _dumps_indented(pax_gen) if pax_gen else '{}'
+    nationality_data = (pax_demo.get('nationality') or {})
+    nationality_json = _dumps_indented(nationality_data) if nationality_data else '{}'
+    profile_data = (pax_demo.get('profile') or {})
+    profile_json = _dumps_indented(profile_data) if profile_data else '{}'
+    pax_arrival_json = _dumps_indented(pax_arrival) if pax_arrival else '{}'
+    chart_result_json = _dumps_indented(chart_result) if chart_result else '{}'
+
+    return {
+        "passenger_total": passenger_total,
+        "load_factor_str": load_factor_str,
+        "nationality_str": nationality_str,
+        "profile_str": profile_str,
+        "arrival_str": arrival_str,
+        "pax_gen_json": pax_gen_json,
+        "nationality_json": nationality_json,
+        "profile_json": profile_json,
+        "pax_arrival_json": pax_arrival_json,
+        "chart_result_json": chart_result_json,
+    }
+
+
+@lru_cache(maxsize=32)
+def _summarize_passenger_json(passenger_json: bytes) -> dict:
+    """직렬화된 Passenger 설정 기준으로 _summarize_passenger 결과를 캐시 (미스일 때만 역직렬화 후 계산)"""
+    return _summarize_passenger(orjson.loads(passenger_json))
+
+
+def _summarize_passenger_cached(passenger_data: dict) -> dict:
+    """
+    Passenger 탭 요약 (설정이 바뀌지 않았으면 이전 결과 재사용)
+
+    프로세스만 수정한 경우처럼 상태 블록 전체는 다시 만들어도 Passenger 요약(분포 문자열, chartResult JSON)은
+    그대로 재사용합니다. 반환 dict는 캐시와 공유되므로 수정하지 않아야 합니다.
+    """
+    try:
+        passenger_json = orjson.dumps(passenger_data, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        # 직렬화할 수 없는 값이 섞여 있으면 캐시 없이 계산
+        return _summarize_passenger(passenger_data)
+    return _summarize_passenger_json(passenger_json)
+
+
+# 앱을 막 연 상태(승객/프로세스 미설정)에서는 요약 작업 없이 미리 렌더링한 문자열 사용
+_EMPTY_PASSENGER_SECTION = _summarize_passenger({})
+_EMPTY_PROCESS_SECTION = "  (No processes configured)"
+
+# 워크플로우 상태 문구 룩업 테이블 (완료 여부 → 문구)
+_TAB_STATUS = {True: '✅ Completed', False: '❌ Not completed'}
+_RUN_SIMULATION_STATUS = {True: '✅ Enabled', False: '❌ Disabled (Need ≥1 process)'}
+# 단계별 (완료 문구 포맷, 미완료 문구)
+_STEP_STATUS = {
+    'flight': ('✅ Completed - {} flights selected', '❌ Not completed - Need to click "Filter Flights" button'),
+    'passenger': ('✅ Completed - {} passengers generated', '❌ Not completed - Need to complete all 4 sub-tabs and click "Generate Pax"'),
+    'process': ('✅ Completed - {} processes configured', '❌ Not completed - Need to add at least 1 process'),
+}
+
+
+def _step_status(step: str, count) -> str:
+    """단계 완료 여부(count > 0)에 따른 상태 문구"""
+    done_format, not_done = _STEP_STATUS[step]
+    return done_format.format(count) if count > 0 else not_done
+
+
+def _build_simulation_status(simulation_state: dict) -> str:
+    """브라우저에서 전달된 simulation_state로 CURRENT SIMULATION STATE 블록 생성"""
+    # 항공사 이름 리스트 생성
+    airline_names = simulation_state.get('airline_names') or []
+    airline_str = ', '.join(airline_names[:5]) if airline_names else 'None'
+    if len(airline_names) > 5:
+        airline_str += f' and {len(airline_names) - 5} more'
+
+    # Passenger 데이터 요약 (None 안전 처리, 비어 있으면 미리 렌더링한 기본값)
+    passenger_data = simulation_state.get('passenger')
+    passenger_section = _summarize_passenger_cached(passenger_data) if passenger_data else _EMPTY_PASSENGER_SECTION
+    passenger_total = passenger_section['passenger_total']
+
+    # 🆕 프로세스/시설 요약 생성 (실제 데이터에서 추출)
+    process_flow = simulation_state.get('process_flow')
+    process_summary = _EMPTY_PROCESS_SECTION
+    total_facilities = 0
+    if process_flow:
+        airlines_mapping = simulation_state.get('airlines_mapping') or {}
+        process_summary_lines = []
+        for proc in process_flow:
+            proc_summary, active_facility_count = _summarize_process_cached(proc, airlines_mapping)
+            process_summary_lines.append(proc_summary)
+            total_facilities += active_facility_count
+        process_summary = '\n'.join(['```json', *process_summary_lines, '```'])
+
+    # 템플릿에서 쓰는 메타 필드는 한 번씩만 조회
+    workflow = simulation_state.get('workflow') or {}
+    airport = simulation_state.get('airport', 'Not set')
+    date = simulation_state.get('date', 'Not set')
+    flight_total = simulation_state.get('flight_total', 0)
+    flight_selected = simulation_state.get('flight_selected', 0)
+    process_count = simulation_state.get('process_count', 0)
+
+    return _SIMULATION_STATUS_TEMPLATE.format_map({
+        "airport": airport,
+        "date": date,
+        "flight_total": flight_total,
+        "flight_selected": flight_selected,
+        "airline_str": airline_str,
+        **passenger_section,
+        "process_count": process_count,
+        "total_facilities": total_facilities,
+        "process_summary": process_summary,
+        "flights_tab_status": _TAB_STATUS[bool(workflow.get('flights_completed'))],
+        "passengers_tab_status": _TAB_STATUS[bool(workflow.get('passengers_completed'))],
+        "current_step": workflow.get('current_step', 1),
+        "flight_step_status": _step_status('flight', flight_selected),
+        "passenger_step_status": _step_status('passenger', passenger_total),
+        "process_step_status": _step_status('process', process_count),
+        "run_simulation_status": _RUN_SIMULATION_STATUS[process_count > 0],
+    })
+
+
+def _build_context_hints(simulation_state: dict) -> List[str]:
+    """사용자 메시지에 덧붙일 실시간 데이터 힌트 (passenger/process_flow는 한 번씩만 조회)"""
+    passenger_data = simulation_state.get('passenger') or {}
+    process_flow = simulation_state.get('process_flow')
+
+    context_hints = []
+    passenger_total = passenger_data.get('total', 0)
+    if passenger_total > 0:
+        context_hints.append(f"Passenger data: {passenger_total} passengers with full details (chartResult, demographics, etc.)")
+    if process_flow:
+        process_names = ', '.join(p.get('name', '') for p in process_flow)
+        context_hints.append(f"Process flow data: {len(process_flow)} processes ({process_names}) with zones, facilities, time_blocks, entry_conditions")
+    return context_hints
+
+
+# 키(직렬화된 state)가 수십 KB일 수 있으므로 최근 64개만 유지
+@lru_cache(maxsize=64)
+def _render_simulation_status(simulation_state_json: bytes) -> str:
+    """직렬화된 simulation_state 기준으로 상태 블록을 캐시 (미스일 때만 역직렬화 후 생성)"""
+    return _build_simulation_status(orjson.loads(simulation_state_json))
+
+
+def _render_simulation_status_cached(simulation_state: dict) -> str:
+    """
+    상태 블록 생성 (대화 턴마다 같은 simulation_state가 다시 오면 이전 결과 재사용)
+
+    키 순서가 출력(JSON 블록, 프로세스 순서)에 반영되므로 정렬 없이 삽입 순서 그대로 직렬화합니다.
+    """
+    try:
+        simulation_state_json = orjson.dumps(simulation_state, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        # 직렬화할 수 없는 값이 섞여 있으면 캐시 없이 생성
+        return _build_simulation_status(simulation_state)
+    return _render_simulation_status(simulation_state_json)
+
+
+# analyze_file_content 시스템 프롬프트의 정적 부분 (모듈 로드 시 1회 생성)
+# 값 치환 없는 지침을 첫 system 메시지로 고정 → 파일/상태가 달라도 prefix가 동일해 프롬프트 캐시 적중
+_FILE_ANALYSIS_INSTRUCTIONS = """You are a data analyst for the Flexa airport simulation system. Answer the user's question accurately and specifically from the simulation data provided, in plain language that regular users can easily understand.
+
+**Rules:**
+1. **Language (highest priority)**: Answer in the "Response language" given right before the user's question.
+2. **No file names or technical terms**: Never mention file names (e.g., show-up-passenger.parquet, simulation-pax.parquet, metadata-for-frontend.json), JSON key names or structure, or phrases like "this file contains" / "according to the data". Answer as if you ran the simulation yourself.
+   - Say keys in plain words: savedAt → when it was saved, process_flow → processing steps, zones → zones/areas, facilities → facilities/counters, time_blocks → operating hours
+3. **Be specific**: Include concrete numbers - how many processes and their actual names (e.g., "check-in", "security screening"), zones per process, facilities per zone and in total, operating hours (if available). For "summarize" requests, list what information there is, what it means, and the key statistics.
+4. **Parquet columns:**
+   - Ignore: all columns ending with _icao, marketing_carrier_iata (use operating_carrier_iata), data_source, and columns whose values are all None
+   - Use: operating_carrier_iata/operating_carrier_name (airline), departure_airport_iata/arrival_airport_iata, departure_city/arrival_city, scheduled_departure_local, scheduled_arrival_local, show_up_time, total_seats, aircraft_type_name (e.g., "Boeing 737-800 Passenger")
+   - nationality/profile: if None, say it is not configured; otherwise use the values and explain them specifically
+5. **Per-flight questions (simulation-pax.parquet)**: Passenger results keep the flight columns (arrival_city, carrier, flight_number, ...), so use "flight_analysis" > "destination_analysis". Each destination has flight_count, flight_list (departure times, passenger counts) and per-process "xxx_avg_wait_min".
+   - "How many flights to Jeju?" → flight_count/flight_list of the Jeju item; "How long did passengers wait for Busan flights?" → xxx_avg_wait_min of those flights
+   - If "flight_analysis" has an "error" key, explain that the analysis isn't possible and convey its "error" and "description"; if "destination_analysis" is empty, say there is no valid destination data
+
+**Example:**
+❌ "Based on show-up-passenger.parquet, there is 1 item in process_flow"
+✅ "There is currently 1 processing step configured. The 'check-in' process has a total of 144 counters deployed across 12 zones (A, B, C, etc.)."""
+_FILE_ANALYSIS_SYSTEM_MESSAGE = {"role": "system", "content": _FILE_ANALYSIS_INSTRUCTIONS}
+
+# 같은 시나리오의 파일 분석 요청을 같은 캐시 서버로 라우팅
+_FILE_ANALYSIS_CACHE_KEY_PREFIX = "flexa-file-analysis-v1"
+
+
+_YES_NO = {True: 'Yes', False: 'No'}
+
+# analyze_file_content용 현재 시뮬레이션 상태 템플릿 (요청마다 format_map으로 값만 채움)
+_FILE_ANALYSIS_STATUS_TEMPLATE = """
 
-Available commands:
-1. Add process: "add checkin process", "보안검색 단계 추가"
-2. Remove process: "remove checkin process", "보안검색 단계 제거"
-3. List processes: "show process list", "프로세스 목록 보여줘"
-4. List files: "list files", "무슨 파일 있는지 확인해"
-5. Read/analyze file: "analyze simulation-pax.parquet", "대기시간 결과 파일 보여줘"
+**CURRENT SIMULATION STATE (Real-time from browser):**
+- Airport: {airport}
+- Date: {date}
+- Flights configured: {flight_count} flights
+- Passengers configured: {passenger_configured}
+- Process flow: {process_count} processes ({process_names})
+- Workflow status:
+  * Flights tab completed: {flights_completed}
+  * Passengers tab completed: {passengers_completed}
 
-Important rules:
-- Process names are normalized to English (e.g., "체크인" -> "check_in", "checkin" -> "check_in")
-- Step numbers are automatically assigned
-- Zones start as empty objects and are configured later in the UI
+**IMPORTANT:** This is the current state in the user's browser. The file data above might be outdated if the user hasn't saved recently.
+"""
 
-Analyze the user's command and call the appropriate function."""
 
-            # 3. 메시지 구성
-            messages = [Message(role="system", content=system_prompt)]
+def _build_file_analysis_status(simulation_state: dict) -> str:
+    """analyze_file_content용 현재 시뮬레이션 상태 요약 (조회는 한 번씩, 템플릿 한 번의 치환으로 구성)"""
+    workflow = simulation_state.get('workflow') or {}
+    return _FILE_ANALYSIS_STATUS_TEMPLATE.format_map({
+        "airport": simulation_state.get('airport', 'Not set'),
+        "date": simulation_state.get('date', 'Not set'),
+        "flight_count": simulation_state.get('flight_count', 0),
+        "passenger_configured": _YES_NO[bool(simulation_state.get('passenger_configured'))],
+        "process_count": simulation_state.get('process_count', 0),
+        "process_names": ', '.join(simulation_state.get('process_names') or ()) or 'None',
+        "flights_completed": _YES_NO[bool(workflow.get('flights_completed'))],
+        "passengers_completed": _YES_NO[bool(workflow.get('passengers_completed'))],
+    })
+
+
+# 파일 분석 응답 캐시 (TTL + LRU): 같은 요청(모델/시나리오/브라우저 상태/파일 내용/정규화한 질문)이면
+# OpenAI를 다시 호출하지 않고 이전 응답을 재사용. 이벤트 루프 안에서 await 없이 읽고 쓰므로 Lock 불필요
+_ANALYSIS_CACHE_MAX_ENTRIES = 2048
+_ANALYSIS_CACHE_TTL_SECONDS = 3600
+_analysis_cache: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+
+# 진행 중인 파일 분석 요청 (single-flight): 같은 키의 동시 요청은 OpenAI를 한 번만 호출하고 결과를 공유
+# 요청은 별도 태스크로 실행하므로 먼저 온 클라이언트가 연결을 끊어도 함께 기다리는 요청은 계속 진행됨
+_analysis_inflight: Dict[bytes, "asyncio.Task[Dict[str, Any]]"] = {}
+
+
+def _analysis_inflight_done(cache_key: bytes, task: "asyncio.Task[Dict[str, Any]]") -> None:
+    """완료된 파일 분석 태스크 정리 (기다리던 쪽이 모두 취소됐어도 예외를 회수해 경고 로그 방지)"""
+    if _analysis_inflight.get(cache_key) is task:
+        del _analysis_inflight[cache_key]
+    if not task.cancelled():
+        task.exception()
+
+
+# 캐시 키용 질문 정규화: 대소문자, 공백/띄어쓰기, 앞뒤 문장부호 차이는 같은 질문으로 취급
+# ("승객 몇 명이야?" = "승객 몇명이야", "How many passengers?" = "how many passengers")
+_QUERY_WHITESPACE_RE = re.compile(r"\s+")
+_QUERY_EDGE_PUNCTUATION = "?？!！.。~～…,，"
+
+
+def _normalize_query_for_cache(user_query: str) -> str:
+    """캐시 키에 넣을 정규화된 질문 (LLM에는 원래 질문을 그대로 보냄)"""
+    text = _QUERY_WHITESPACE_RE.sub("", user_query.casefold())
+    return text.strip(_QUERY_EDGE_PUNCTUATION)
+
+
+def _analysis_cache_key(*parts: Any) -> bytes:
+    """
+    요청 구성 요소 해시 (파일 내용 전체를 키로 들고 있지 않도록 16바이트 digest만 사용)
+
+    요청 body 대신 구성 요소를 해시하므로 질문을 정규화한 값으로 키를 만들 수 있습니다.
+    응답 언어 지침(질문 언어로 결정)도 구성 요소에 포함되므로 한국어/영어 질문의 답변이 섞이지 않습니다.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.digest()
+
+
+def _analysis_cache_get(key: bytes) -> Optional[Dict[str, Any]]:
+    """캐시 조회 (만료된 항목은 제거)"""
+    entry = _analysis_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, result = entry
+    if expires_at < time.monotonic():
+        del _analysis_cache[key]
+        return None
+    _analysis_cache.move_to_end(key)
+    return result
+
+
+def _analysis_cache_put(key: bytes, result: Dict[str, Any]) -> None:
+    """캐시 저장 (최대 개수를 넘으면 가장 오래 사용하지 않은 항목부터 제거)"""
+    _analysis_cache[key] = (time.monotonic() + _ANALYSIS_CACHE_TTL_SECONDS, result)
+    _analysis_cache.move_to_end(key)
+    while len(_analysis_cache) > _ANALYSIS_CACHE_MAX_ENTRIES:
+        _analysis_cache.popitem(last=False)
+
+
+# 파일 분석 응답 최대 토큰 수 (개수/수치만 묻는 짧은 질문은 작은 상한 사용)
+_FILE_ANALYSIS_MAX_TOKENS = 2048
+_FILE_ANALYSIS_SHORT_MAX_TOKENS = 512
+_SHORT_QUESTION_MAX_CHARS = 60
+# 개수만 묻는 표현만 짧은 질문으로 취급 ("how long", "몇 분", "얼마나 기다려" 같은 시간/대기 질문은 설명이 붙으므로 제외)
+_COUNT_QUESTION_RE = re.compile(
+    r"how\s+many|number\s+of|몇\s*(?:명|개|편|곳|대)|총\s*[가-힣A-Za-z_]+\s*(?:의\s*)?수",
+    re.IGNORECASE,
+)
+_DETAIL_REQUEST_RE = re.compile(
+    r"요약|설명|분석|자세히|목록|리스트|전부|각각|각\s|별로|비교|summar|explain|detail|list|each|per\s|compare|breakdown",
+    re.IGNORECASE,
+)
+
+
+def _file_analysis_max_tokens(user_query: str) -> int:
+    """질문 유형별 max_tokens: 수치 하나를 묻는 짧은 질문이면 작은 상한, 요약/설명/목록 요청은 기본 상한"""
+    text = user_query.strip()
+    if (
+        len(text) <= _SHORT_QUESTION_MAX_CHARS
+        and _COUNT_QUESTION_RE.search(text)
+        and not _DETAIL_REQUEST_RE.search(text)
+    ):
+        return _FILE_ANALYSIS_SHORT_MAX_TOKENS
+    return _FILE_ANALYSIS_MAX_TOKENS
+
+
+# 명령 파싱 응답 최대 토큰 수: tool call 인자는 수십 토큰이므로 짧은 명령형 요청은 작은 상한으로 보내고,
+# 일반 대화 답변이 작은 상한에 걸려 잘리면(finish_reason == "length") 기본 상한으로 한 번 더 요청
+_COMMAND_MAX_TOKENS = 1024
+_COMMAND_SHORT_MAX_TOKENS = 256
+_COMMAND_REQUEST_RE = re.compile(r"추가|삭제|제거|목록|리스트|\b(?:add|remove|delete|list)\b", re.IGNORECASE)
+_QUESTION_RE = re.compile(r"[?？]|뭐|왜|어떻|어떤|몇|무엇|알려|설명|\b(?:what|why|how|which|explain)\b", re.IGNORECASE)
+
+
+def _command_max_tokens(user_content: str) -> int:
+    """명령 파싱 max_tokens: 짧은 명령형 요청이면 작은 상한, 질문/대화는 기본 상한"""
+    text = user_content.strip()
+    if (
+        len(text) <= _SHORT_QUESTION_MAX_CHARS
+        and _COMMAND_REQUEST_RE.search(text)
+        and not _QUESTION_RE.search(text)
+    ):
+        return _COMMAND_SHORT_MAX_TOKENS
+    return _COMMAND_MAX_TOKENS
+
+
+# 명령 파싱 결과 캐시 (TTL + LRU): 같은 메시지 목록(지침/시뮬레이션 상태/시나리오 정보/대화 이력/명령)이면
+# 이전 tool call 결과를 재사용. 일반 대화 답변(chat)과 오류는 캐시하지 않음
+# 프로세스 목록이 바뀌면 시나리오 정보 블록이 바뀌어 키도 달라지므로 별도 무효화가 필요 없음
+_COMMAND_CACHE_MAX_ENTRIES = 4096
+_COMMAND_CACHE_TTL_SECONDS = 900
+_command_cache: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+
+def _command_cache_key(model: str, temperature: float, forced_action: Optional[str], messages: list) -> bytes:
+    """명령 파싱 요청 구성 요소 해시 (max_tokens는 tool call 결과에 영향이 없으므로 제외)"""
+    return hashlib.blake2b(orjson.dumps([model, temperature, forced_action, messages]), digest_size=16).digest()
+
+
+def _command_cache_get(key: bytes) -> Optional[Dict[str, Any]]:
+    """캐시 조회 (만료된 항목은 제거)"""
+    entry = _command_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, result = entry
+    if expires_at < time.monotonic():
+        del _command_cache[key]
+        return None
+    _command_cache.move_to_end(key)
+    return result
+
+
+def _command_cache_put(key: bytes, result: Dict[str, Any]) -> None:
+    """캐시 저장 (최대 개수를 넘으면 가장 오래 사용하지 않은 항목부터 제거)"""
+    _command_cache[key] = (time.monotonic() + _COMMAND_CACHE_TTL_SECONDS, result)
+    _command_cache.move_to_end(key)
+    while len(_command_cache) > _COMMAND_CACHE_MAX_ENTRIES:
+        _command_cache.popitem(last=False)
+
+# 이 길이(문자 수) 이상의 파일 내용은 요청 body 생성을 스레드로 넘김 (작은 내용은 스레드 전환 비용이 더 큼)
+_FILE_ANALYSIS_OFFLOAD_MIN_CHARS = 16384
+
+
+def _is_large_file_content(file_content: Any) -> bool:
+    """요청 body 생성을 스레드로 넘길 만큼 큰 파일 내용인지 (원본 dict는 크기를 미리 알 수 없으므로 항상 True)"""
+    if isinstance(file_content, dict):
+        if "content_preview" not in file_content:
+            return True
+        return len(file_content.get("content_preview") or "") >= _FILE_ANALYSIS_OFFLOAD_MIN_CHARS
+    return not isinstance(file_content, str) or len(file_content) >= _FILE_ANALYSIS_OFFLOAD_MIN_CHARS
+
+
+def _build_file_analysis_request(
+    scenario_id: str,
+    file_content: Any,
+    user_query: str,
+    simulation_state: Optional[dict],
+    model: str,
+    temperature: float,
+    max_tokens: int,
+) -> Tuple[bytes, bytes]:
+    """analyze_file_content 요청 body(bytes)와 응답 캐시 키 생성 (CPU 작업만 하므로 스레드에서 실행 가능)"""
+    # file_content는 이미 구조화된 요약 정보 (content_preview)
+    # content_preview를 직접 사용
+    if isinstance(file_content, dict) and "content_preview" in file_content:
+        # command_executor에서 전달된 구조화된 요약 정보 사용
+        content_str = file_content.get("content_preview", "")
+    elif isinstance(file_content, dict):
+        # 긴 리스트를 먼저 잘라낸 뒤 들여쓰기 없이 직렬화 (LLM 입력이므로 pretty-print 불필요)
+        content_str = orjson.dumps(
+            _sample_for_prompt(file_content), default=str, option=orjson.OPT_NON_STR_KEYS
+        ).decode("utf-8")
+    else:
+        content_str = str(file_content)
+    
+    # content_str이 너무 크면 일부만 사용 (복잡한 시나리오 대응, 추정 토큰 기준)
+    truncated = _truncate_to_tokens(content_str, _FILE_CONTENT_MAX_TOKENS)
+    if truncated is not content_str:
+        content_str = truncated + _FILE_CONTENT_TRUNCATED_NOTICE
+
+    # 🆕 현재 시뮬레이션 상태 정보 추가
+    simulation_status = _build_file_analysis_status(simulation_state) if simulation_state else ""
+
+    # 정적 지침 → 파일 내용 → 시나리오/브라우저 상태 + 응답 언어 → 질문 순서로 블록을 나눔
+    # 파일 내용은 시뮬레이션을 다시 돌릴 때만 바뀌고 브라우저 상태는 편집할 때마다 바뀌므로,
+    # 상태가 바뀌거나 질문만 바뀌는 후속 요청도 파일 내용 블록까지 prefix가 같아 캐시가 적중
+    data_context = f"Simulation data:\n{content_str}"
+    scenario_context = "".join([
+        f"Current scenario ID: {scenario_id}{simulation_status}".rstrip("\n"),
+        "\n\n",
+        _RESPONSE_LANGUAGE_LINES[_detect_language(user_query)],
+    ])
+
+    messages = [
+        _FILE_ANALYSIS_SYSTEM_MESSAGE,
+        {"role": "system", "content": data_context},
+        {"role": "system", "content": scenario_context},
+        {"role": "user", "content": user_query},
+    ]
+    
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "prompt_cache_key": f"{_FILE_ANALYSIS_CACHE_KEY_PREFIX}:{scenario_id}",
+        # 응답 생성을 한 번에 기다리지 않고 스트리밍으로 받아 도착하는 대로 누적
+        # (요청 간에 공유되는 태스크에서 받으므로 요청한 클라이언트가 끊겨도 끝까지 받아 캐시에 저장됨)
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
+    
+    raw_body = orjson.dumps(payload)
+    cache_key = _analysis_cache_key(
+        model, temperature, max_tokens, data_context, scenario_context, _normalize_query_for_cache(user_query)
+    )
+    return raw_body, cache_key
+
+
+# 대화 이력 상한: 최근 20개(약 10턴) + 추정 토큰 4K
+_HISTORY_MAX_MESSAGES = 20
+_HISTORY_TOKEN_BUDGET = 4000
+_MESSAGE_OVERHEAD_TOKENS = 4  # 메시지당 role/구분자 토큰
+
+
+def _estimate_tokens(text: str) -> int:
+    """
+    토크나이저 없이 토큰 수를 보수적으로 추정 (UTF-8 3바이트 ≈ 1토큰)
+
+    영어는 약 4바이트/토큰, 한글은 3바이트/자이므로 두 경우 모두 실제보다 약간 크게 잡힙니다.
+    ASCII 문자열은 바이트 수 = 문자 수이므로 인코딩(복사본 생성) 없이 계산합니다.
+    """
+    byte_length = len(text) if text.isascii() else len(text.encode("utf-8"))
+    return byte_length // 3 + 1
+
+
+def _estimate_request_tokens(body: bytes, max_tokens: int) -> int:
+    """
+    레이트 리미터에 차감할 요청 토큰 수 추정 (직렬화된 요청 body 바이트 기준 + 최대 출력 토큰)
+
+    OpenAI는 요청 시점에 max_tokens까지 TPM 한도에 포함하므로 출력 상한도 더합니다.
+    """
+    return len(body) // 3 + 1 + max_tokens
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    추정 토큰 수(_estimate_tokens와 같은 3바이트 ≈ 1토큰 기준)가 max_tokens 이내가 되도록 자름
+
+    문자 수로 자르면 한글이 많은 내용은 같은 길이라도 토큰을 3배 가까이 더 쓰므로 바이트 기준으로 자릅니다.
+    예산 안에 드는 문자열은 복사하지 않고 그대로 반환합니다.
+    """
+    max_bytes = max_tokens * 3
+    if len(text) * 4 <= max_bytes:  # UTF-8 최대 4바이트/자 → 인코딩 없이도 예산 이내
+        return text
+    if text.isascii():
+        return text if len(text) <= max_bytes else text[:max_bytes]
+    encoded = text.encode("utf-8")
+    if len(encoded) <= max_bytes:
+        return text
+    return encoded[:max_bytes].decode("utf-8", errors="ignore")  # 잘린 멀티바이트 문자 끝부분은 버림
+
+
+_WELCOME_MESSAGE_MARKER = "Ask me anything"
+
+
+def _is_dialogue_message(msg) -> bool:
+    """
+    실제 대화 메시지 여부 (시스템 메시지와 환영 메시지 제외)
+
+    프론트엔드가 is_welcome을 보내면 그 값을 쓰고, 보내지 않은 경우에만 assistant 메시지 내용에서 환영 문구를 찾습니다.
+    """
+    role = msg.role
+    if role == "system":
+        return False
+    if role != "assistant":
+        return True
+    is_welcome = getattr(msg, "is_welcome", None)
+    if is_welcome is not None:
+        return not is_welcome
+    return _WELCOME_MESSAGE_MARKER not in msg.content
+
+
+def _select_recent_history(history: list) -> list:
+    """
+    최근 메시지부터 거꾸로 보며 실제 대화 메시지만 메시지 수/토큰 예산 안에 들어가는 만큼 선택 (원래 순서 유지)
+
+    전체 이력을 먼저 필터링하지 않고 역순 한 번의 순회에서 거르므로,
+    이력이 길어져도 최근 메시지 몇 개만 보고 끝납니다.
+    """
+    selected = []
+    budget = _HISTORY_TOKEN_BUDGET
+    for msg in reversed(history):
+        if not _is_dialogue_message(msg):
+            continue
+        budget -= _estimate_tokens(msg.content) + _MESSAGE_OVERHEAD_TOKENS
+        if budget < 0:
+            break
+        selected.append(msg)
+        if len(selected) >= _HISTORY_MAX_MESSAGES:
+            break
+    selected.reverse()
+    return selected
+
+
+async def _read_chat_completion(
+    response: httpx.Response, on_content: Optional[Callable[[str], None]] = None
+) -> Dict[str, Any]:
+    """
+    Chat Completions 응답을 비스트리밍 응답과 같은 형태의 dict로 조립
+
+    - SSE(stream=True) 응답: 도착하는 chunk를 줄 단위로 바로 파싱해 content/tool_calls delta를 누적
+      (전체 본문을 버퍼링한 뒤 한 번에 파싱하지 않음), finish_reason과 usage를 받으면 바로 읽기 종료
+    - 그 외(JSON) 응답: 기존과 동일하게 한 번에 파싱
+
+    on_content를 주면 content delta가 도착할 때마다 호출 (클라이언트로 토큰 단위 전달용)
+    """
+    if not response.headers.get("content-type", "").startswith("text/event-stream"):
+        return orjson.loads(await response.aread())
+
+    content_parts: List[str] = []
+    tool_calls: Dict[int, Dict[str, Any]] = {}
+    model = None
+    usage: Dict[str, Any] = {}
+    finish_reason = None
+
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue  # 빈 줄(이벤트 구분자), 주석 등
+        if line.startswith(("data: [DONE]", "data:[DONE]")):
+            break
+
+        chunk = orjson.loads(line[5:])  # 앞 공백은 orjson이 무시하므로 strip 복사본을 만들지 않음
+        model = chunk.get("model") or model
+        if chunk.get("usage"):
+            # stream_options.include_usage: 마지막 chunk(choices 비어 있음)에 사용량 포함
+            usage = chunk["usage"]
+
+        for choice in chunk.get("choices") or []:
+            finish_reason = choice.get("finish_reason") or finish_reason
+            delta = choice.get("delta") or {}
+            if delta.get("content"):
+                content_parts.append(delta["content"])
+                if on_content is not None:
+                    on_content(delta["content"])
+            for tc_delta in delta.get("tool_calls") or []:
+                tool_call = tool_calls.setdefault(
+                    tc_delta.get("index", 0),
+                    {"id": None, "type": "function", "function": {"name": "", "arguments": ""}},
+                )
+                if tc_delta.get("id"):
+                    tool_call["id"] = tc_delta["id"]
+                function_delta = tc_delta.get("function") or {}
+                if function_delta.get("name"):
+                    tool_call["function"]["name"] += function_delta["name"]
+                if function_delta.get("arguments"):
+                    tool_call["function"]["arguments"] += function_delta["arguments"]
+
+        if finish_reason and usage:
+            # 완료 사유와 사용량(마지막 chunk)까지 받았으면 남은 [DONE]/스트림 종료를 기다리지 않음
+            break
+
+    message: Dict[str, Any] = {"role": "assistant", "content": "".join(content_parts)}
+    if tool_calls:
+        message["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+
+    return {"model": model, "choices": [{"message": message, "finish_reason": finish_reason}], "usage": usage}
+
+
+# 429/5xx 재시도: 지수 백오프 + jitter (동시에 실패한 요청들이 같은 시점에 다시 몰리지 않도록 분산)
+_OPENAI_MAX_RETRIES = 5
+_RETRY_BASE_SECONDS = 0.5
+_RETRY_CAP_SECONDS = 8.0
+_RETRY_MAX_WAIT_SECONDS = 20.0  # 서버가 이보다 오래 기다리라고 하면 재시도하지 않고 사용자에게 안내
+_RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# 에러 응답 본문은 앞부분만 읽음 (게이트웨이 HTML 에러 페이지가 수십 KB일 수 있어 메모리/로그 크기 제한)
+_ERROR_BODY_MAX_BYTES = 4096
+
+
+async def _read_error_body(response: httpx.Response) -> str:
+    """에러 응답 본문을 최대 _ERROR_BODY_MAX_BYTES까지만 읽어 문자열로 반환 (나머지는 읽지 않고 연결 종료 시 버림)"""
+    chunks: List[bytes] = []
+    size = 0
+    async for chunk in response.aiter_bytes():
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= _ERROR_BODY_MAX_BYTES:
+            break
+    return b"".join(chunks)[:_ERROR_BODY_MAX_BYTES].decode("utf-8", errors="replace")
+
+
+def _retry_after_hint(message: str) -> Optional[float]:
+    """에러 메시지의 "Please try again in 1.2s / 350ms / 1m20s" 힌트를 초 단위로 변환 (없으면 None)"""
+    match = _RETRY_AFTER_RE.search(message)
+    if match is None:
+        return None
+    minutes, value, unit = match.groups()
+    seconds = float(value) / 1000 if unit == "ms" else float(value)
+    return seconds + int(minutes) * 60 if minutes else seconds
+
+
+def _rate_limit_wait_seconds(error_text: str) -> Optional[int]:
+    """rate_limit_exceeded 에러면 사용자에게 안내할 대기 시간(초, 힌트가 없으면 5초), 아니면 None"""
+    if not error_text.lstrip().startswith("{"):
+        return None  # 게이트웨이 HTML 에러 페이지 등은 파싱 시도 없이 건너뜀
+    try:
+        error_data = orjson.loads(error_text)
+    except orjson.JSONDecodeError:
+        return None
+    error = error_data.get("error") if isinstance(error_data, dict) else None
+    if not isinstance(error, dict) or error.get("code") != "rate_limit_exceeded":
+        return None
+
+    hint = _retry_after_hint(error.get("message") or "")
+    if hint is None:
+        return 5
+    seconds = int(hint)  # 올림: 소수 부분이 있으면 1초 추가
+    return seconds if seconds == hint else seconds + 1
+
+
+def _retry_delay(response: httpx.Response, error_text: str, attempt: int) -> Optional[float]:
+    """
+    재시도 전 대기 시간(초) 계산, 재시도하면 안 되는 응답이면 None
+
+    우선순위: retry-after-ms/retry-after 헤더 → 에러 메시지의 "Please try again in Xs" → 지수 백오프 + jitter
+    """
+    if response.status_code not in _RETRYABLE_STATUS_CODES:
+        return None
+    if "insufficient_quota" in error_text:
+        return None  # 요금/할당량 소진은 기다려도 풀리지 않음
+
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass  # HTTP-date 형식 등은 무시하고 아래 방식 사용
+
+    hint = _retry_after_hint(error_text)
+    if hint is not None:
+        return hint
+
+    return min(_RETRY_CAP_SECONDS, _RETRY_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+async def _post_chat_completion(
+    url: str,
+    headers: Optional[Dict[str, str]],
+    body: bytes,
+    estimated_tokens: int,
+    on_content: Optional[Callable[[str], None]] = None,
+) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    chat/completions 요청 (429/5xx는 백오프 후 최대 _OPENAI_MAX_RETRIES회 재시도)
+
+    보내기 전에 레이트 리미터에서 요청 1건 + estimated_tokens(프롬프트 추정 + max_tokens)를 확보합니다.
+    재시도는 200 응답을 받기 전에만 일어나므로 on_content에는 성공한 응답의 delta만 전달됩니다.
+
+    Returns:
+        (응답 dict, "") 또는 재시도를 모두 소진했을 때 (None, 마지막 에러 본문)
+    """
+    client = get_openai_client()  # HTTP/2: 동시 요청을 하나의 연결에 다중화
+    rate_limiter = get_openai_rate_limiter()
+    for attempt in range(_OPENAI_MAX_RETRIES + 1):
+        await rate_limiter.acquire(estimated_tokens)
+        async with client.stream("POST", url, headers=headers, content=body) as response:
+            rate_limiter.update_from_headers(response.headers)
+            if response.status_code == 200:
+                return await _read_chat_completion(response, on_content), ""
+            error_text = await _read_error_body(response)
+
+        delay = _retry_delay(response, error_text, attempt)
+        if delay is None or delay > _RETRY_MAX_WAIT_SECONDS or attempt == _OPENAI_MAX_RETRIES:
+            return None, error_text
+
+        logger.warning(
+            f"OpenAI API returned {response.status_code}, retrying in {delay:.2f}s "
+            f"(attempt {attempt + 1}/{_OPENAI_MAX_RETRIES})"
+        )
+        await asyncio.sleep(delay)
+
+    return None, error_text
+
 
-            # 대화 이력 추가 (최근 20개만, 토큰 제한 고려)
-            if conversation_history:
-                # 시스템 메시지와 환영 메시지 제외하고 실제 대화만 추가
-                filtered_history = [
-                    msg for msg in conversation_history
-                    if msg.role != "system" and not (msg.role == "assistant" and "Ask me anything" in msg.content)
+class CommandParser:
+    """명령 파싱 전담 클래스 - Function Calling 사용"""
+    
+    def __init__(self, command_executor: CommandExecutor):
+        self.command_executor = command_executor
+        self.base_url = "https://api.openai.com/v1"
+    
+    def _get_functions(self) -> list:
+        """Function Calling용 함수 정의"""
+        return _FUNCTIONS
+    
+    async def parse_command(
+        self,
+        user_content: str,
+        scenario_id: str,
+        conversation_history: list = None,
+        simulation_state: dict = None,
+        model: str = "gpt-4o-mini",
+        temperature: float = 0.0
+    ) -> Dict[str, Any]:
+        """
+        사용자 명령을 파싱하여 실행 가능한 액션으로 변환
+
+        Args:
+            user_content: 사용자 명령 (예: "checkin 프로세스 추가해줘")
+            scenario_id: 시나리오 ID
+            conversation_history: 이전 대화 이력 (옵션)
+            simulation_state: 현재 시뮬레이션 상태 (Zustand store에서 추출)
+            model: 사용할 OpenAI 모델
+            temperature: temperature 설정
+
+        Returns:
+            파싱된 명령 정보
+        """
+        # 0. 정형화된 목록 조회/프로세스 추가·삭제 명령은 OpenAI 호출 없이 바로 반환
+        fast_action, fast_parameters = _match_fast_path(user_content) or (None, None)
+        if fast_parameters is not None:
+            logger.info(f"Parsed command via fast path: {fast_action} with args: {fast_parameters}")
+            return {
+                "action": fast_action,
+                "parameters": fast_parameters,
+                "model": None,
+                "usage": {},
+            }
+        # action만 특정된 경우(인자는 LLM이 추출) 해당 함수만 호출하도록 tool_choice 지정
+        forced_action = fast_action
+
+        try:
+            # 1. 시나리오 컨텍스트 조회 시작 (S3 조회가 진행되는 동안 아래의 프롬프트 조립을 함께 수행)
+            context_task = asyncio.create_task(self.command_executor.get_scenario_context(scenario_id))
+            await asyncio.sleep(0)  # 태스크가 먼저 실행돼 S3 요청을 보낸 뒤 돌아오도록 양보
+            try:
+                # 2. 컨텍스트와 무관한 부분 구성: 시뮬레이션 상태 블록, 대화 이력, 사용자 메시지
+                simulation_status = ""
+                if simulation_state:
+                    simulation_status = _render_simulation_status_cached(simulation_state)
+
+                # 대화 이력 (최근 20개 이내, 토큰 예산 고려, 시스템/환영 메시지 제외)
+                # Message 모델 → payload용 dict 변환은 이 경계에서 한 번만 수행
+                history_messages = [
+                    {"role": msg.role, "content": msg.content}
+                    for msg in _select_recent_history(conversation_history or [])
                 ]
-                # 최근 20개만 사용 (약 10턴)
-                recent_history = filtered_history[-20:] if len(filtered_history) > 20 else filtered_history
-                messages.extend(recent_history)
-
-            # 현재 사용자 메시지 추가
-            # Passenger/Process 데이터가 있으면 user message에 컨텍스트 추가
-            user_message_content = user_content
-            context_hints = []
-
-            if simulation_state:
-                # Passenger 데이터 힌트
-                if (simulation_state.get('passenger') or {}).get('total', 0) > 0:
-                    passenger_data = simulation_state.get('passenger') or {}
-                    context_hints.append(f"Passenger data: {passenger_data.get('total', 0)} passengers with full details (chartResult, demographics, etc.)")
-
-                # Process flow 데이터 힌트
-                if simulation_state.get('process_flow'):
-                    process_flow = simulation_state.get('process_flow', [])
-                    process_count = len(process_flow)
-                    process_names = [p.get('name', '') for p in process_flow]
-                    context_hints.append(f"Process flow data: {process_count} processes ({', '.join(process_names)}) with zones, facilities, time_blocks, entry_conditions")
-
-            if context_hints:
-                context_str = "\n".join([f"- {hint}" for hint in context_hints])
-                user_message_content = f"""{user_content}
-
-[CONTEXT: Real-time simulation data available:
-{context_str}
-Use simulation_state to answer process-related questions.]"""
-
-            messages.append(Message(role="user", content=user_message_content))
+
+                # Passenger/Process 데이터가 있으면 user message에 컨텍스트 추가
+                user_message_content = user_content
+                context_hints = _build_context_hints(simulation_state) if simulation_state else []
+                if context_hints:
+                    user_message_content = "\n".join([
+                        user_content,
+                        "",
+                        "[CONTEXT: Real-time simulation data available:",
+                        *[f"- {hint}" for hint in context_hints],
+                        "Use simulation_state to answer process-related questions.]",
+                    ])
+
+                context = await context_task
+            finally:
+                context_task.cancel()  # 위에서 예외가 난 경우 진행 중인 조회 정리 (완료된 태스크에는 영향 없음)
+
+            # 시나리오 정보 + 응답 언어 줄을 템플릿 한 번의 치환으로 구성
+            scenario_context = _SCENARIO_CONTEXT_TEMPLATE.format_map({
+                "scenario_id": scenario_id,
+                "process_count": context.get('process_count', 0),
+                "process_names": ', '.join(context.get('process_names', [])) or 'None',
+                "language_line": _RESPONSE_LANGUAGE_LINES[_detect_language(user_content)],
+            })
+
+            # 3. 메시지 구성 (정적 지침 → 동적 상태 순서, 프롬프트 캐싱 prefix 유지)
+            messages = [_SYSTEM_MESSAGE]
+            if simulation_status:
+                messages.append(_SIMULATION_GUIDE_MESSAGE)
+                messages.append({"role": "system", "content": f"{simulation_status}\n{scenario_context}"})
+            else:
+                messages.append({"role": "system", "content": scenario_context})
+            messages.extend(history_messages)
+            messages.append({"role": "user", "content": user_message_content})
+
+            # 같은 요청의 tool call 결과가 캐시에 있으면 OpenAI를 호출하지 않음
+            cache_key = _command_cache_key(model, temperature, forced_action, messages)
+            cached = _command_cache_get(cache_key)
+            if cached is not None:
+                logger.info(f"Command parsing cache hit: {cached['action']}")
+                return {**cached, "parameters": dict(cached["parameters"]), "usage": {}}
             
             # 4. Function Calling 요청
-            functions = self._get_functions()
-            
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
-            
             payload = {
                 "model": model,
-                "messages": [msg.model_dump() for msg in messages],
-                "tools": [{"type": "function", "function": f} for f in functions],
-                "tool_choice": "auto",  # AI가 적절한 함수 선택
+                "messages": messages,
                 "temperature": temperature,
-                "max_tokens": 1024,
+                "max_tokens": _command_max_tokens(user_content),
+                "prompt_cache_key": f"{_PROMPT_CACHE_KEY_PREFIX}:{scenario_id}",
+                # 응답을 스트리밍으로 받아 도착하는 대로 파싱 (usage는 마지막 chunk로 전달)
+                "stream": True,
+                "stream_options": {"include_usage": True},
             }
             
-            logger.info(f"Calling OpenAI API for command parsing: {user_content[:50]}...")
+            logger.debug("Calling OpenAI API for command parsing: {}...", user_content[:50])
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"OpenAI API error: {error_text}")
-
-                        try:
-                            error_data = json.loads(error_text)
-                            if error_data.get("error", {}).get("code") == "rate_limit_exceeded":
-                                retry_seconds = 5
-                                match = re.search(r"Please try again in ([\d.]+)s", error_data.get("error", {}).get("message", ""))
-                                if match:
-                                    retry_seconds = math.ceil(float(match.group(1)))
-                                return {
-                                    "action": "chat",
-                                    "content": f"잠깐만요, 현재 토큰 제한으로 잠시 대기 중입니다. 약 {retry_seconds}초 후에 다시 질문해 주세요.",
-                                    "model": None,
-                                    "usage": {},
-                                }
-                        except (json.JSONDecodeError, KeyError):
-                            pass
-
-                        return {
-                            "action": "error",
-                            "error": f"OpenAI API error: {error_text}",
-                        }
-                    
-                    result = await response.json()
-                    
-                    # 5. Function 호출 결과 파싱
-                    message = result.get("choices", [{}])[0].get("message", {})
-                    tool_calls = message.get("tool_calls", [])
-                    
-                    if not tool_calls:
-                        # 함수 호출이 없는 경우 - 일반 대화로 처리
-                        content = message.get("content", "")
-                        return {
-                            "action": "chat",
-                            "content": content,
-                            "model": result.get("model"),
-                            "usage": result.get("usage", {}),
-                        }
-                    
-                    # 첫 번째 tool call 사용
-                    tool_call = tool_calls[0]
-                    function_name = tool_call.get("function", {}).get("name")
-                    function_args_str = tool_call.get("function", {}).get("arguments", "{}")
-                    
-                    try:
-                        function_args = json.loads(function_args_str)
-                    except json.JSONDecodeError:
-                        logger.error(f"Failed to parse function arguments: {function_args_str}")
-                        return {
-                            "action": "error",
-                            "error": "Failed to parse function arguments",
-                        }
-                    
-                    logger.info(f"Parsed command: {function_name} with args: {function_args}")
-                    
+            result, error_text = await self._request_command_completion(payload, forced_action)
+            if (
+                result is not None
+                and payload["max_tokens"] < _COMMAND_MAX_TOKENS
+                and result.get("choices", [{}])[0].get("finish_reason") == "length"
+            ):
+                # 명령으로 보였지만 일반 대화 답변이 작은 상한에 걸려 잘린 경우 기본 상한으로 다시 요청
+                logger.info("Command parsing response truncated, retrying with default max_tokens")
+                payload["max_tokens"] = _COMMAND_MAX_TOKENS
+                result, error_text = await self._request_command_completion(payload, forced_action)
+            if result is None:
+                logger.error(f"OpenAI API error: {error_text}")
+
+                retry_seconds = _rate_limit_wait_seconds(error_text)
+                if retry_seconds is not None:
                     return {
-                        "action": function_name,
-                        "parameters": function_args,
-                        "model": result.get("model"),
-                        "usage": result.get("usage", {}),
+                        "action": "chat",
+                        "content": f"잠깐만요, 현재 토큰 제한으로 잠시 대기 중입니다. 약 {retry_seconds}초 후에 다시 질문해 주세요.",
+                        "model": None,
+                        "usage": {},
                     }
-        
+
+                return {
+                    "action": "error",
+                    "error": f"OpenAI API error: {error_text}",
+                }
+
+            # 프롬프트 캐시 적중 확인 (정적 prefix가 1024 토큰 이상이면 cached_tokens > 0)
+            usage = result.get("usage") or {}
+            cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+            logger.info(f"Command parsing prompt tokens: {usage.get('prompt_tokens', 0)} (cached: {cached_tokens})")
+                
+            # 5. Function 호출 결과 파싱
+            message = result.get("choices", [{}])[0].get("message", {})
+            tool_calls = message.get("tool_calls", [])
+                
+            if not tool_calls:
+                # 함수 호출이 없는 경우 - 일반 대화로 처리
+                content = message.get("content", "")
+                return {
+                    "action": "chat",
+                    "content": content,
+                    "model": result.get("model"),
+                    "usage": result.get("usage", {}),
+                }
+                
+            # 첫 번째 tool call 사용
+            tool_call = tool_calls[0]
+            function_name = tool_call.get("function", {}).get("name")
+            function_args_str = tool_call.get("function", {}).get("arguments", "{}")
+                
+            try:
+                function_args = _parse_function_args(function_name, function_args_str)
+            except (orjson.JSONDecodeError, ValidationError):
+                logger.error(f"Failed to parse function arguments: {function_args_str}")
+                return {
+                    "action": "error",
+                    "error": "Failed to parse function arguments",
+                }
+                
+            logger.info(f"Parsed command: {function_name} with args: {function_args}")
+
+            parsed = {
+                "action": function_name,
+                "parameters": function_args,
+                "model": result.get("model"),
+                "usage": result.get("usage", {}),
+            }
+            _command_cache_put(cache_key, {**parsed, "parameters": dict(function_args)})
+            return parsed
+
+        except (httpx.HTTPError, orjson.JSONDecodeError) as e:
+            # 네트워크/타임아웃/깨진 응답: 원인이 분명하므로 traceback 없이 기록
+            logger.error("Failed to parse command: {!r}", e)
+            return {
+                "action": "error",
+                "error": str(e),
+            }
         except Exception as e:
-            logger.error(f"Failed to parse command: {str(e)}")
+            # 예상하지 못한 응답 형태(KeyError/IndexError/TypeError, 검증 실패 등): traceback을 남기고 같은 오류 응답으로 변환
+            logger.exception("Unexpected error while trying to parse command: {!r}", e)
             return {
                 "action": "error",
                 "error": str(e),
             }
     
+    async def _request_command_completion(
+        self, payload: Dict[str, Any], forced_action: Optional[str] = None
+    ) -> Tuple[Optional[Dict[str, Any]], str]:
+        """명령 파싱 요청 전송 (tools/tool_choice/parallel_tool_calls는 미리 직렬화된 bytes 사용)"""
+        raw_body = _dumps_with_tools(payload, forced_action)
+        body, headers = encode_openai_request_body(raw_body)
+        return await _post_chat_completion(
+            f"{self.base_url}/chat/completions", headers, body,
+            estimated_tokens=_estimate_request_tokens(raw_body, payload["max_tokens"]),
+        )
+
     async def analyze_file_content(
         self,
         scenario_id: str,
@@ -1218,7 +2207,9 @@ Use simulation_state to answer process-related questions.]"""
         user_query: str,
         simulation_state: dict = None,
         model: str = "gpt-4o-mini",
-        temperature: float = 0.1
+        temperature: float = 0.0,
+        *,
+        on_content: Optional[Callable[[str], None]] = None,
     ) -> Dict[str, Any]:
         """
         파일 내용을 AI에게 전달하여 분석
@@ -1231,201 +2222,112 @@ Use simulation_state to answer process-related questions.]"""
             simulation_state: 현재 시뮬레이션 상태 (Zustand store에서 추출)
             model: 사용할 모델
             temperature: temperature
+            on_content: OpenAI 응답 content delta가 도착할 때마다 호출할 콜백 (스트리밍 엔드포인트용)
+                캐시 적중/요약 통계 응답/진행 중인 요청 합류 시에는 호출되지 않으므로 최종 결과의 content를 사용해야 함
 
         Returns:
             AI 분석 결과
         """
         try:
-            import json
-            
-            # file_content는 이미 구조화된 요약 정보 (content_preview)
-            # content_preview를 직접 사용
-            if isinstance(file_content, dict) and "content_preview" in file_content:
-                # command_executor에서 전달된 구조화된 요약 정보 사용
-                content_str = file_content.get("content_preview", "")
-            elif isinstance(file_content, dict):
-                content_str = json.dumps(file_content, indent=2, ensure_ascii=False)
+            # 요약 통계만으로 답할 수 있는 질문은 LLM 호출 없이 바로 응답
+            fast_answer = _answer_from_file_summary(file_content, user_query)
+            if fast_answer is not None:
+                logger.info(f"Answered file question from summary without LLM: {filename}")
+                return {
+                    "success": True,
+                    "content": fast_answer,
+                    "model": None,
+                    "usage": {},
+                }
+
+            # 큰 파일 내용의 직렬화/자르기/해시는 수십~수백 KB를 다루므로 스레드에서 수행 (이벤트 루프 점유 방지)
+            max_tokens = _file_analysis_max_tokens(user_query)
+            build_args = (scenario_id, file_content, user_query, simulation_state, model, temperature, max_tokens)
+            if _is_large_file_content(file_content):
+                raw_body, cache_key = await asyncio.to_thread(_build_file_analysis_request, *build_args)
             else:
-                content_str = str(file_content)
-            
-            # content_str이 너무 크면 일부만 사용 (복잡한 시나리오 대응)
-            if len(content_str) > 60000:
-                content_str = content_str[:60000] + "\n\n... (내용이 길어 일부만 표시했습니다)"
-
-            # 🆕 현재 시뮬레이션 상태 정보 추가
-            simulation_status = ""
-            if simulation_state:
-                simulation_status = f"""
-
-**CURRENT SIMULATION STATE (Real-time from browser):**
-- Airport: {simulation_state.get('airport', 'Not set')}
-- Date: {simulation_state.get('date', 'Not set')}
-- Flights configured: {simulation_state.get('flight_count', 0)} flights
-- Passengers configured: {'Yes' if simulation_state.get('passenger_configured') else 'No'}
-- Process flow: {simulation_state.get('process_count', 0)} processes ({', '.join(simulation_state.get('process_names', [])) or 'None'})
-- Workflow status:
-  * Flights tab completed: {'Yes' if simulation_state.get('workflow', {}).get('flights_completed') else 'No'}
-  * Passengers tab completed: {'Yes' if simulation_state.get('workflow', {}).get('passengers_completed') else 'No'}
-
-**IMPORTANT:** This is the current state in the user's browser. The file data below might be outdated if the user hasn't saved recently.
-"""
+                raw_body, cache_key = _build_file_analysis_request(*build_args)
+
+            # 캐시/공유 결과는 호출부마다 복사본을 반환 (한 호출부의 수정이 다른 응답에 퍼지지 않도록)
+            cached = _analysis_cache_get(cache_key)
+            if cached is not None:
+                logger.info(f"File analysis cache hit: {filename}")
+                return copy.deepcopy(cached)
+
+            # 같은 요청이 이미 진행 중이면 OpenAI를 다시 호출하지 않고 그 결과를 함께 기다림
+            task = _analysis_inflight.get(cache_key)
+            if task is None:
+                task = asyncio.create_task(
+                    self._request_file_analysis(filename, cache_key, raw_body, max_tokens, on_content)
+                )
+                _analysis_inflight[cache_key] = task
+                task.add_done_callback(lambda done, key=cache_key: _analysis_inflight_done(key, done))
+            else:
+                logger.info(f"Joining in-flight file analysis: {filename}")
+            # 이 호출부가 취소돼도 공유 태스크는 취소되지 않음
+            return copy.deepcopy(await asyncio.shield(task))
 
-            system_prompt = f"""You are a data analyst for the Flexa airport simulation system. Explain things in a user-friendly and specific way.
-
-**🌐 LANGUAGE RULES (HIGHEST PRIORITY - MUST FOLLOW):**
-⚠️ CRITICAL: You MUST respond in the SAME language as the user's question!
-
-- Korean question (한글) → Korean answer (한글로 답변)
-- English question → English answer
-- Any other language → Same language answer
-
-**Examples:**
-- User: "승객 몇 명이야?" → Answer in Korean: "총 3,731명의 승객이 생성되었습니다..."
-- User: "How many passengers?" → Answer in English: "A total of 3,731 passengers were generated..."
-
-⚠️ NEVER respond in English when the user asks in Korean!
-⚠️ Match the user's language EXACTLY!
-{simulation_status}
-Current scenario ID: {scenario_id}
-
-Simulation data:
-{content_str[:60000]}
-
-**Core principles:**
-- **Never mention file names**: Don't include file names like "show-up-passenger.parquet", "simulation-pax.parquet", "metadata-for-frontend.json" in your answers
-- **No technical jargon**: Instead of expressions like "file analysis results", "this file contains", "according to the data", answer naturally
-- **Direct answers**: Answer as if you directly ran the simulation
-
-Examples:
-❌ Bad answer: "Based on show-up-passenger.parquet analysis, passengers..."
-✅ Good answer: "Passengers arrived at the airport an average of 2 hours early..."
-
-❌ Bad answer: "This file has 2 flights to Jeju"
-✅ Good answer: "There are 2 flights to Jeju"
-
-**Important guidelines:**
-
-**Common rules for Parquet files (applies to all .parquet files):**
-- **Never use these columns** (completely ignore in analysis):
-  * All columns ending with _icao (e.g., operating_carrier_icao, departure_airport_icao, arrival_airport_icao, aircraft_type_icao, marketing_carrier_icao)
-  * marketing_carrier_iata (use only operating_carrier_iata instead)
-  * data_source
-  * Columns with all None values (e.g., flight_number, departure_timezone, arrival_timezone, first_class_seat_count, etc.)
-
-- **nationality, profile column handling:**
-  * If None → Explain "Nationality (or profile) is not configured"
-  * If has value → Use the value in analysis and explain specifically
-
-- **Key columns to use:**
-  * Airlines: operating_carrier_iata, operating_carrier_name
-  * Airports: departure_airport_iata, arrival_airport_iata
-  * Cities: departure_city, arrival_city
-  * Times: scheduled_departure_local, scheduled_arrival_local, show_up_time
-  * Seats: total_seats
-  * Aircraft: aircraft_type_name (human-readable name like "Boeing 737-800 Passenger")
-
-1. Never use technical terms or JSON key names. Always explain in natural language that regular users can understand.
-   - "savedAt" → "This file was saved on [date/time]"
-   - "process_flow" → "process flow" or "processing steps" (don't mention the key name itself)
-   - "zones" → "zones" or "areas"
-   - "facilities" → "facilities" or "counters"
-   - "time_blocks" → "operating hours"
-
-2. Always include specific numbers and information:
-   - Exactly how many processes there are
-   - The actual names of each process (e.g., "check-in", "security screening")
-   - How many zones in each process
-   - How many facilities in each zone
-   - Total number of facilities
-   - Operating hours information (if available)
-
-3. Answer exactly what the user asked. If they asked "summarize the contents":
-   - List specifically what information is in the file
-   - Explain the meaning of each piece of information
-   - Include numbers and statistics
-
-4. Don't explain JSON structure or key names - explain the actual meaning and content of the data.
-
-5. **simulation-pax.parquet specific guidelines:**
-   - This file should include a "flight_analysis" section
-   - Lambda simulation preserves all columns from show-up-passenger.parquet (arrival_city, carrier, flight_number, etc.), so per-flight statistics are possible
-   - When users ask about flights to specific destinations (e.g., Jeju, Busan), use the "flight_analysis" > "destination_analysis" section
-   - Each destination provides: number of flights, departure times, passenger counts, average wait times for each process
-   - Example question: "How many flights to Jeju?" → Check "flight_count" and "flight_list" in the Jeju item under "destination_analysis"
-   - Example question: "How long did passengers wait for Busan flights?" → Use "xxx_avg_wait_min" data for each flight to that destination
-   - **If "flight_analysis" has an "error" key**: Clearly explain to users that analysis is not possible due to missing columns or data issues, and convey the "error" and "description" content
-   - **If "destination_analysis" is empty**: Explain that there is no valid destination data
-
-6. Examples:
-   ❌ Bad answer: "There is 1 item in process_flow"
-   ✅ Good answer: "There is currently 1 processing step configured. The 'check-in' process has a total of 144 counters deployed across 12 zones (A, B, C, etc.)."
-
-Answer the user's question accurately and in detail based on the file content, in a way that regular users can easily understand."""
-
-            messages = [
-                Message(role="system", content=system_prompt),
-                Message(role="user", content=user_query)
-            ]
-            
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
-            
-            payload = {
-                "model": model,
-                "messages": [msg.model_dump() for msg in messages],
-                "temperature": temperature,
-                "max_tokens": 2048,
+        except (httpx.HTTPError, orjson.JSONDecodeError) as e:
+            # 네트워크/타임아웃/깨진 응답: 원인이 분명하므로 traceback 없이 기록
+            logger.error("Failed to analyze file content: {!r}", e)
+            return {
+                "success": False,
+                "error": str(e),
             }
-            
-            logger.info(f"Calling OpenAI API for file analysis: {filename}")
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"OpenAI API error: {error_text}")
-
-                        try:
-                            error_data = json.loads(error_text)
-                            if error_data.get("error", {}).get("code") == "rate_limit_exceeded":
-                                retry_seconds = 5
-                                match = re.search(r"Please try again in ([\d.]+)s", error_data.get("error", {}).get("message", ""))
-                                if match:
-                                    retry_seconds = math.ceil(float(match.group(1)))
-                                return {
-                                    "success": True,
-                                    "content": f"잠깐만요, 현재 토큰 제한으로 잠시 대기 중입니다. 약 {retry_seconds}초 후에 다시 질문해 주세요.",
-                                    "model": None,
-                                    "usage": {},
-                                }
-                        except (json.JSONDecodeError, KeyError):
-                            pass
-
-                        return {
-                            "success": False,
-                            "error": f"OpenAI API error: {error_text}",
-                        }
-                    
-                    result = await response.json()
-                    content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-                    
-                    return {
-                        "success": True,
-                        "content": content,
-                        "model": result.get("model"),
-                        "usage": result.get("usage", {}),
-                    }
-        
         except Exception as e:
-            logger.error(f"Failed to analyze file content: {str(e)}")
+            # 예상하지 못한 응답 형태(KeyError/IndexError/TypeError, 검증 실패 등): traceback을 남기고 같은 오류 응답으로 변환
+            logger.exception("Unexpected error while trying to analyze file content: {!r}", e)
             return {
                 "success": False,
                 "error": str(e),
             }
+
+    async def _request_file_analysis(
+        self,
+        filename: str,
+        cache_key: bytes,
+        raw_body: bytes,
+        max_tokens: int,
+        on_content: Optional[Callable[[str], None]] = None,
+    ) -> Dict[str, Any]:
+        """파일 분석 OpenAI 호출 (성공 응답은 캐시에 저장)"""
+        logger.debug("Calling OpenAI API for file analysis: {}", filename)
+        
+        body, headers = encode_openai_request_body(raw_body)
+        result, error_text = await _post_chat_completion(
+            f"{self.base_url}/chat/completions", headers, body,
+            estimated_tokens=_estimate_request_tokens(raw_body, max_tokens),
+            on_content=on_content,
+        )
+        if result is None:
+            logger.error(f"OpenAI API error: {error_text}")
+
+            retry_seconds = _rate_limit_wait_seconds(error_text)
+            if retry_seconds is not None:
+                return {
+                    "success": True,
+                    "content": f"잠깐만요, 현재 토큰 제한으로 잠시 대기 중입니다. 약 {retry_seconds}초 후에 다시 질문해 주세요.",
+                    "model": None,
+                    "usage": {},
+                }
+
+            return {
+                "success": False,
+                "error": f"OpenAI API error: {error_text}",
+            }
+            
+        # 프롬프트 캐시 적중 확인 (정적 지침 + 시나리오/파일 블록 재사용 여부)
+        usage = result.get("usage") or {}
+        cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+        logger.info(f"File analysis prompt tokens: {usage.get('prompt_tokens', 0)} (cached: {cached_tokens})")
+
+        content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+            
+        analysis = {
+            "success": True,
+            "content": content,
+            "model": result.get("model"),
+            "usage": result.get("usage", {}),
+        }
+        _analysis_cache_put(cache_key, analysis)
+        return analysis
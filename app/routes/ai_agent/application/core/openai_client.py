@@ -0,0 +1,219 @@
+"""
+OpenAI API 호출용 공유 HTTP 클라이언트
+
+요청마다 클라이언트를 새로 만들면 매번 DNS 조회/TCP 연결/TLS 핸드셰이크를
+다시 수행하므로, 애플리케이션 전체에서 하나의 클라이언트(커넥션 풀)를 재사용합니다.
+
+- get_openai_client(): httpx HTTP/2 클라이언트 (동시 요청을 하나의 TLS 연결에 다중화)
+- get_local_ai_client(): 로컬 AI 서버용 httpx 클라이언트 (OpenAI 인증 헤더 없음)
+- get_openai_rate_limiter(): 요청 전 RPM/TPM 한도를 미리 지키는 토큰 버킷 (429 예방)
+- warm_up_openai_client(): 시작 시 연결을 미리 맺어 첫 요청의 핸드셰이크 지연 제거
+- encode_openai_request_body(): 설정 시 요청 body gzip 압축
+"""
+import asyncio
+import gzip
+import os
+import time
+from typing import Dict, Mapping, Optional, Tuple
+
+import httpx
+from loguru import logger
+
+
+# 싱글톤 httpx HTTP/2 클라이언트 (애플리케이션 전체에서 재사용)
+_client: Optional[httpx.AsyncClient] = None
+
+# 싱글톤 로컬 AI 서버 클라이언트 (OpenAI 키가 내부 서버로 전송되지 않도록 별도 클라이언트 사용)
+_local_client: Optional[httpx.AsyncClient] = None
+
+# API 키는 모듈 로드 시 1회만 읽고, 인증/본문 형식 헤더는 httpx 클라이언트의 기본 헤더로 한 번만 설정
+_OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+if not _OPENAI_API_KEY:
+    logger.warning("OPENAI_API_KEY is not set in environment variables")
+_OPENAI_DEFAULT_HEADERS = {
+    "Authorization": f"Bearer {_OPENAI_API_KEY}",
+    "Content-Type": "application/json",
+}
+
+# 연결 수립은 짧은 타임아웃으로 빨리 실패시키고, 연결 단계 실패(ConnectError/ConnectTimeout)만 transport에서 1회 재시도
+# (요청이 전송된 뒤의 실패는 중복 생성을 막기 위해 재시도하지 않음)
+_CONNECT_TIMEOUT_SECONDS = 10.0
+_CONNECT_RETRIES = 1
+
+# 요청 body gzip 압축 (기본 비활성, OPENAI_GZIP_REQUESTS=true로 활성화)
+# 반복되는 영문 지침이 대부분이라 압축률이 높음 → 업로드가 느린 환경에서 전송 시간 단축
+# 응답은 httpx가 기본으로 Accept-Encoding을 보내고 자동으로 해제함
+_GZIP_REQUESTS = os.getenv("OPENAI_GZIP_REQUESTS", "false").lower() in ("1", "true", "yes")
+_GZIP_MIN_BYTES = 2048  # 이보다 작은 body는 압축 이득이 없음
+_OPENAI_GZIP_HEADERS = {"Content-Encoding": "gzip"}  # 인증/Content-Type은 공유 클라이언트의 기본 헤더 사용
+
+# 시작 시 연결 예열용 엔드포인트 (토큰을 쓰지 않는 가벼운 GET)
+_WARM_UP_URL = "https://api.openai.com/v1/models"
+
+# 계정의 분당 요청/토큰 한도 초기값 (응답의 x-ratelimit-* 헤더를 받으면 실제 한도로 보정)
+_DEFAULT_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+_DEFAULT_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))
+
+
+def encode_openai_request_body(body: bytes) -> Tuple[bytes, Optional[Dict[str, str]]]:
+    """OpenAI 요청 body와 추가 헤더 반환 (설정 시 gzip 압축, level 1: CPU 부담 적고 압축률 대부분 확보)"""
+    if _GZIP_REQUESTS and len(body) >= _GZIP_MIN_BYTES:
+        return gzip.compress(body, compresslevel=1), _OPENAI_GZIP_HEADERS
+    return body, None
+
+
+def get_openai_client() -> httpx.AsyncClient:
+    """공유 httpx 클라이언트 반환 (싱글톤, HTTP/2)
+
+    HTTP/2는 하나의 TLS 연결 위에서 여러 요청을 동시에 처리하므로,
+    사용자 여러 명의 동시 요청이 연결 수만큼 핸드셰이크/소켓을 쓰지 않습니다.
+
+    Authorization/Content-Type이 기본 헤더로 붙으므로 OpenAI API 호출에만 사용해야 합니다.
+    """
+    global _client
+
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers=_OPENAI_DEFAULT_HEADERS,
+            timeout=httpx.Timeout(60.0, connect=_CONNECT_TIMEOUT_SECONDS),
+            # transport를 직접 지정하면 http2/limits는 transport에 설정해야 적용됨
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=_CONNECT_RETRIES,
+                limits=httpx.Limits(
+                    max_connections=100,
+                    max_keepalive_connections=20,
+                    keepalive_expiry=300,  # 유휴 커넥션 5분 유지
+                ),
+            ),
+        )
+        logger.info("Created shared HTTP/2 client for OpenAI API")
+
+    return _client
+
+
+def get_local_ai_client() -> httpx.AsyncClient:
+    """공유 로컬 AI 서버(TRT-LLM) 클라이언트 반환 (싱글톤)
+
+    내부 네트워크의 평문 HTTP 서버이므로 HTTP/1.1 keep-alive 커넥션을 재사용하고,
+    OpenAI 인증 헤더가 붙지 않도록 get_openai_client()와 분리합니다.
+    """
+    global _local_client
+
+    if _local_client is None or _local_client.is_closed:
+        _local_client = httpx.AsyncClient(
+            headers={"Content-Type": "application/json"},
+            timeout=httpx.Timeout(120.0, connect=_CONNECT_TIMEOUT_SECONDS),  # 로컬 서버는 생성이 느려 더 긴 타임아웃
+            transport=httpx.AsyncHTTPTransport(
+                retries=_CONNECT_RETRIES,
+                limits=httpx.Limits(
+                    max_connections=100,
+                    max_keepalive_connections=20,
+                    keepalive_expiry=60,
+                ),
+            ),
+        )
+        logger.info("Created shared HTTP client for local AI server")
+
+    return _local_client
+
+
+async def warm_up_openai_client() -> None:
+    """
+    공유 HTTP/2 클라이언트의 연결을 미리 맺어 둠 (애플리케이션 시작 시 백그라운드로 호출)
+
+    첫 사용자 요청이 DNS 조회/TCP 연결/TLS 핸드셰이크 비용을 내지 않도록 가벼운 GET을 한 번 보냅니다.
+    응답 상태와 무관하게 연결만 맺으면 되므로 실패는 로그만 남기고 무시합니다.
+    """
+    try:
+        response = await get_openai_client().get(_WARM_UP_URL, timeout=5.0)
+        logger.info(f"Warmed up OpenAI HTTP/2 connection ({response.http_version}, status {response.status_code})")
+    except httpx.HTTPError as e:
+        logger.warning(f"OpenAI connection warm-up failed: {e!r}")
+
+
+class OpenAIRateLimiter:
+    """
+    분당 요청 수(RPM)/토큰 수(TPM) 토큰 버킷
+
+    요청 전에 acquire()로 한도를 미리 차감하고, 남은 양이 부족하면 채워질 때까지 기다립니다.
+    429를 받은 뒤 재시도하는 것보다 미리 기다리는 편이 빠르고, 동시 요청이 몰려도 한도 안에서 고르게 나갑니다.
+    버킷은 acquire 시점에 경과 시간만큼 채우므로 별도의 백그라운드 태스크가 필요 없습니다.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self._request_capacity = float(requests_per_minute)
+        self._token_capacity = float(tokens_per_minute)
+        self._requests = self._request_capacity
+        self._tokens = self._token_capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()  # 대기 중인 요청은 도착 순서대로 통과
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._requests = min(self._request_capacity, self._requests + elapsed * self._request_capacity / 60)
+        self._tokens = min(self._token_capacity, self._tokens + elapsed * self._token_capacity / 60)
+
+    async def acquire(self, tokens: int) -> None:
+        """요청 1건 + 추정 토큰 수만큼 차감 (부족하면 채워질 때까지 대기)"""
+        async with self._lock:
+            while True:
+                self._refill()
+                needed_tokens = min(float(tokens), self._token_capacity)  # 한도보다 큰 요청도 언젠가는 통과
+                if self._requests >= 1 and self._tokens >= needed_tokens:
+                    self._requests -= 1
+                    self._tokens -= needed_tokens
+                    return
+                wait_seconds = max(
+                    (1 - self._requests) * 60 / self._request_capacity,
+                    (needed_tokens - self._tokens) * 60 / self._token_capacity,
+                )
+                logger.debug(f"OpenAI rate limiter: waiting {wait_seconds:.2f}s")
+                await asyncio.sleep(wait_seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """응답의 x-ratelimit-* 헤더로 실제 한도와 남은 양을 보정 (헤더가 없으면 무시)"""
+        try:
+            limit_requests = headers.get("x-ratelimit-limit-requests")
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            limit_tokens = headers.get("x-ratelimit-limit-tokens")
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+
+            self._refill()
+            # 한도는 acquire에서 나누는 값이므로 양수일 때만 반영 ("0" 등 비정상 값은 무시)
+            if limit_requests and float(limit_requests) > 0:
+                self._request_capacity = float(limit_requests)
+            if remaining_requests:
+                self._requests = min(self._requests, float(remaining_requests))
+            if limit_tokens and float(limit_tokens) > 0:
+                self._token_capacity = float(limit_tokens)
+            if remaining_tokens:
+                self._tokens = min(self._tokens, float(remaining_tokens))
+        except ValueError:
+            pass
+
+
+# 싱글톤 레이트 리미터 (모든 OpenAI 호출이 같은 계정 한도를 공유)
+_rate_limiter = OpenAIRateLimiter(_DEFAULT_REQUESTS_PER_MINUTE, _DEFAULT_TOKENS_PER_MINUTE)
+
+
+def get_openai_rate_limiter() -> OpenAIRateLimiter:
+    """공유 레이트 리미터 반환 (싱글톤)"""
+    return _rate_limiter
+
+
+async def close_openai_session() -> None:
+    """공유 클라이언트 종료 (애플리케이션 종료 시 호출)"""
+    global _client, _local_client
+
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("Closed shared HTTP/2 client for OpenAI API")
+    _client = None
+
+    if _local_client is not None and not _local_client.is_closed:
+        await _local_client.aclose()
+        logger.info("Closed shared HTTP client for local AI server")
+    _local_client = None
@@ -1,13 +1,24 @@
 import os
-import aiohttp
+import httpx
+import orjson
 from typing import List, Dict, Any
 
 from fastapi import HTTPException, status
 from loguru import logger
 
+from app.routes.ai_agent.application.core.openai_client import (
+    encode_openai_request_body,
+    get_local_ai_client,
+    get_openai_client,
+)
 from app.routes.ai_agent.interface.schema import Message
 
 
+def _to_payload_messages(messages: List[Message]) -> List[Dict[str, str]]:
+    """요청 본문용 메시지 dict 목록 (필드가 role/content 두 개뿐이라 model_dump 대신 직접 구성)"""
+    return [{"role": msg.role, "content": msg.content} for msg in messages]
+
+
 class AIAgentService:
     def __init__(self):
         self.api_key = os.getenv("OPENAI_API_KEY")
@@ -41,40 +52,36 @@ class AIAgentService:
             )
         
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            }
-            
             payload = {
                 "model": model,
                 "max_tokens": max_tokens,
                 "temperature": temperature,
-                "messages": [msg.model_dump() for msg in messages],
+                "messages": _to_payload_messages(messages),
             }
             
             logger.info(f"Calling OpenAI API with model: {model}")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"OpenAI API error: {error_text}")
-                        raise HTTPException(
-                            status_code=status.HTTP_502_BAD_GATEWAY,
-                            detail=f"OpenAI API returned error: {error_text}"
-                        )
-                    
-                    result = await response.json()
-                    logger.info(f"OpenAI API call successful. Tokens used: {result.get('usage', {})}")
-                    return result
+            # 공유 HTTP/2 클라이언트 (인증/Content-Type 헤더와 타임아웃(60초, 연결 10초)은 클라이언트 기본값 사용)
+            # bytes로 직접 전달 (str 변환/재인코딩 생략), 설정 시 gzip 압축
+            body, headers = encode_openai_request_body(orjson.dumps(payload))
+            response = await get_openai_client().post(
+                f"{self.base_url}/chat/completions",
+                content=body,
+                headers=headers,
+            )
+            if response.status_code != 200:
+                error_text = response.text
+                logger.error(f"OpenAI API error: {error_text}")
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail=f"OpenAI API returned error: {error_text}"
+                )
+                
+            result = orjson.loads(response.content)
+            logger.info(f"OpenAI API call successful. Tokens used: {result.get('usage', {})}")
+            return result
                     
-        except aiohttp.ClientError as e:
+        except httpx.HTTPError as e:
             logger.error(f"Network error calling OpenAI API: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_502_BAD_GATEWAY,
@@ -107,40 +114,34 @@ class AIAgentService:
             로컬 AI 서버 응답 (OpenAI 호환 포맷)
         """
         try:
-            headers = {
-                "Content-Type": "application/json",
-            }
-            
             payload = {
                 "model": model,
                 "max_tokens": max_tokens,
                 "temperature": temperature,
-                "messages": [msg.model_dump() for msg in messages],
+                "messages": _to_payload_messages(messages),
             }
             
             logger.info(f"Calling Local AI (DGX Spark) with model: {model}")
             logger.info(f"Local AI Base URL: {self.local_ai_base_url}")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.local_ai_base_url}/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=120)  # 로컬 서버는 더 긴 타임아웃
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"Local AI server error: {error_text}")
-                        raise HTTPException(
-                            status_code=status.HTTP_502_BAD_GATEWAY,
-                            detail=f"Local AI server returned error: {error_text}"
-                        )
-                    
-                    result = await response.json()
-                    logger.info(f"Local AI call successful. Tokens used: {result.get('usage', {})}")
-                    return result
+            # 로컬 서버 전용 클라이언트 (OpenAI 인증 헤더 없음, 타임아웃 120초)
+            response = await get_local_ai_client().post(
+                f"{self.local_ai_base_url}/chat/completions",
+                content=orjson.dumps(payload),  # bytes로 직접 전달 (str 변환/재인코딩 생략)
+            )
+            if response.status_code != 200:
+                error_text = response.text
+                logger.error(f"Local AI server error: {error_text}")
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail=f"Local AI server returned error: {error_text}"
+                )
+                
+            result = orjson.loads(response.content)
+            logger.info(f"Local AI call successful. Tokens used: {result.get('usage', {})}")
+            return result
                     
-        except aiohttp.ClientError as e:
+        except httpx.HTTPError as e:
             logger.error(f"Network error calling Local AI server: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_502_BAD_GATEWAY,
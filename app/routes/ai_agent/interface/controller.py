@@ -1,5 +1,10 @@
+import asyncio
+from typing import AsyncIterator, Callable, Optional
+
+import orjson
 from dependency_injector.wiring import Provide, inject
 from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi.responses import StreamingResponse
 from loguru import logger
 
 from app.libs.containers import Container
@@ -91,6 +96,171 @@ async def chat_local(
     )
 
 
+async def _dispatch_command(
+    scenario_id: str,
+    request: CommandRequest,
+    parsed: dict,
+    command_parser: CommandParser,
+    on_content: Optional[Callable[[str], None]] = None,
+) -> CommandResponse:
+    """파싱된 명령을 실행하고 응답 구성 (on_content: 파일 분석 답변 delta 콜백, 스트리밍 엔드포인트용)"""
+    # 1. 파싱 에러 처리
+    if parsed.get("action") == "error":
+        return CommandResponse(
+            success=False,
+            message=f"명령을 이해할 수 없습니다: {parsed.get('error', 'Unknown error')}",
+            error=parsed.get("error"),
+        )
+    
+    # 2. 일반 대화인 경우
+    if parsed.get("action") == "chat":
+        return CommandResponse(
+            success=True,
+            message=parsed.get("content", ""),
+            action="chat",
+        )
+    
+    # 3. 명령 실행
+    action = parsed.get("action")
+    parameters = parsed.get("parameters", {})
+    executor = command_parser.command_executor
+    
+    if action == "add_process":
+        result = await executor.add_process(
+            scenario_id=scenario_id,
+            process_name=parameters.get("process_name"),
+        )
+        return CommandResponse(
+            success=result["success"],
+            message=result["message"],
+            action="add_process",
+            data=result.get("data"),
+            error=result.get("error"),
+        )
+    
+    elif action == "remove_process":
+        result = await executor.remove_process(
+            scenario_id=scenario_id,
+            process_name=parameters.get("process_name"),
+        )
+        return CommandResponse(
+            success=result["success"],
+            message=result["message"],
+            action="remove_process",
+            data=result.get("data"),
+            error=result.get("error"),
+        )
+    
+    elif action == "list_processes":
+        # 🔥 우선 simulation_state (브라우저 실시간 상태)를 사용
+        # simulation_state가 없을 때만 S3에서 가져옴
+        if request.simulation_state and request.simulation_state.get("process_names"):
+            process_list = request.simulation_state.get("process_names", [])
+        else:
+            context = await executor.get_scenario_context(scenario_id)
+            process_list = context.get("process_names", [])
+
+        if not process_list:
+            message = "현재 설정된 프로세스가 없습니다."
+        else:
+            formatted_list = "\n".join([f"- {name}" for name in process_list])
+            message = f"현재 프로세스 목록 ({len(process_list)}개):\n{formatted_list}"
+
+        return CommandResponse(
+            success=True,
+            message=message,
+            action="list_processes",
+            data={"processes": process_list, "count": len(process_list)},
+        )
+    
+    elif action == "list_files":
+        result = await executor.list_files(scenario_id)
+        return CommandResponse(
+            success=result["success"],
+            message=result["message"],
+            action="list_files",
+            data={
+                "files": result.get("files", []),
+                "count": result.get("count", 0),
+                "categories": result.get("categories", {}),
+            },
+            error=result.get("error"),
+        )
+    
+    elif action == "read_file":
+        filename = parameters.get("filename")
+        
+        # 파일 읽기 (기본적으로 summary 타입으로 AI 분석)
+        result = await executor.read_file(
+            scenario_id=scenario_id,
+            filename=filename,
+            summary_type="summary"  # 기본값으로 summary 사용
+        )
+        
+        if not result["success"]:
+            return CommandResponse(
+                success=False,
+                message=result["message"],
+                action="read_file",
+                error=result.get("error"),
+            )
+        
+        # AI 분석이 필요한 경우
+        if result.get("needs_ai_analysis"):
+            # 원본 사용자 질문으로 AI 분석 요청
+            analysis_result = await command_parser.analyze_file_content(
+                scenario_id=scenario_id,
+                filename=filename,
+                file_content={
+                    "content_preview": result.get("content_preview", ""),
+                    "full_content": result.get("full_content")
+                },
+                user_query=request.content,  # 원본 질문
+                simulation_state=request.simulation_state,  # 👈 실시간 상태 전달
+                model=request.model,
+                temperature=request.temperature,
+                on_content=on_content,  # 스트리밍 엔드포인트면 답변을 토큰 단위로 전달
+            )
+            
+            if analysis_result.get("success"):
+                return CommandResponse(
+                    success=True,
+                    message=analysis_result.get("content", ""),
+                    action="read_file",
+                    data={
+                        "filename": filename,
+                        "analysis": True,
+                    },
+                )
+            else:
+                return CommandResponse(
+                    success=False,
+                    message=f"파일 분석 중 오류가 발생했습니다: {analysis_result.get('error')}",
+                    action="read_file",
+                    error=analysis_result.get("error"),
+                )
+        
+        # 구조나 전체 내용인 경우
+        return CommandResponse(
+            success=result["success"],
+            message=result["message"],
+            action="read_file",
+            data={
+                "filename": filename,
+                "structure": result.get("structure"),
+                "content": result.get("content"),
+            },
+            error=result.get("error"),
+        )
+
+    else:
+        return CommandResponse(
+            success=False,
+            message=f"지원하지 않는 명령입니다: {action}",
+            error=f"Unsupported action: {action}",
+        )
+
+
 @ai_agent_router.post(
     "/scenario/{scenario_id}/execute-command",
     status_code=status.HTTP_200_OK,
@@ -116,7 +286,7 @@ async def execute_command(
     
     - **content**: 사용자 명령
     - **model**: 사용할 OpenAI 모델 (기본: gpt-4o-mini)
-    - **temperature**: 응답의 일관성 (기본: 0.1)
+    - **temperature**: 응답의 일관성 (기본: 0.0)
     """
     try:
         # 1. 명령 파싱
@@ -129,164 +299,91 @@ async def execute_command(
             temperature=request.temperature
         )
         
-        # 2. 에러 처리
-        if parsed.get("action") == "error":
-            return CommandResponse(
-                success=False,
-                message=f"명령을 이해할 수 없습니다: {parsed.get('error', 'Unknown error')}",
-                error=parsed.get("error"),
-            )
-        
-        # 3. 일반 대화인 경우
-        if parsed.get("action") == "chat":
-            return CommandResponse(
-                success=True,
-                message=parsed.get("content", ""),
-                action="chat",
-            )
-        
-        # 4. 명령 실행
-        action = parsed.get("action")
-        parameters = parsed.get("parameters", {})
-        executor = command_parser.command_executor
-        
-        if action == "add_process":
-            result = await executor.add_process(
-                scenario_id=scenario_id,
-                process_name=parameters.get("process_name"),
-            )
-            return CommandResponse(
-                success=result["success"],
-                message=result["message"],
-                action="add_process",
-                data=result.get("data"),
-                error=result.get("error"),
-            )
-        
-        elif action == "remove_process":
-            result = await executor.remove_process(
-                scenario_id=scenario_id,
-                process_name=parameters.get("process_name"),
-            )
-            return CommandResponse(
-                success=result["success"],
-                message=result["message"],
-                action="remove_process",
-                data=result.get("data"),
-                error=result.get("error"),
-            )
-        
-        elif action == "list_processes":
-            # 🔥 우선 simulation_state (브라우저 실시간 상태)를 사용
-            # simulation_state가 없을 때만 S3에서 가져옴
-            if request.simulation_state and request.simulation_state.get("process_names"):
-                process_list = request.simulation_state.get("process_names", [])
-            else:
-                context = await executor.get_scenario_context(scenario_id)
-                process_list = context.get("process_names", [])
-
-            if not process_list:
-                message = "현재 설정된 프로세스가 없습니다."
-            else:
-                formatted_list = "\n".join([f"- {name}" for name in process_list])
-                message = f"현재 프로세스 목록 ({len(process_list)}개):\n{formatted_list}"
-
-            return CommandResponse(
-                success=True,
-                message=message,
-                action="list_processes",
-                data={"processes": process_list, "count": len(process_list)},
-            )
-        
-        elif action == "list_files":
-            result = await executor.list_files(scenario_id)
-            return CommandResponse(
-                success=result["success"],
-                message=result["message"],
-                action="list_files",
-                data={
-                    "files": result.get("files", []),
-                    "count": result.get("count", 0),
-                    "categories": result.get("categories", {}),
-                },
-                error=result.get("error"),
-            )
-        
-        elif action == "read_file":
-            filename = parameters.get("filename")
-            
-            # 파일 읽기 (기본적으로 summary 타입으로 AI 분석)
-            result = await executor.read_file(
-                scenario_id=scenario_id,
-                filename=filename,
-                summary_type="summary"  # 기본값으로 summary 사용
-            )
-            
-            if not result["success"]:
-                return CommandResponse(
-                    success=False,
-                    message=result["message"],
-                    action="read_file",
-                    error=result.get("error"),
-                )
-            
-            # AI 분석이 필요한 경우
-            if result.get("needs_ai_analysis"):
-                # 원본 사용자 질문으로 AI 분석 요청
-                analysis_result = await command_parser.analyze_file_content(
-                    scenario_id=scenario_id,
-                    filename=filename,
-                    file_content={
-                        "content_preview": result.get("content_preview", ""),
-                        "full_content": result.get("full_content")
-                    },
-                    user_query=request.content,  # 원본 질문
-                    simulation_state=request.simulation_state,  # 👈 실시간 상태 전달
-                    model=request.model,
-                    temperature=request.temperature
-                )
-                
-                if analysis_result.get("success"):
-                    return CommandResponse(
-                        success=True,
-                        message=analysis_result.get("content", ""),
-                        action="read_file",
-                        data={
-                            "filename": filename,
-                            "analysis": True,
-                        },
-                    )
-                else:
-                    return CommandResponse(
-                        success=False,
-                        message=f"파일 분석 중 오류가 발생했습니다: {analysis_result.get('error')}",
-                        action="read_file",
-                        error=analysis_result.get("error"),
-                    )
-            
-            # 구조나 전체 내용인 경우
-            return CommandResponse(
-                success=result["success"],
-                message=result["message"],
-                action="read_file",
-                data={
-                    "filename": filename,
-                    "structure": result.get("structure"),
-                    "content": result.get("content"),
-                },
-                error=result.get("error"),
-            )
-
-        else:
-            return CommandResponse(
-                success=False,
-                message=f"지원하지 않는 명령입니다: {action}",
-                error=f"Unsupported action: {action}",
-            )
+        # 2. 명령 실행 및 응답 구성
+        return await _dispatch_command(scenario_id, request, parsed, command_parser)
     
     except Exception as e:
-        logger.error(f"Command execution failed: {str(e)}")
+        logger.exception(f"Command execution failed: {str(e)}")  # 예상하지 못한 예외이므로 traceback까지 기록
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"명령 실행 실패: {str(e)}"
         )
+
+
+def _sse_event(event: str, data: bytes) -> bytes:
+    """SSE 이벤트 한 개 (data는 한 줄 JSON)"""
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+
+@ai_agent_router.post(
+    "/scenario/{scenario_id}/execute-command/stream",
+    status_code=status.HTTP_200_OK,
+    summary="시나리오 명령 실행 (스트리밍)",
+    description=(
+        "execute-command와 같은 명령을 실행하되 text/event-stream으로 응답합니다. "
+        "파일 분석 답변은 생성되는 대로 delta 이벤트로 전달하고, 마지막에 CommandResponse를 done 이벤트로 보냅니다."
+    ),
+)
+@inject
+async def execute_command_stream(
+    scenario_id: str,
+    request: CommandRequest,
+    command_parser: CommandParser = Depends(Provide[Container.command_parser]),
+):
+    """
+    시나리오 명령 실행 스트리밍 엔드포인트
+
+    전체 답변 생성(수 초)을 기다리지 않고 첫 토큰부터 화면에 보여줄 수 있도록 SSE로 응답합니다.
+
+    - **event: delta**: `{"content": "..."}` 파일 분석 답변 조각 (이어 붙여 표시)
+    - **event: done**: 최종 CommandResponse (캐시 적중 등으로 delta 없이 바로 올 수도 있으므로 message를 최종 답변으로 사용)
+    - **event: error**: `{"detail": "..."}` 예상하지 못한 오류 (응답 헤더를 이미 보냈으므로 500 대신 이벤트로 전달)
+    """
+    deltas: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+    disconnected = False
+
+    def _on_content(content: str) -> None:
+        # 파일 분석 태스크는 요청 간에 공유되어 클라이언트가 끊긴 뒤에도 생성을 계속하므로, 끊긴 뒤에는 읽을 쪽이 없는 큐에 쌓지 않음
+        if not disconnected:
+            deltas.put_nowait(content)
+
+    async def _run() -> CommandResponse:
+        try:
+            parsed = await command_parser.parse_command(
+                user_content=request.content,
+                scenario_id=scenario_id,
+                conversation_history=request.conversation_history,
+                simulation_state=request.simulation_state,
+                model=request.model,
+                temperature=request.temperature
+            )
+            return await _dispatch_command(
+                scenario_id, request, parsed, command_parser, on_content=_on_content
+            )
+        finally:
+            deltas.put_nowait(None)  # 스트림 종료 표시
+
+    async def _events() -> AsyncIterator[bytes]:
+        nonlocal disconnected
+        task = asyncio.create_task(_run())
+        try:
+            while (content := await deltas.get()) is not None:
+                yield _sse_event("delta", orjson.dumps({"content": content}))
+            try:
+                response = await task
+            except Exception as e:
+                logger.exception(f"Command execution failed: {str(e)}")  # 예상하지 못한 예외이므로 traceback까지 기록
+                yield _sse_event("error", orjson.dumps({"detail": f"명령 실행 실패: {str(e)}"}))
+                return
+            yield _sse_event("done", response.model_dump_json().encode())
+        finally:
+            # 클라이언트가 연결을 끊으면 delta 전달을 끊고 이 요청의 대기를 취소 (완료된 태스크에는 영향 없음)
+            # 공유된 파일 분석 태스크는 shield되어 있어 OpenAI 스트림은 끝까지 받아 캐시에 저장됨
+            disconnected = True
+            task.cancel()
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # 프록시 버퍼링 방지
+    )
@@ -5,6 +5,10 @@ from typing import List, Optional, Literal
 class Message(BaseModel):
     role: Literal["user", "assistant", "system"]
     content: str
+    is_welcome: Optional[bool] = Field(
+        default=None,
+        description="프론트엔드가 넣은 환영 메시지 여부 (지정하면 대화 이력에서 내용 검사 없이 제외, 미지정 시 내용으로 판별)"
+    )
 
 
 class ChatRequest(BaseModel):
@@ -77,8 +81,8 @@ class CommandRequest(BaseModel):
         description="사용할 OpenAI 모델"
     )
     temperature: float = Field(
-        default=0.1,
-        description="응답의 일관성을 위한 낮은 temperature",
+        default=0.0,
+        description="명령 분류/파일 분석은 결정적인 응답이 필요하므로 0 (같은 입력이면 같은 응답)",
         ge=0.0,
         le=2.0
     )
@@ -4,6 +4,7 @@ from typing import Optional, List, Union
 from botocore.exceptions import ClientError
 from loguru import logger
 
+import orjson
 import pandas as pd
 
 from packages.doppler.client import get_secret
@@ -57,13 +58,25 @@ class S3Manager:
                 )
                 async with response["Body"] as stream:
                     data = await stream.read()
-                    result = json.loads(data.decode("utf-8"))
+                    result = self._loads_json(data)
                     logger.debug(f"[S3] Successfully downloaded JSON ({len(data)} bytes)")
                     return result
         except Exception as e:
             logger.error(f"[S3] Error downloading json {filename} for {scenario_id}: {e}")
             return None
 
+    @staticmethod
+    def _loads_json(data: bytes):
+        """JSON bytes 파싱 (orjson으로 decode 복사본 없이 바로 파싱)
+
+        json.dumps로 저장된 파일에는 NaN/Infinity가 들어 있을 수 있는데 orjson은 이를 거부하므로,
+        그런 경우에만 표준 json으로 다시 파싱합니다.
+        """
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return json.loads(data.decode("utf-8"))
+
     async def save_json_async(self, scenario_id: str, filename: str, data: dict):
         """S3에 JSON 파일 업로드 (비동기)"""
         try:
@@ -0,0 +1,68 @@
+"""
+CommandExecutor 보조 함수 단위 테스트
+"""
+import asyncio
+
+import pandas as pd
+
+from app.routes.ai_agent.application.core.command_executor import CommandExecutor, _frame_fingerprint
+
+
+def _pax_frame(facilities):
+    return pd.DataFrame({
+        "flight_number": ["101", "102", "103"],
+        "check_in_facility": ["A_1", "A_2", "A_1"],
+        "visited_facilities": facilities,  # 리스트 값 컬럼
+        "extra": [{"zone": "A"}, {"zone": "B"}, {}],  # dict 값 컬럼
+    })
+
+
+def test_frame_fingerprint_handles_list_valued_columns():
+    df = _pax_frame([["A_1"], ["A_2", "B_1"], []])
+
+    fingerprint = _frame_fingerprint(df)
+
+    assert fingerprint == _frame_fingerprint(df.copy())
+    assert fingerprint != _frame_fingerprint(_pax_frame([["A_1"], ["A_2"], []]))
+
+
+def test_frame_fingerprint_prefers_parquet_etag():
+    df = _pax_frame([["A_1"], [], []])
+    df.attrs["parquet_etag"] = "etag-1"
+
+    assert _frame_fingerprint(df) == "etag-1"
+
+
+class _SlowSimulationService:
+    """metadata 조회가 release될 때까지 대기하는 SimulationService 대역"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def load_scenario_metadata(self, scenario_id):
+        self.calls += 1
+        await self.release.wait()
+        return {"metadata": {"process_flow": [{"name": "check_in", "step": 0}]}}
+
+
+def test_scenario_context_single_flight_survives_leader_cancel():
+    simulation_service = _SlowSimulationService()
+    executor = CommandExecutor(simulation_service)
+
+    async def scenario():
+        leader = asyncio.create_task(executor.get_scenario_context("scenario-sf"))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(executor.get_scenario_context("scenario-sf"))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        simulation_service.release.set()
+        return await follower, leader.cancelled()
+
+    context, leader_cancelled = asyncio.run(scenario())
+
+    assert leader_cancelled is True
+    assert simulation_service.calls == 1
+    assert "error" not in context
+    assert context["scenario_id"] == "scenario-sf"
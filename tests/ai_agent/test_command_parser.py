@@ -0,0 +1,340 @@
+"""
+CommandParser 단위 테스트 (OpenAI를 호출하지 않는 경로만 검증)
+"""
+import asyncio
+
+import httpx
+import orjson
+
+from app.routes.ai_agent.application.core import command_parser
+from app.routes.ai_agent.application.core.command_executor import CommandExecutor
+from app.routes.ai_agent.application.core.command_parser import (
+    _FILE_ANALYSIS_MAX_TOKENS,
+    _FILE_ANALYSIS_SHORT_MAX_TOKENS,
+    CommandParser,
+    _dumps_with_tools,
+    _file_analysis_max_tokens,
+    _match_fast_path,
+    _parse_period,
+    _rate_limit_wait_seconds,
+    _read_chat_completion,
+    _summarize_process,
+)
+from app.routes.ai_agent.application.core.openai_client import OpenAIRateLimiter
+
+
+class _FakeSimulationService:
+    """metadata 조회/저장만 흉내 내는 SimulationService 대역"""
+
+    def __init__(self, process_names):
+        self.metadata = {
+            "process_flow": [{"name": name, "step": step} for step, name in enumerate(process_names)],
+        }
+        self.saved = None
+
+    async def load_scenario_metadata(self, scenario_id):
+        return {"metadata": self.metadata}
+
+    async def save_scenario_metadata(self, scenario_id, metadata):
+        self.saved = metadata
+
+
+def test_fast_path_keeps_security_name():
+    assert _match_fast_path("remove security") == ("remove_process", {"process_name": "security"})
+    assert _match_fast_path("remove security check process") == (
+        "remove_process", {"process_name": "security_check"}
+    )
+
+
+def test_fast_path_falls_back_to_llm_for_unknown_names():
+    assert _match_fast_path("add 보안") is None
+    assert _match_fast_path("add foo process") == ("add_process", None)
+
+
+def test_fast_path_leaves_question_forms_to_llm(monkeypatch):
+    for text in ("체크인 삭제?", "보안검색 추가?", "add security?", "remove check in process?"):
+        assert _match_fast_path(text) is None, text
+
+    bodies = []
+
+    async def fake_post_chat_completion(url, headers, body, estimated_tokens, on_content=None):
+        bodies.append(body)
+        return {"model": "m", "choices": [{"message": {"content": "체크인 프로세스를 삭제할까요?"}}], "usage": {}}, ""
+
+    monkeypatch.setattr(command_parser, "_post_chat_completion", fake_post_chat_completion)
+    parser = CommandParser(CommandExecutor(_FakeSimulationService(["check_in"])))
+
+    parsed = asyncio.run(parser.parse_command(user_content="체크인 삭제?", scenario_id="scenario-3"))
+
+    assert len(bodies) == 1
+    assert b'"tool_choice":"auto"' in bodies[0]
+    assert parsed["action"] != "remove_process"
+
+
+def test_fast_path_forces_function_only_for_real_process_names(monkeypatch):
+    for text in ("어떤 프로세스 추가해?", "무슨 단계 추가해", "왜 프로세스 삭제해", "모든 프로세스 삭제해줘", "add new process"):
+        assert _match_fast_path(text) is None, text
+    assert _match_fast_path("수하물검사 프로세스 추가해줘") == ("add_process", None)
+
+    bodies = []
+
+    async def fake_post_chat_completion(url, headers, body, estimated_tokens, on_content=None):
+        bodies.append(body)
+        return {"model": "m", "choices": [{"message": {"content": "어떤 프로세스를 삭제할까요?"}}], "usage": {}}, ""
+
+    monkeypatch.setattr(command_parser, "_post_chat_completion", fake_post_chat_completion)
+    parser = CommandParser(CommandExecutor(_FakeSimulationService(["check_in"])))
+
+    asyncio.run(parser.parse_command(user_content="모든 프로세스 삭제해줘", scenario_id="scenario-4"))
+    asyncio.run(parser.parse_command(user_content="수하물검사 프로세스 추가해줘", scenario_id="scenario-4"))
+
+    assert b'"tool_choice":"auto"' in bodies[0]
+    assert b'"tool_choice":{"type":"function","function":{"name":"add_process"}}' in bodies[1]
+
+
+def test_remove_security_from_scenario_with_security():
+    simulation_service = _FakeSimulationService(["check_in", "security", "boarding"])
+    executor = CommandExecutor(simulation_service)
+    parser = CommandParser(executor)
+
+    parsed = asyncio.run(parser.parse_command(user_content="remove security", scenario_id="scenario-1"))
+    assert parsed["action"] == "remove_process"
+
+    result = asyncio.run(executor.remove_process(scenario_id="scenario-1", **parsed["parameters"]))
+    assert result["success"] is True
+    assert [p["name"] for p in simulation_service.saved["process_flow"]] == ["check_in", "boarding"]
+
+
+def test_file_analysis_max_tokens_short_for_count_questions():
+    for query in ("How many passengers?", "승객 몇 명이야?", "체크인 시설은 몇 개야?", "총 승객 수는?"):
+        assert _file_analysis_max_tokens(query) == _FILE_ANALYSIS_SHORT_MAX_TOKENS, query
+
+
+def test_file_analysis_max_tokens_default_for_how_long_questions():
+    for query in ("how long did passengers wait at checkin?", "체크인에서 얼마나 기다렸어?", "평균 대기 시간은 몇 분이야?"):
+        assert _file_analysis_max_tokens(query) == _FILE_ANALYSIS_MAX_TOKENS, query
+
+
+def test_file_analysis_single_flight_survives_leader_cancel(monkeypatch):
+    calls = []
+    release = asyncio.Event()
+
+    async def fake_post_chat_completion(url, headers, body, estimated_tokens, on_content=None):
+        calls.append(url)
+        await release.wait()
+        return {"model": "m", "choices": [{"message": {"content": "분석 결과"}}], "usage": {}}, ""
+
+    monkeypatch.setattr(command_parser, "_post_chat_completion", fake_post_chat_completion)
+    parser = CommandParser(CommandExecutor(_FakeSimulationService([])))
+
+    def analyze():
+        return parser.analyze_file_content(
+            scenario_id="scenario-1",
+            filename="simulation-pax.parquet",
+            file_content={"content_preview": "single-flight test data"},
+            user_query="체크인 대기 시간을 설명해줘",
+        )
+
+    async def scenario():
+        leader = asyncio.create_task(analyze())
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(analyze())
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        result = await follower
+        result["content"] = "호출부에서 수정"
+        return result, await analyze()
+
+    follower_result, cached_result = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert follower_result["success"] is True
+    assert cached_result["content"] == "분석 결과"
+
+
+def test_parse_command_returns_error_for_unexpected_openai_payload(monkeypatch):
+    async def fake_post_chat_completion(url, headers, body, estimated_tokens, on_content=None):
+        return {"model": "m", "choices": [], "usage": {}}, ""
+
+    monkeypatch.setattr(command_parser, "_post_chat_completion", fake_post_chat_completion)
+    parser = CommandParser(CommandExecutor(_FakeSimulationService(["check_in"])))
+
+    parsed = asyncio.run(parser.parse_command(user_content="이 시나리오 설명해줘", scenario_id="scenario-2"))
+
+    assert parsed["action"] == "error"
+
+
+def _process_config(zones, passenger_conditions=()):
+    def time_block():
+        return {
+            "period": "2026-03-01 05:00:00-2026-03-01 06:00:00",
+            "process_time_seconds": 60,
+            "passenger_conditions": list(passenger_conditions),
+        }
+
+    return {
+        "name": "check_in",
+        "zones": {
+            zone: {"facilities": [{**facility, "operating_schedule": {"time_blocks": [time_block()]}} for facility in facilities]}
+            for zone, facilities in zones.items()
+        },
+    }
+
+
+def test_summarize_process_keeps_facilities_without_unique_ids():
+    proc = _process_config({"A": [{"id": "A_1"}, {"id": "A_1"}, {}], "B": [{}]})
+
+    summary_json, active_count = _summarize_process(proc, {})
+    details = orjson.loads(summary_json)["facility_details"]
+
+    assert active_count == 4
+    assert [(d["zone"], d["id"]) for d in details] == [("A", "A_1"), ("A", "A_1"), ("A", "Unknown"), ("B", "Unknown")]
+
+
+def test_summarize_process_dedupes_nested_condition_values():
+    proc = _process_config({"A": [{"id": "A_1"}, {"id": "A_2"}]}, passenger_conditions=[
+        {"field": "profile", "values": [["KE", "OZ"], {"class": "C", "nationality": "KR"}]},
+        {"field": "profile", "values": [["KE", "OZ"], {"nationality": "KR", "class": "C"}]},
+    ])
+
+    summary_json, _ = _summarize_process(proc, {})
+
+    assert orjson.loads(summary_json)["passenger_conditions"] == [
+        "profile=[['KE', 'OZ'], {'class': 'C', 'nationality': 'KR'}]"
+    ]
+
+
+def test_dumps_with_tools_produces_valid_json():
+    body = orjson.loads(_dumps_with_tools({"model": "m"}, forced_function="add_process"))
+    assert body["model"] == "m"
+    assert body["tool_choice"] == {"type": "function", "function": {"name": "add_process"}}
+
+    empty_body = orjson.loads(_dumps_with_tools({}))
+    assert empty_body["tool_choice"] == "auto"
+    assert empty_body["parallel_tool_calls"] is False
+
+
+def test_parse_period_formats():
+    assert _parse_period("2026-03-01 05:00:00-2026-03-01 06:30:00") == ("05:00", "06:30")
+    assert _parse_period("2026-03-01T05:00:00-2026-03-01T06:30:00") == ("05:00", "06:30")
+    assert _parse_period("2026-03-01 05:00-2026-03-01 06:30") == ("05:00", "06:30")
+    assert _parse_period("2026-03-01 05:00:00.500-2026-03-01 06:30:00.250") == ("05:00", "06:30")
+    assert _parse_period("2026-03-01 0a:00:00-2026-03-01 06:30:00") == (None, None)
+    assert _parse_period("05:00-06:30") == (None, None)
+
+
+def test_parse_command_reuses_cached_tool_call(monkeypatch):
+    calls = []
+
+    async def fake_post_chat_completion(url, headers, body, estimated_tokens, on_content=None):
+        calls.append(body)
+        tool_call = {"function": {"name": "remove_process", "arguments": '{"process_name": "baggage_drop"}'}}
+        return {"model": "m", "choices": [{"message": {"tool_calls": [tool_call]}}], "usage": {"total_tokens": 10}}, ""
+
+    monkeypatch.setattr(command_parser, "_post_chat_completion", fake_post_chat_completion)
+    parser = CommandParser(CommandExecutor(_FakeSimulationService(["check_in", "baggage_drop"])))
+
+    def parse():
+        return asyncio.run(parser.parse_command(user_content="수하물 위탁 단계는 빼줘", scenario_id="scenario-cache"))
+
+    first = parse()
+    first["parameters"]["process_name"] = "호출부에서 수정"
+    second = parse()
+
+    assert len(calls) == 1
+    assert second["action"] == "remove_process"
+    assert second["parameters"] == {"process_name": "baggage_drop"}
+    assert second["usage"] == {}
+
+
+class _SseStream(httpx.AsyncByteStream):
+    """주어진 chunk를 보낸 뒤 더 읽으면 실패하는 SSE 본문 (finish_reason/usage 이후 조기 종료 확인용)"""
+
+    def __init__(self, events):
+        self.events = events
+
+    async def __aiter__(self):
+        for event in self.events:
+            yield b"data: " + orjson.dumps(event) + b"\n\n"
+        raise AssertionError("stream read past the usage chunk")
+
+
+def test_read_chat_completion_stops_after_finish_reason_and_usage():
+    deltas = []
+    response = httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=_SseStream([
+        {"model": "m", "choices": [{"delta": {"content": "승객은 "}}]},
+        {"model": "m", "choices": [{"delta": {"content": "120명"}, "finish_reason": "stop"}]},
+        {"model": "m", "choices": [], "usage": {"total_tokens": 42}},
+    ]))
+
+    result = asyncio.run(_read_chat_completion(response, on_content=deltas.append))
+
+    assert deltas == ["승객은 ", "120명"]
+    assert result["choices"][0]["message"]["content"] == "승객은 120명"
+    assert result["choices"][0]["finish_reason"] == "stop"
+    assert result["usage"] == {"total_tokens": 42}
+
+
+def _use_openai_transport(monkeypatch, responses):
+    """_post_chat_completion이 순서대로 responses를 받도록 OpenAI 클라이언트/레이트 리미터 교체"""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return responses[len(requests) - 1]
+
+    monkeypatch.setattr(command_parser, "get_openai_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(command_parser, "get_openai_rate_limiter", lambda: OpenAIRateLimiter(6000, 10_000_000))
+    return requests
+
+
+def test_post_chat_completion_retries_429_and_5xx(monkeypatch):
+    monkeypatch.setattr(command_parser, "_RETRY_BASE_SECONDS", 0.001)
+    requests = _use_openai_transport(monkeypatch, [
+        httpx.Response(429, headers={"retry-after-ms": "1"}, json={"error": {"code": "rate_limit_exceeded"}}),
+        httpx.Response(503, text="upstream unavailable"),
+        httpx.Response(200, json={"model": "m", "choices": [{"message": {"content": "ok"}}], "usage": {}}),
+    ])
+
+    result, error_text = asyncio.run(command_parser._post_chat_completion("https://api.test/v1/chat", None, b"{}", 10))
+
+    assert len(requests) == 3
+    assert error_text == ""
+    assert result["choices"][0]["message"]["content"] == "ok"
+
+
+def test_post_chat_completion_gives_up_on_long_rate_limit_wait(monkeypatch):
+    rate_limited = {"error": {"code": "rate_limit_exceeded", "message": "Rate limit reached. Please try again in 1m20s."}}
+    requests = _use_openai_transport(monkeypatch, [httpx.Response(429, json=rate_limited)])
+
+    result, error_text = asyncio.run(command_parser._post_chat_completion("https://api.test/v1/chat", None, b"{}", 10))
+
+    assert len(requests) == 1  # 80초 대기는 _RETRY_MAX_WAIT_SECONDS를 넘으므로 재시도하지 않음
+    assert result is None
+    assert _rate_limit_wait_seconds(error_text) == 80
+
+
+def test_post_chat_completion_does_not_retry_insufficient_quota(monkeypatch):
+    quota = {"error": {"code": "insufficient_quota", "message": "You exceeded your current quota."}}
+    requests = _use_openai_transport(monkeypatch, [httpx.Response(429, json=quota)])
+
+    result, _ = asyncio.run(command_parser._post_chat_completion("https://api.test/v1/chat", None, b"{}", 10))
+
+    assert len(requests) == 1
+    assert result is None
+
+
+def test_rate_limit_wait_seconds():
+    def error(message):
+        return orjson.dumps({"error": {"code": "rate_limit_exceeded", "message": message}}).decode()
+
+    assert _rate_limit_wait_seconds(error("Please try again in 1.2s.")) == 2
+    assert _rate_limit_wait_seconds(error("Please try again in 350ms.")) == 1
+    assert _rate_limit_wait_seconds(error("Please try again in 3s.")) == 3
+    assert _rate_limit_wait_seconds(error("Slow down.")) == 5
+    assert _rate_limit_wait_seconds("<html>502 Bad Gateway</html>") is None
+    assert _rate_limit_wait_seconds('{"error": {"code": "server_error"}}') is None
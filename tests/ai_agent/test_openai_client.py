@@ -0,0 +1,20 @@
+"""
+OpenAI 공유 클라이언트 보조 객체 단위 테스트
+"""
+import asyncio
+
+from app.routes.ai_agent.application.core.openai_client import OpenAIRateLimiter
+
+
+def test_rate_limiter_ignores_non_positive_limit_headers():
+    limiter = OpenAIRateLimiter(requests_per_minute=60, tokens_per_minute=6000)
+
+    limiter.update_from_headers({
+        "x-ratelimit-limit-requests": "0",
+        "x-ratelimit-limit-tokens": "-1",
+        "x-ratelimit-remaining-requests": "0",
+    })
+
+    assert limiter._request_capacity == 60
+    assert limiter._token_capacity == 6000
+    asyncio.run(asyncio.wait_for(limiter.acquire(100), timeout=2))  # 0으로 나누지 않고 1초(1/60분) 안에 통과